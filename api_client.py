@@ -0,0 +1,259 @@
+"""
+Shared HTTP Transport for the Collectors
+Keeps one pooled keep-alive session per API base URL and retries transient
+failures with exponential backoff, jitter and Retry-After support. Remembers
+the server's submission schedule hints (Next-Submission-After,
+Submission-Jitter) so collectors can spread their next submission out.
+Used by client_collector.py, system_collector_gui.py and the standalone collector.
+"""
+
+import uuid
+import random
+import time
+import threading
+import email.utils
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import wire
+
+DEFAULT_API_URL = 'https://backend-blue-beta.vercel.app'
+
+# (connect, read) timeouts in seconds
+DEFAULT_CONNECT_TIMEOUT = 5
+DEFAULT_READ_TIMEOUT = 30
+
+DEFAULT_MAX_RETRIES = 4
+DEFAULT_BACKOFF_BASE = 0.5
+DEFAULT_BACKOFF_MAX = 30.0
+
+# Statuses worth retrying: throttling, and server/gateway errors that are usually transient.
+# The API answers 409 only while an earlier attempt with the same Idempotency-Key is running.
+RETRYABLE_STATUSES = frozenset([408, 409, 425, 429, 500, 502, 503, 504])
+
+
+def parse_retry_after(value):
+    """Parse a Retry-After header (seconds or HTTP date) into seconds, or None"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    if retry_at is None:
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+def parse_schedule(response):
+    """Schedule hints from an ingest response: {'next_submission_after', 'jitter', 'load'}, or None"""
+    try:
+        next_after = float(response.headers['Next-Submission-After'])
+    except (KeyError, TypeError, ValueError):
+        return None
+    try:
+        jitter = max(0.0, float(response.headers.get('Submission-Jitter', 0)))
+        load = float(response.headers.get('Ingest-Load', 0))
+    except (TypeError, ValueError):
+        jitter, load = 0.0, 0.0
+    return {'next_submission_after': max(0.0, next_after), 'jitter': jitter, 'load': load}
+
+
+def schedule_delay(schedule, default_interval, default_jitter=0.1):
+    """Seconds until the next submission: the server's hint (or default_interval) plus random jitter.
+
+    Without a hint the jitter is default_jitter of the interval, so clients
+    started together still drift apart.
+    """
+    if schedule:
+        return schedule['next_submission_after'] + random.uniform(0, schedule['jitter'])
+    return default_interval + random.uniform(0, default_interval * default_jitter)
+
+
+def build_payload(details, employee_id=None, email=None, department=None):
+    """Build the /api/system-details request body from collect_system_details() output.
+
+    The generated idempotency_key stays with the payload through retries and
+    outbox replays, so the server stores each snapshot once.
+    """
+    return {
+        'idempotency_key': uuid.uuid4().hex,
+        'employee_id': employee_id or details.get('employee_id'),
+        'email': email or details.get('email'),
+        'department': department or details.get('department'),
+        'system_details': {
+            'username': details.get('username'),
+            'hostname': details.get('hostname'),
+            'system_manufacturer': details.get('system_manufacturer'),
+            'system_model': details.get('system_model'),
+            'ip_address': details.get('ip_address'),
+            'serial_number': details.get('serial_number'),
+            'os_info': details.get('os_info') or details.get('windows', {}),
+            'storage': details.get('storage', []),
+            'ram': details.get('ram', {}),
+            'collected_at': details.get('collected_at'),
+            'collection_profile': details.get('collection_profile')
+        }
+    }
+
+
+class ApiClient:
+    """Pooled, retrying client for the System Details API.
+
+    A single instance reuses its TCP/TLS connection across calls, so sending
+    several snapshots through submit_many() pays for one handshake only.
+    """
+
+    def __init__(self, api_url=None, connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout=DEFAULT_READ_TIMEOUT, max_retries=DEFAULT_MAX_RETRIES,
+                 backoff_base=DEFAULT_BACKOFF_BASE, backoff_max=DEFAULT_BACKOFF_MAX,
+                 pool_size=4, wire_format='auto'):
+        self.api_url = (api_url or DEFAULT_API_URL).rstrip('/')
+        # 'auto' switches submissions to MessagePack once the server lists it in Accept-Post
+        self.wire_format = wire_format
+        self.server_accepts_msgpack = False
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        # Latest schedule hints from the server (parse_schedule() shape), None until an ingest response
+        self.last_schedule = None
+
+        self.session = requests.Session()
+        # Retries are handled in request() so we can add jitter and honour Retry-After
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({
+            'Content-Type': 'application/json',
+            'Connection': 'keep-alive',
+        })
+
+    def close(self):
+        """Close pooled connections"""
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def backoff_delay(self, attempt, retry_after=None):
+        """Seconds to wait before retry number `attempt` (0-based)"""
+        if retry_after is not None:
+            # Server told us when to come back; add a little jitter so clients don't sync up
+            return min(retry_after, self.backoff_max) + random.uniform(0, self.backoff_base)
+        # Full jitter: uniform(0, min(cap, base * 2^attempt))
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def request(self, method, path, max_retries=None, **kwargs):
+        """Send a request, retrying connection errors and retryable statuses.
+
+        Returns the final requests.Response. Raises requests.exceptions.RequestException
+        if every attempt failed at the network level. max_retries overrides the client's.
+        """
+        url = f"{self.api_url}{path}"
+        kwargs.setdefault('timeout', self.timeout)
+        max_retries = self.max_retries if max_retries is None else max_retries
+
+        attempt = 0
+        while True:
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if attempt >= max_retries:
+                    raise
+                time.sleep(self.backoff_delay(attempt))
+                attempt += 1
+                continue
+
+            schedule = parse_schedule(response)
+            if schedule:
+                self.last_schedule = schedule
+            if response.status_code not in RETRYABLE_STATUSES or attempt >= max_retries:
+                return response
+
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            if retry_after is not None and retry_after > self.backoff_max:
+                # The server is shedding load for longer than we would wait inline:
+                # hand the response back so the caller can queue the payload for later
+                return response
+            # Drain the body so the connection goes back to the pool
+            response.close()
+            time.sleep(self.backoff_delay(attempt, retry_after))
+            attempt += 1
+
+    def post_json(self, path, payload, **kwargs):
+        """POST a JSON body with retries"""
+        return self.request('POST', path, json=payload, **kwargs)
+
+    def use_msgpack(self):
+        """True if submissions should go out as MessagePack"""
+        if not wire.MSGPACK_AVAILABLE or self.wire_format == 'json':
+            return False
+        return self.wire_format == 'msgpack' or self.server_accepts_msgpack
+
+    def _note_accepted_types(self, response):
+        accept_post = response.headers.get('Accept-Post')
+        if accept_post is not None:
+            types = [t.split(';')[0].strip().lower() for t in accept_post.split(',')]
+            self.server_accepts_msgpack = any(t in wire.MSGPACK_CONTENT_TYPES for t in types)
+
+    def post_payload(self, path, body, headers=None):
+        """POST a submission (or {'submissions': [...]} batch) in the negotiated wire format"""
+        headers = dict(headers or {})
+        if self.use_msgpack():
+            response = self.request('POST', path, data=wire.encode(body),
+                                    headers=dict(headers, **{'Content-Type': wire.MSGPACK_CONTENT_TYPE}))
+            self._note_accepted_types(response)
+            if response.status_code != 415:
+                return response
+            # Server does not (or no longer) take MessagePack: resend as JSON
+            self.server_accepts_msgpack = False
+            if self.wire_format == 'msgpack':
+                self.wire_format = 'auto'
+        response = self.post_json(path, wire.json_body(body), headers=headers)
+        self._note_accepted_types(response)
+        return response
+
+    def submit(self, payload):
+        """Submit one snapshot to /api/system-details"""
+        headers = {}
+        if payload.get('idempotency_key'):
+            headers['Idempotency-Key'] = payload['idempotency_key']
+        return self.post_payload('/api/system-details', payload, headers=headers)
+
+    def submit_many(self, payloads):
+        """Submit several snapshots over the same pooled connection.
+
+        Returns a list of (payload, response_or_exception) tuples in input order.
+        """
+        results = []
+        for payload in payloads:
+            try:
+                results.append((payload, self.submit(payload)))
+            except requests.exceptions.RequestException as e:
+                results.append((payload, e))
+        return results
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(api_url=None):
+    """Return the shared ApiClient for an API base URL (one pool per process)"""
+    key = (api_url or DEFAULT_API_URL).rstrip('/')
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = ApiClient(key)
+            _clients[key] = client
+        return client
@@ -3,22 +3,45 @@ Flask API Server for System Details
 Provides REST API endpoint to collect system information
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Blueprint, Response, current_app, request, jsonify, make_response, g, stream_with_context
 from flask_cors import CORS
+from werkzeug.local import LocalProxy
+from werkzeug.middleware.proxy_fix import ProxyFix
 import sys
 import os
 import json
-from supabase import create_client, Client
-from config import SUPABASE_URL, SUPABASE_KEY, FLASK_HOST, FLASK_PORT, FLASK_DEBUG, API_BASE_URL
+import time
+import functools
+import threading
+import config
+from metrics import metrics
+from rate_limit import RateLimiter, ConcurrencyLimiter, IngestLoad, create_limiter_backend, retry_after_header
+from idempotency import IdempotencyStore
+from records import build_db_record, format_specs_text
+from storage import create_storage, clean_filters
+from circuit_breaker import CircuitBreaker, OPEN, CLOSED
+from resilient_storage import StorageUnavailable, is_transient_error
+import wire
+from search_index import SearchIndex, DEFAULT_RESULT_LIMIT, MAX_RESULT_LIMIT, build_indexes, build_indexes_in_background
+from device_index import DeviceIndex, CONFLICT_KINDS
+from background import BackgroundTasks
+from submission_feed import SubmissionFeed, format_sse
+from facet_counts import FacetCounts, CountCache, start_reconcile
+from collector_policy import build_policy, policy_etag
+from outbox import MAX_BATCH_SUBMISSIONS
+from compaction import Compactor, start_compaction
+from columnar_archive import NUMPY_AVAILABLE
+from fleet_analytics import run_query, parse_percentiles, DEFAULT_GROUP_LIMIT
+from storage_forecast import StorageForecast, DEFAULT_FORECAST_LIMIT, MAX_FORECAST_LIMIT
 
 # Import functions from get_system_details
-from get_system_details import collect_system_details, format_details_text, save_details_to_file
+from get_system_details import (
+    collect_system_details, format_details_text, save_details_to_file, details_backup_filename,
+    is_serverless_environment,
+    is_placeholder_serial, is_placeholder_ip, DEFAULT_PROFILE
+)
 
-app = Flask(__name__)
-
-# Get allowed origins from environment variable
-ALLOWED_ORIGINS_ENV = os.getenv('ALLOWED_ORIGINS', '')
-ALLOWED_ORIGINS = [origin.strip() for origin in ALLOWED_ORIGINS_ENV.split(',') if origin.strip()] if ALLOWED_ORIGINS_ENV else []
+api = Blueprint('api', __name__)
 
 # Default origins for development
 default_origins = [
@@ -28,47 +51,432 @@ default_origins = [
     "https://formfrontend-tau.vercel.app"
 ]
 
-# Combine origins
-allowed_origins = list(set(ALLOWED_ORIGINS + default_origins)) if ALLOWED_ORIGINS else default_origins
-
-# Enable CORS for React frontend
-# Check if running on Vercel (production)
-is_vercel = os.getenv('VERCEL') is not None
-is_production = os.getenv('FLASK_ENV') == 'production' or os.getenv('ENVIRONMENT') == 'production'
-
-if is_vercel or is_production:
-    # In production/Vercel, allow all origins for API access
-    # This is common for public APIs
-    CORS(app, resources={
-        r"/api/*": {
-            "origins": "*",
-            "methods": ["GET", "POST", "OPTIONS"],
-            "allow_headers": ["Content-Type", "Authorization"],
-            "supports_credentials": False
-        }
-    })
-    print("CORS: Allowing all origins (production mode)")
-else:
-    # In development, use specific origins
-    CORS(app, resources={
-        r"/api/*": {
-            "origins": allowed_origins,
-            "methods": ["GET", "POST", "OPTIONS"],
-            "allow_headers": ["Content-Type", "Authorization"],
-            "supports_credentials": False
-        }
-    })
-    print(f"CORS: Allowing specific origins: {allowed_origins}")
-
-# Initialize Supabase client
-try:
-    supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-    print("Supabase client initialized successfully")
-except Exception as e:
-    print(f"Warning: Could not initialize Supabase client: {e}")
-    supabase = None
-
-@app.route('/api/collect-specs', methods=['POST'])
+
+def configure_cors(app):
+    """Enable CORS for the React frontend on /api/*"""
+    # Get allowed origins from environment variable
+    ALLOWED_ORIGINS_ENV = os.getenv('ALLOWED_ORIGINS', '')
+    ALLOWED_ORIGINS = [origin.strip() for origin in ALLOWED_ORIGINS_ENV.split(',') if origin.strip()] if ALLOWED_ORIGINS_ENV else []
+    
+    # Combine origins
+    allowed_origins = list(set(ALLOWED_ORIGINS + default_origins)) if ALLOWED_ORIGINS else default_origins
+    
+    # Check if running on Vercel (production)
+    is_vercel = os.getenv('VERCEL') is not None
+    is_production = os.getenv('FLASK_ENV') == 'production' or os.getenv('ENVIRONMENT') == 'production'
+    
+    if is_vercel or is_production:
+        # In production/Vercel, allow all origins for API access
+        # This is common for public APIs
+        CORS(app, resources={
+            r"/api/*": {
+                "origins": "*",
+                "methods": ["GET", "POST", "OPTIONS"],
+                "allow_headers": ["Content-Type", "Authorization", "Idempotency-Key"],
+                "supports_credentials": False
+            }
+        })
+        print("CORS: Allowing all origins (production mode)")
+    else:
+        # In development, use specific origins
+        CORS(app, resources={
+            r"/api/*": {
+                "origins": allowed_origins,
+                "methods": ["GET", "POST", "OPTIONS"],
+                "allow_headers": ["Content-Type", "Authorization", "Idempotency-Key"],
+                "supports_credentials": False
+            }
+        })
+        print(f"CORS: Allowing specific origins: {allowed_origins}")
+
+
+class Resources:
+    """Per-worker state behind the API: storage client, limiters, caches, indexes.
+    
+    The constructor only builds in-memory objects, so it is safe before a fork.
+    start() opens the storage and rate-limit connections, starts the background
+    threads and warms up; it must run in the process that serves the requests
+    (gunicorn.conf.py calls it after each worker forks).
+    """
+    
+    def __init__(self, settings):
+        self.settings = settings
+        # Supabase writes go through a circuit breaker and fall back to a local spool
+        self.storage_breaker = CircuitBreaker(
+            'supabase',
+            failure_rate_threshold=settings.BREAKER_FAILURE_RATE,
+            window_size=settings.BREAKER_WINDOW,
+            min_calls=settings.BREAKER_MIN_CALLS,
+            cooldown_seconds=settings.BREAKER_COOLDOWN_SECONDS,
+            slow_call_seconds=settings.BREAKER_SLOW_CALL_SECONDS,
+            is_failure=is_transient_error
+        )
+        # Global cap on concurrent database writes (per worker)
+        self.db_write_limiter = ConcurrencyLimiter(settings.MAX_INFLIGHT_DB_WRITES, settings.ADMISSION_WAIT_SECONDS)
+        # Recent ingest rate, behind the schedule hints and load-spread Retry-After values
+        self.ingest_load = IngestLoad(settings.INGEST_TARGET_PER_MINUTE, settings.INGEST_MAX_RETRY_AFTER_SECONDS)
+        # Recent idempotency keys -> stored responses, so client retries don't create duplicate rows
+        self.idempotency_store = IdempotencyStore(settings.IDEMPOTENCY_MAX_KEYS, settings.IDEMPOTENCY_TTL_SECONDS)
+        # In-memory indexes, loaded from the store in one background pass, then kept current on insert:
+        # the inverted index behind /api/admin/search and the identity index behind /api/admin/conflicts
+        self.search_index = SearchIndex()
+        self.device_index = DeviceIndex()
+        # New rows for /api/admin/submissions/stream
+        self.submission_feed = SubmissionFeed(settings.STREAM_BUFFER_SIZE)
+        # Totals and facet counts for /api/admin/submissions
+        self.facet_counts = FacetCounts()
+        self.count_cache = CountCache(settings.COUNT_CACHE_SECONDS)
+        # Per-mount storage trends behind /api/admin/forecast/storage
+        self.storage_forecast = StorageForecast(settings.FORECAST_HALF_LIFE_DAYS, settings.FORECAST_FULL_PERCENT)
+        # What /api/collector/config hands out; fixed for the life of the process
+        self.collector_policy = build_policy(settings)
+        self.collector_policy_etag = policy_etag(self.collector_policy)
+        self.storage = None
+        self.rate_limiter = None
+        self.background_tasks = None
+        self.started = False
+        self._start_lock = threading.Lock()
+    
+    def start(self):
+        """Open connections and start background work in this process (idempotent)"""
+        with self._start_lock:
+            if self.started:
+                return
+            settings = self.settings
+            # Storage: Supabase or local SQLite, see STORAGE_BACKEND
+            self.storage = create_storage(
+                settings.STORAGE_BACKEND, settings.SUPABASE_URL, settings.SUPABASE_KEY, settings.SQLITE_PATH,
+                supabase_timeout=settings.SUPABASE_TIMEOUT_SECONDS,
+                spool_path=settings.STORAGE_SPOOL_PATH,
+                breaker=self.storage_breaker
+            )
+            # Admission control for ingest routes: per-client token buckets
+            self.rate_limiter = RateLimiter(create_limiter_backend(settings.RATE_LIMIT_REDIS_URL), {
+                'employee_id': (settings.RATE_LIMIT_EMPLOYEE_PER_MINUTE, settings.RATE_LIMIT_EMPLOYEE_BURST),
+                'serial_number': (settings.RATE_LIMIT_SERIAL_PER_MINUTE, settings.RATE_LIMIT_SERIAL_BURST),
+                'ip': (settings.RATE_LIMIT_IP_PER_MINUTE, settings.RATE_LIMIT_IP_BURST),
+            })
+            
+            # Text reports and backup files; inline on serverless, where nothing runs after the response
+            self.background_tasks = BackgroundTasks(
+                0 if settings.SERVERLESS else settings.BACKGROUND_WORKERS,
+                settings.BACKGROUND_MAX_PENDING
+            )
+            
+            indexes = ([self.search_index] if settings.SEARCH_INDEX_ENABLED else []) + \
+                      ([self.device_index] if settings.DEVICE_INDEX_ENABLED else []) + [self.facet_counts] + \
+                      ([self.storage_forecast] if settings.STORAGE_FORECAST_ENABLED else [])
+            if self.storage and (indexes or settings.INDEX_SYNC_SECONDS) and not settings.SERVERLESS:
+                # Rows other workers stored reach this worker's stream clients through the sync.
+                # Not on serverless: every cold start would stream the whole table
+                build_indexes_in_background(self.storage, indexes, settings.INDEX_SYNC_SECONDS,
+                                            listeners=[self.submission_feed.publish])
+            if hasattr(self.storage, 'start_redrain'):
+                # Spooled rows were not indexed at insert (no id yet), and the sync cannot see them
+                # once re-drained: index the ones this worker moves, rebuild after another worker's drain
+                self.storage.on_redrained = lambda rows: [self.index(row) for row in rows]
+                if indexes and not settings.SERVERLESS:
+                    self.storage.on_drained_elsewhere = lambda: build_indexes(self.storage, indexes)
+                self.storage.start_redrain(settings.SPOOL_REDRAIN_INTERVAL_SECONDS)
+            if self.storage and settings.FACET_RECONCILE_SECONDS:
+                start_reconcile(self.storage, self.facet_counts, settings.FACET_RECONCILE_SECONDS)
+            if self.storage and settings.RETENTION_DAYS and not settings.SERVERLESS:
+                # Old snapshots -> daily summaries; deleted rows leave this worker's search results
+                # at once. With INDEX_SYNC_SECONDS every worker (this one too) rebuilds its indexes
+                # when its sync sees the deletion; without it this worker rebuilds after each run
+                compactor = Compactor(self.storage, settings.RETENTION_DAYS, settings.COMPACTION_ARCHIVE_DIR,
+                                      on_deleted=self.search_index.remove)
+                on_done = None if settings.INDEX_SYNC_SECONDS else lambda counts: build_indexes(self.storage, indexes)
+                start_compaction(compactor, settings.COMPACTION_INTERVAL_HOURS * 3600,
+                                 settings.COMPACTION_LOCK_PATH, on_done=on_done)
+            
+            self.warmup()
+            self.started = True
+            print(f"Worker {os.getpid()}: resources started")
+    
+    def index(self, stored):
+        """Add a freshly stored row to the in-memory indexes and the live feed; returns its identity flags"""
+        settings = self.settings
+        self.search_index.add(stored)
+        self.facet_counts.add(stored)
+        self.submission_feed.publish(stored)
+        if settings.STORAGE_FORECAST_ENABLED:
+            self.storage_forecast.add(stored)
+        if not settings.DEVICE_INDEX_ENABLED:
+            return []
+        flags = self.device_index.add(stored)
+        for flag in flags:
+            metrics.inc('identity_flags_total', kind=flag['kind'])
+            print(f"Identity flag on submission {stored.get('id')}: {flag['kind']} {flag['key']!r}")
+        return flags
+    
+    def warmup(self):
+        """One cheap read so the first request does not pay for connection setup"""
+        if not self.storage:
+            return
+        try:
+            self.storage.list(limit=1)
+        except Exception as e:
+            print(f"Warmup read failed (requests will retry): {e}")
+    
+    def close(self):
+        if self.background_tasks:
+            # Let queued backups finish before the connections go away
+            self.background_tasks.shutdown(wait=True)
+        if self.storage:
+            self.storage.close()
+
+
+def create_app(settings=None, start=True):
+    """Build the Flask app.
+    
+    settings is the config module (the default) or any object with the same
+    attribute names. With start=False the per-worker resources are started by
+    the caller (the gunicorn post-fork hook) or, failing that, on the first request.
+    """
+    app = Flask(__name__)
+    configure_cors(app)
+    resources = Resources(settings or config)
+    if resources.settings.TRUSTED_PROXY_HOPS > 0:
+        # request.remote_addr becomes the client address the trusted proxies saw
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=resources.settings.TRUSTED_PROXY_HOPS)
+    app.extensions['system_details'] = resources
+    
+    @app.before_request
+    def ensure_started():
+        if not resources.started:
+            resources.start()
+    
+    app.register_blueprint(api)
+    if start:
+        resources.start()
+    return app
+
+
+def _resources():
+    return current_app.extensions['system_details']
+
+
+# The current app's per-worker objects, for use inside requests
+settings = LocalProxy(lambda: _resources().settings)
+storage = LocalProxy(lambda: _resources().storage)
+storage_breaker = LocalProxy(lambda: _resources().storage_breaker)
+rate_limiter = LocalProxy(lambda: _resources().rate_limiter)
+db_write_limiter = LocalProxy(lambda: _resources().db_write_limiter)
+idempotency_store = LocalProxy(lambda: _resources().idempotency_store)
+search_index = LocalProxy(lambda: _resources().search_index)
+device_index = LocalProxy(lambda: _resources().device_index)
+background_tasks = LocalProxy(lambda: _resources().background_tasks)
+submission_feed = LocalProxy(lambda: _resources().submission_feed)
+facet_counts = LocalProxy(lambda: _resources().facet_counts)
+count_cache = LocalProxy(lambda: _resources().count_cache)
+ingest_load = LocalProxy(lambda: _resources().ingest_load)
+storage_forecast = LocalProxy(lambda: _resources().storage_forecast)
+
+
+def fill_client_ip(details, force=False):
+    """Use the request's address as ip_address when the reported one is a placeholder (or always, with force)"""
+    client_ip = request.remote_addr
+    if client_ip and (force or is_placeholder_ip(details.get('ip_address'))):
+        details['ip_address'] = client_ip
+        details['ip_address_source'] = 'request'
+    return details
+
+
+def index_stored(stored):
+    """Add a freshly stored row to the in-memory indexes and the live feed; returns its identity flags"""
+    return _resources().index(stored)
+
+
+def render_before_insert():
+    """True if the text report should go into the insert rather than a later update.
+
+    With inline tasks the update would be a second round-trip inside the request;
+    with the breaker not closed the row will most likely be spooled, where a
+    later update by id cannot reach it.
+    """
+    return background_tasks.inline or storage_breaker.state != CLOSED
+
+
+def stored_ids(stored):
+    """(record_id, spool_id) of an insert result, for the background tasks that fill in the row"""
+    if not stored:
+        return None, None
+    return stored.get('id'), stored.get('spool_id')
+
+
+def storage_unavailable(e):
+    """503 response telling the client to retry once the breaker may have closed"""
+    ingest_load.rejected()
+    retry_after = ingest_load.retry_after(settings.BREAKER_COOLDOWN_SECONDS)
+    response = jsonify({'error': str(e), 'retry_after': int(retry_after_header(retry_after))})
+    response.status_code = 503
+    response.headers['Retry-After'] = retry_after_header(retry_after)
+    return response
+
+
+# Longest accepted Idempotency-Key value
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+
+
+# Routes that take collector payloads in either wire format (JSON or MessagePack)
+PAYLOAD_ROUTES = ('/api/system-details', '/api/system-details/batch')
+# Routes whose responses carry the submission schedule hints
+INGEST_ROUTES = PAYLOAD_ROUTES + ('/api/collect-specs',)
+
+
+@api.before_request
+def decode_payload():
+    """Decode MessagePack bodies on the payload routes straight into payload dicts"""
+    if request.method != 'POST' or request.path not in PAYLOAD_ROUTES:
+        return None
+    if request.mimetype not in wire.MSGPACK_CONTENT_TYPES:
+        return None
+    if not wire.MSGPACK_AVAILABLE:
+        return jsonify({'error': f'Unsupported Content-Type {request.mimetype}'}), 415
+    try:
+        g.payload = wire.decode(request.get_data())
+    except wire.WireFormatError as e:
+        return jsonify({'error': str(e)}), 400
+    metrics.inc('msgpack_requests_total', route=request.path)
+    return None
+
+
+@api.after_request
+def advertise_payload_types(response):
+    """Accept-Post tells collectors which body types the payload routes take"""
+    if request.path in PAYLOAD_ROUTES:
+        response.headers['Accept-Post'] = ', '.join(wire.accepted_content_types())
+    return response
+
+
+@api.after_request
+def submission_schedule(response):
+    """Tell collectors when to submit next, stretched and spread out as ingest load grows"""
+    if request.path in INGEST_ROUTES:
+        load = ingest_load.load(db_write_limiter.in_flight, db_write_limiter.max_in_flight,
+                                degraded=storage_breaker.state == OPEN)
+        interval = _resources().collector_policy['submission_interval_seconds']
+        next_after, jitter = ingest_load.schedule(interval, load)
+        response.headers['Next-Submission-After'] = str(next_after)
+        response.headers['Submission-Jitter'] = str(jitter)
+        response.headers['Ingest-Load'] = f"{load:.2f}"
+    return response
+
+
+def request_payload():
+    """Request body as a dict: the decoded MessagePack payload, else parsed JSON (None if neither)"""
+    if 'payload' in g:
+        return g.payload
+    return request.get_json(silent=True)
+
+
+def request_idempotency_key(data):
+    """Idempotency key from the Idempotency-Key header or an `idempotency_key` body field"""
+    key = request.headers.get('Idempotency-Key')
+    if not key and isinstance(data, dict):
+        details = data.get('details') or data.get('system_details') or {}
+        key = data.get('idempotency_key') or (details.get('idempotency_key') if isinstance(details, dict) else None)
+    if not key:
+        return None
+    return str(key).strip()[:MAX_IDEMPOTENCY_KEY_LENGTH] or None
+
+
+def stored_response(stored):
+    """Rebuild a Flask response from an IdempotencyStore entry"""
+    status, body, mimetype = stored
+    response = make_response(body, status)
+    response.mimetype = mimetype
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(view):
+    """Return the stored response when a request repeats a recent Idempotency-Key"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request_idempotency_key(request_payload())
+        if not key:
+            return view(*args, **kwargs)
+        
+        scoped_key = f"{request.path}:{key}"
+        stored, claimed = idempotency_store.begin(scoped_key)
+        if stored is not None:
+            metrics.inc('idempotent_replays_total', route=request.path)
+            return stored_response(stored)
+        if not claimed:
+            response = jsonify({'error': 'A request with this Idempotency-Key is still being processed'})
+            response.status_code = 409
+            response.headers['Retry-After'] = '1'
+            return response
+        
+        try:
+            response = make_response(view(*args, **kwargs))
+        except Exception:
+            idempotency_store.abandon(scoped_key)
+            raise
+        if 200 <= response.status_code < 300:
+            idempotency_store.complete(scoped_key, (response.status_code, response.get_data(), response.mimetype))
+        else:
+            # Failures are not remembered so the client can retry them
+            idempotency_store.abandon(scoped_key)
+        return response
+    return wrapper
+
+
+def ingest_client_keys(data):
+    """Rate-limit keys for an ingest request body (any of the accepted shapes)"""
+    body = data if isinstance(data, dict) else {}
+    submissions = body.get('submissions')
+    if isinstance(submissions, list) and submissions and isinstance(submissions[0], dict):
+        # Batch replays come from one collector; key on its first item
+        body = submissions[0]
+    details = body.get('details') or body.get('system_details') or body.get('client_data') or {}
+    if not isinstance(details, dict):
+        details = {}
+    
+    serial = details.get('serial_number')
+    return {
+        'employee_id': str(body.get('employee_id') or details.get('employee_id') or '').strip(),
+        # Placeholder serials are shared by many machines and must not be throttled together
+        'serial_number': None if is_placeholder_serial(serial) else str(serial).strip(),
+        'ip': request.remote_addr,
+    }
+
+
+def too_many_requests(message, retry_after, reason):
+    """429 response with Retry-After"""
+    metrics.inc('ingest_rejected_total', reason=reason)
+    response = jsonify({'error': message, 'retry_after': int(retry_after_header(retry_after))})
+    response.status_code = 429
+    response.headers['Retry-After'] = retry_after_header(retry_after)
+    return response
+
+
+def admission_controlled(view):
+    """Rate-limit an ingest route per client and cap concurrent database writes"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        keys = ingest_client_keys(request_payload())
+        allowed, retry_after, kind = rate_limiter.check(keys)
+        if not allowed:
+            return too_many_requests(f'Rate limit exceeded for {kind}', retry_after, f'rate_limit_{kind}')
+        
+        if not db_write_limiter.acquire():
+            ingest_load.rejected()
+            return too_many_requests('Server busy, too many writes in flight',
+                                     ingest_load.retry_after(settings.ADMISSION_WAIT_SECONDS), 'concurrency')
+        try:
+            ingest_load.admitted()
+            metrics.inc('ingest_admitted_total', route=request.path)
+            return view(*args, **kwargs)
+        finally:
+            db_write_limiter.release()
+    return wrapper
+
+@api.route('/api/collect-specs', methods=['POST'])
+@idempotent
+@admission_controlled
 def receive_specs():
     """API endpoint to receive system specs from the executable"""
     try:
@@ -103,117 +511,40 @@ def receive_specs():
         print(f"Department: {department}")
         print("========================================")
 
-        # 5. Save to Supabase database (if available)
+        # The backup name keeps the submission time
+        import datetime
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        filename = f"specs_{employee_id}_{timestamp}.json"
+
+        # 5. Save to database (if available)
         db_id = None
-        if supabase:
+        stored = None
+        formatted_text = None
+        identity_flags = []
+        if storage:
             try:
-                # Support both os_info and windows for backward compatibility
-                os_info = details.get('os_info') or details.get('windows', {})
-                ram_info = details.get('ram', {})
-                storage_info = details.get('storage', [])
-                
-                # Helper function to safely convert to numeric or None
-                def safe_numeric(value):
-                    """Convert value to numeric, or None if not numeric"""
-                    if value is None:
-                        return None
-                    if isinstance(value, (int, float)):
-                        return value
-                    if isinstance(value, str):
-                        try:
-                            return float(value)
-                        except (ValueError, TypeError):
-                            if value.lower() in ['not available', 'unknown', 'n/a', 'na']:
-                                return None
-                            return None
-                    return None
-                
-                # Format storage details as JSON string
-                storage_json = json.dumps(storage_info) if storage_info else None
-                
-                # Format the full details as text (for formatted_text field)
-                formatted_text = f"""
-System Details Collection
-==========================
-Employee ID: {employee_id}
-Email: {email}
-Department: {department}
-Collected At: {details.get('collected_at', 'N/A')}
-
-System Information:
--------------------
-Username: {details.get('username', 'Unknown')}
-Hostname: {details.get('hostname', 'Unknown')}
-IP Address: {details.get('ip_address', 'Unknown')}
-System Manufacturer: {details.get('system_manufacturer', 'Unknown')}
-System Model: {details.get('system_model', 'Unknown')}
-Serial Number: {details.get('serial_number', 'Unknown')}
-
-OS Information:
----------------
-System: {os_info.get('system', 'Unknown')}
-Release: {os_info.get('release', 'Unknown')}
-Version: {os_info.get('version', 'Unknown')}
-Platform: {os_info.get('platform', 'Unknown')}
-Processor: {os_info.get('processor', 'Unknown')}
-
-RAM Details:
-------------
-Total RAM: {ram_info.get('total_gb', 'N/A')} GB
-Used RAM: {ram_info.get('used_gb', 'N/A')} GB ({ram_info.get('used_percent', 'N/A')}%)
-Available RAM: {ram_info.get('available_gb', 'N/A')} GB
-Free RAM: {ram_info.get('free_gb', 'N/A')} GB
-
-Storage Details:
-----------------
-{json.dumps(storage_info, indent=2) if storage_info else 'No storage information'}
-"""
-                
-                db_record = {
-                    'employee_id': employee_id,
-                    'email': email,
-                    'department': department,
-                    'username': details.get('username'),
-                    'hostname': details.get('hostname'),
-                    'system_manufacturer': details.get('system_manufacturer'),
-                    'system_model': details.get('system_model'),
-                    'ip_address': details.get('ip_address'),
-                    'serial_number': details.get('serial_number'),
-                    'windows_system': os_info.get('system'),
-                    'windows_release': os_info.get('release'),
-                    'windows_version': os_info.get('version'),
-                    'windows_platform': os_info.get('platform'),
-                    'windows_processor': os_info.get('processor'),
-                    'ram_total_gb': safe_numeric(ram_info.get('total_gb')) if 'error' not in ram_info else None,
-                    'ram_used_gb': safe_numeric(ram_info.get('used_gb')) if 'error' not in ram_info else None,
-                    'ram_available_gb': safe_numeric(ram_info.get('available_gb')) if 'error' not in ram_info else None,
-                    'ram_free_gb': safe_numeric(ram_info.get('free_gb')) if 'error' not in ram_info else None,
-                    'ram_used_percent': safe_numeric(ram_info.get('used_percent')) if 'error' not in ram_info else None,
-                    'storage_details': storage_json,
-                    'formatted_text': formatted_text,
-                    'saved_file': None  # No file saved for executable submissions
-                }
-                
-                result = supabase.table('system_details').insert(db_record).execute()
-                db_id = result.data[0]['id'] if result.data else None
+                details = fill_client_ip(dict(details, employee_id=employee_id, email=email, department=department))
+                # No file saved for executable submissions; the text report is filled in by the backup task
+                # unless it has to be part of the insert
+                formatted_text = format_specs_text(details) if render_before_insert() else None
+                db_record = build_db_record(details, formatted_text, None)
+                stored = storage.insert(db_record)
+                db_id = stored.get('id') if stored else None
+                if stored:
+                    identity_flags = index_stored(stored)
                 print(f"Successfully saved to database with ID: {db_id}")
                 
+            except StorageUnavailable as e:
+                # Nowhere durable to put the record: keep the backup file and let the client retry later
+                background_tasks.submit('specs_backup', write_specs_backup, data, details, filename)
+                return storage_unavailable(e)
             except Exception as e:
-                print(f"Error saving to Supabase database: {e}")
+                print(f"Error saving to database: {e}")
                 # Continue even if database save fails (will still save to file)
         
-        # 6. Also save to file as backup (optional)
-        try:
-            import datetime
-            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"specs_{employee_id}_{timestamp}.json"
-            
-            with open(filename, 'w') as f:
-                json.dump(data, f, indent=4)
-            
-            print(f"Successfully saved data to file: {filename}")
-        except Exception as e:
-            print(f"Error saving to file: {e}")
+        # 6. Text report and backup file, after the response
+        background_tasks.submit('specs_backup', write_specs_backup, data, details, filename,
+                                _resources().storage if formatted_text is None else None, *stored_ids(stored))
 
         # 7. Send success response back to the .exe
         response = {
@@ -222,6 +553,8 @@ Storage Details:
         }
         if db_id:
             response["db_id"] = db_id
+        if identity_flags:
+            response["identity_flags"] = identity_flags
             
         return jsonify(response), 200
 
@@ -233,7 +566,9 @@ Storage Details:
         }), 500
 
 
-@app.route('/api/system-details', methods=['POST'])
+@api.route('/api/system-details', methods=['POST'])
+@idempotent
+@admission_controlled
 def get_system_details():
     """API endpoint to collect system details
     
@@ -241,129 +576,49 @@ def get_system_details():
     If client_data is provided, uses it; otherwise falls back to server-side collection.
     """
     try:
-        data = request.get_json()
-        
-        if not data:
-            return jsonify({'error': 'No data provided'}), 400
-        
-        employee_id = data.get('employee_id', '').strip()
-        email = data.get('email', '').strip()
-        department = data.get('department', '').strip()
+        include_text = request.args.get('include_text', '').lower() in ('1', 'true', 'yes')
+        body, status = process_system_details(request_payload(), include_text)
+        if status == 503:
+            return storage_unavailable(body['error'])
+        return jsonify(body), status
+    except Exception as e:
+        return jsonify({
+            'error': str(e)
+        }), 500
+
+
+@api.route('/api/system-details/batch', methods=['POST'])
+@admission_controlled
+def submit_system_details_batch():
+    """Accept several queued submissions in one request (collector outbox replay)
+    
+    Each item is processed exactly like a /api/system-details body. The response
+    carries one result per item, in order, so clients can drop delivered entries.
+    """
+    try:
+        data = request_payload()
+        submissions = (data or {}).get('submissions')
         
-        # Validate required fields
-        if not employee_id or not email or not department:
+        if not isinstance(submissions, list) or not submissions:
+            return jsonify({'error': 'No submissions provided'}), 400
+        if len(submissions) > MAX_BATCH_SUBMISSIONS:
             return jsonify({
-                'error': 'Missing required fields',
-                'required': ['employee_id', 'email', 'department']
-            }), 400
-        
-        # Check if client-collected system details are provided
-        client_data = data.get('system_details') or data.get('client_data')
-        
-        # Warn if no client data provided in serverless environment
-        if not client_data and is_serverless_environment():
-            import warnings
-            warnings.warn(
-                "No client data provided in serverless environment. "
-                "Server-side collection will return server environment details, not client details.",
-                UserWarning
-            )
-        
-        # Collect system details (uses client_data if provided, otherwise server-side)
-        details = collect_system_details(employee_id, email, department, client_data=client_data)
-        
-        # Add warning flag if server-side collection was used in serverless
-        if not client_data and is_serverless_environment():
-            details['collection_warning'] = (
-                "Server-side collection used in serverless environment. "
-                "Data reflects server environment, not client. "
-                "For accurate client data, provide 'system_details' in request body."
-            )
-        
-        # Format as text
-        formatted_text = format_details_text(details)
-        
-        # Save to file
-        filename = None
-        try:
-            filename = save_details_to_file(formatted_text, employee_id)
-            details['saved_file'] = filename
-        except Exception as e:
-            details['save_error'] = str(e)
-        
-        # Save to Supabase database
-        if supabase:
-            try:
-                # Support both os_info and windows for backward compatibility
-                os_info = details.get('os_info') or details.get('windows', {})
-                ram_info = details.get('ram', {})
-                
-                # Helper function to safely convert to numeric or None
-                def safe_numeric(value):
-                    """Convert value to numeric, or None if not numeric"""
-                    if value is None:
-                        return None
-                    if isinstance(value, (int, float)):
-                        return value
-                    if isinstance(value, str):
-                        # Check if it's a numeric string
-                        try:
-                            return float(value)
-                        except (ValueError, TypeError):
-                            # If it's "Not available", "Unknown", etc., return None
-                            if value.lower() in ['not available', 'unknown', 'n/a', 'na']:
-                                return None
-                            return None
-                    return None
-                
-                db_record = {
-                    'employee_id': employee_id,
-                    'email': email,
-                    'department': department,
-                    'username': details.get('username'),
-                    'hostname': details.get('hostname'),
-                    'system_manufacturer': details.get('system_manufacturer'),
-                    'system_model': details.get('system_model'),
-                    'ip_address': details.get('ip_address'),
-                    'serial_number': details.get('serial_number'),
-                    'windows_system': os_info.get('system'),
-                    'windows_release': os_info.get('release'),
-                    'windows_version': os_info.get('version'),
-                    'windows_platform': os_info.get('platform'),
-                    'windows_processor': os_info.get('processor'),
-                    'ram_total_gb': safe_numeric(ram_info.get('total_gb')) if 'error' not in ram_info else None,
-                    'ram_used_gb': safe_numeric(ram_info.get('used_gb')) if 'error' not in ram_info else None,
-                    'ram_available_gb': safe_numeric(ram_info.get('available_gb')) if 'error' not in ram_info else None,
-                    'ram_free_gb': safe_numeric(ram_info.get('free_gb')) if 'error' not in ram_info else None,
-                    'ram_used_percent': safe_numeric(ram_info.get('used_percent')) if 'error' not in ram_info else None,
-                    'storage_details': json.dumps(details.get('storage', [])),
-                    'formatted_text': formatted_text,
-                    'saved_file': filename
-                }
-                
-                result = supabase.table('system_details').insert(db_record).execute()
-                details['db_id'] = result.data[0]['id'] if result.data else None
-            except Exception as e:
-                print(f"Error saving to Supabase: {e}")
-                details['db_error'] = str(e)
+                'error': f'Too many submissions (max {MAX_BATCH_SUBMISSIONS})'
+            }), 413
         
-        # Add backward compatibility: include 'windows' field if 'os_info' exists
-        response_details = details.copy()
-        if 'os_info' in response_details and 'windows' not in response_details:
-            response_details['windows'] = response_details['os_info']
+        results = []
+        for index, item in enumerate(submissions):
+            body, status = process_batch_item(item)
+            result = {'index': index, 'status': status}
+            if status == 200:
+                result['db_id'] = body['details'].get('db_id')
+            else:
+                result['error'] = body.get('error')
+            results.append(result)
         
-        # Add metadata about collection method
-        response_meta = {
-            'client_data_provided': client_data is not None,
-            'serverless_environment': is_serverless_environment()
-        }
-        
-        # Return both JSON and formatted text
         return jsonify({
             'success': True,
-            'details': response_details,
-            'formatted_text': formatted_text,
-            'meta': response_meta
+            'results': results
         }), 200
         
     except Exception as e:
@@ -372,35 +627,250 @@ def get_system_details():
         }), 500
 
 
-@app.route('/api/health', methods=['GET'])
+def process_batch_item(item):
+    """Process one batch submission, honouring its idempotency_key like a single submit would"""
+    key = batch_item_idempotency_key(item)
+    scoped_key = f"/api/system-details:{key}" if key else None
+    if scoped_key:
+        stored, claimed = idempotency_store.begin(scoped_key, wait_seconds=0)
+        if stored is not None:
+            metrics.inc('idempotent_replays_total', route=request.path)
+            return json.loads(stored[1]), stored[0]
+        if not claimed:
+            return {'error': 'A request with this Idempotency-Key is still being processed'}, 409
+    
+    try:
+        body, status = process_system_details(item)
+    except Exception as e:
+        body, status = {'error': str(e)}, 500
+    
+    if scoped_key:
+        if status == 200:
+            idempotency_store.complete(scoped_key, (status, current_app.json.dumps(body).encode('utf-8'), 'application/json'))
+        else:
+            idempotency_store.abandon(scoped_key)
+    return body, status
+
+
+def batch_item_idempotency_key(item):
+    """idempotency_key field of a batch item (batch items have no per-item headers)"""
+    if not isinstance(item, dict) or not item.get('idempotency_key'):
+        return None
+    return str(item['idempotency_key']).strip()[:MAX_IDEMPOTENCY_KEY_LENGTH] or None
+
+
+def process_system_details(data, include_text=False):
+    """Validate and store one /api/system-details submission; rendering and backup run in the background.
+    
+    include_text renders the text report before responding and returns it as formatted_text.
+    Returns a (response_body, status_code) tuple.
+    """
+    if not data:
+        return {'error': 'No data provided'}, 400
+    
+    employee_id = data.get('employee_id', '').strip()
+    email = data.get('email', '').strip()
+    department = data.get('department', '').strip()
+    
+    # Validate required fields
+    if not employee_id or not email or not department:
+        return {
+            'error': 'Missing required fields',
+            'required': ['employee_id', 'email', 'department']
+        }, 400
+    
+    # Check if client-collected system details are provided
+    client_data = data.get('system_details') or data.get('client_data')
+    
+    # Warn if no client data provided in serverless environment
+    if not client_data and is_serverless_environment():
+        import warnings
+        warnings.warn(
+            "No client data provided in serverless environment. "
+            "Server-side collection will return server environment details, not client details.",
+            UserWarning
+        )
+    
+    # Collect system details (uses client_data if provided, otherwise server-side)
+    try:
+        details = collect_system_details(employee_id, email, department, client_data=client_data,
+                                         profile=data.get('collection_profile') or DEFAULT_PROFILE)
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    
+    # Browsers cannot see their own address; the server can. Server-side collection in a
+    # serverless function reports the function's address, so it is always replaced there
+    fill_client_ip(details, force=not client_data and is_serverless_environment())
+    
+    # Add warning flag if server-side collection was used in serverless
+    if not client_data and is_serverless_environment():
+        details['collection_warning'] = (
+            "Server-side collection used in serverless environment. "
+            "Data reflects server environment, not client. "
+            "For accurate client data, provide 'system_details' in request body."
+        )
+    
+    # The text report and the backup file are produced in the background after the insert
+    # (the report goes into the insert when it cannot be added later, see render_before_insert);
+    # the file name is fixed now so the row and the response can already carry it
+    formatted_text = format_details_text(details) if include_text or render_before_insert() else None
+    filename = details_backup_filename(employee_id)
+    report_details = dict(details)
+    details['saved_file'] = filename
+    
+    # Save to database
+    identity_flags = []
+    stored = None
+    if storage:
+        try:
+            stored = storage.insert(build_db_record(details, formatted_text, filename))
+            details['db_id'] = stored.get('id') if stored else None
+            if stored:
+                identity_flags = index_stored(stored)
+            if stored and stored.get('spooled'):
+                # Held in the local spool; re-drained into the database once it recovers
+                details['db_spooled'] = True
+        except StorageUnavailable as e:
+            background_tasks.submit('system_details_backup', write_details_backup, report_details, employee_id,
+                                    filename, formatted_text)
+            return {'error': str(e)}, 503
+        except Exception as e:
+            print(f"Error saving to database: {e}")
+            details['db_error'] = str(e)
+    
+    background_tasks.submit('system_details_backup', write_details_backup, report_details, employee_id,
+                            filename, formatted_text, _resources().storage, *stored_ids(stored))
+    
+    # Add backward compatibility: include 'windows' field if 'os_info' exists
+    response_details = details.copy()
+    if 'os_info' in response_details and 'windows' not in response_details:
+        response_details['windows'] = response_details['os_info']
+    
+    # Add metadata about collection method
+    response_meta = {
+        'client_data_provided': client_data is not None,
+        'collection_profile': details.get('collection_profile'),
+        'serverless_environment': is_serverless_environment()
+    }
+    if identity_flags:
+        # Same device seen with another employee/hostname/serial, or a placeholder identity
+        response_meta['identity_flags'] = identity_flags
+    
+    body = {
+        'success': True,
+        'details': response_details,
+        'meta': response_meta
+    }
+    if include_text:
+        body['formatted_text'] = formatted_text
+    return body, 200
+
+
+def update_stored_row(storage, record_id, spool_id, fields):
+    """Set columns on the row an insert produced, in the database or still in the spool"""
+    if storage is None:
+        return
+    if record_id is not None:
+        storage.update(record_id, fields)
+    elif spool_id is not None and hasattr(storage, 'update_spooled'):
+        if not storage.update_spooled(spool_id, fields):
+            print(f"Spooled record {spool_id} was re-drained before its text report was stored")
+
+
+def write_details_backup(details, employee_id, filename, formatted_text=None, storage=None, record_id=None,
+                         spool_id=None):
+    """Render the text report, write the .txt backup and store the text on the row"""
+    text = formatted_text or format_details_text(details)
+    try:
+        save_details_to_file(text, employee_id, filename)
+    except OSError:
+        update_stored_row(storage, record_id, spool_id, {'formatted_text': text, 'saved_file': None})
+        raise
+    if formatted_text is None:
+        update_stored_row(storage, record_id, spool_id, {'formatted_text': text})
+    return filename
+
+
+def write_specs_backup(data, details, filename, storage=None, record_id=None, spool_id=None):
+    """Render the specs text report onto the row (with storage) and write the .json backup of the request"""
+    update_stored_row(storage, record_id, spool_id, {'formatted_text': format_specs_text(details)})
+    with open(filename, 'w') as f:
+        json.dump(data, f, indent=4)
+    return filename
+
+
+@api.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
     return jsonify({'status': 'ok', 'message': 'API is running'}), 200
 
 
-@app.route('/api/admin/submissions', methods=['GET'])
+@api.route('/api/whoami', methods=['GET'])
+def whoami():
+    """The caller's IP address as this server sees it (after trusted proxies), for the web collector"""
+    response = make_response(jsonify({'ip': request.remote_addr}), 200)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+@api.route('/api/collector/config', methods=['GET'])
+def collector_config():
+    """Versioned collection policy for the collectors; answers 304 to a matching If-None-Match"""
+    resources = _resources()
+    response = make_response(jsonify({'success': True, 'policy': resources.collector_policy}), 200)
+    response.set_etag(resources.collector_policy_etag)
+    response.headers['Cache-Control'] = f"public, max-age={resources.collector_policy['max_age_seconds']}"
+    return response.make_conditional(request)
+
+
+@api.route('/api/admin/metrics', methods=['GET'])
+def get_metrics():
+    """Admin endpoint exposing in-process counters (admission rejections etc.)"""
+    metrics.set('db_writes_in_flight', db_write_limiter.in_flight)
+    metrics.set('storage_circuit_state', storage_breaker.state)
+    metrics.set('search_index_documents', len(search_index))
+    metrics.set('background_tasks_pending', background_tasks.pending)
+    metrics.set('stream_clients', submission_feed.subscriber_count)
+    metrics.set('ingest_load', round(ingest_load.load(db_write_limiter.in_flight, db_write_limiter.max_in_flight), 2))
+    # Counters are per worker process; each scrape sees the worker that answered it
+    return jsonify({'success': True, 'worker': os.getpid(), 'metrics': metrics.snapshot()}), 200
+
+
+@api.route('/api/admin/submissions', methods=['GET'])
 def get_all_submissions():
-    """Admin endpoint to get all system details submissions"""
+    """Admin endpoint to get all system details submissions
+    
+    Supports offset or cursor pagination and equality filters
+    (department, serial_number, employee_id, hostname, ...). count is the page
+    size; total is the number of matching rows and facets the counts per
+    department, OS and model (within the department filter, if any).
+    """
     try:
-        if not supabase:
+        if not storage:
             return jsonify({'error': 'Database connection not available'}), 500
         
         # Get query parameters for pagination
         limit = request.args.get('limit', default=100, type=int)
         offset = request.args.get('offset', default=0, type=int)
+        cursor = request.args.get('cursor')
+        filters = {key: value for key, value in request.args.items() if key not in ('limit', 'offset', 'cursor')}
         
-        # Query Supabase
-        result = supabase.table('system_details')\
-            .select('*')\
-            .order('created_at', desc=True)\
-            .limit(limit)\
-            .offset(offset)\
-            .execute()
+        try:
+            rows, next_cursor = storage.list(filters, limit=limit, cursor=cursor, offset=offset)
+            total, total_source = submission_total(filters)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except StorageUnavailable as e:
+            return storage_unavailable(e)
         
         return jsonify({
             'success': True,
-            'submissions': result.data,
-            'count': len(result.data)
+            'submissions': rows,
+            'count': len(rows),
+            'total': total,
+            'total_source': total_source,
+            'facets': facet_counts.facets(department=filters.get('department')) if facet_counts.ready else None,
+            'next_cursor': next_cursor
         }), 200
         
     except Exception as e:
@@ -409,24 +879,220 @@ def get_all_submissions():
         }), 500
 
 
-@app.route('/api/admin/submissions/<submission_id>', methods=['GET'])
+def submission_total(filters):
+    """(total, source) for a listing: ingest-time counters when they cover the filters, else a cached count"""
+    filters = clean_filters(filters)
+    total = facet_counts.count(filters)
+    if total is not None:
+        return total, 'counters'
+    total, cached = count_cache.count(storage, filters)
+    return total, 'cache' if cached else 'store'
+
+
+@api.route('/api/admin/search', methods=['GET'])
+def search_submissions():
+    """Search submissions by hostname, username, model, manufacturer, processor, OS release or department
+    
+    q holds space-separated clauses, all of which must match: `i5`, `processor:i5`,
+    `hostname:FIN-*` (prefix). Returns submission ids, newest first.
+    """
+    if not settings.SEARCH_INDEX_ENABLED:
+        return jsonify({'error': 'Search index is disabled (SEARCH_INDEX_ENABLED=false)'}), 404
+    if not search_index.ready:
+        response = jsonify({'error': 'Search index is still being built'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '5'
+        return response
+    
+    limit = max(1, min(request.args.get('limit', default=DEFAULT_RESULT_LIMIT, type=int), MAX_RESULT_LIMIT))
+    started = time.perf_counter()
+    try:
+        ids, total = search_index.search(request.args.get('q', ''), limit=limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({
+        'success': True,
+        'query': request.args.get('q', ''),
+        'ids': ids,
+        'count': len(ids),
+        'total': total,
+        'took_ms': round((time.perf_counter() - started) * 1000, 3)
+    }), 200
+
+
+@api.route('/api/admin/conflicts', methods=['GET'])
+def get_identity_conflicts():
+    """Devices whose identity disagrees across submissions, plus placeholder identity counts
+    
+    kind narrows the list to one of serial_employees, serial_hostnames,
+    hostname_serials or ip_devices. Most recently detected first.
+    """
+    if not settings.DEVICE_INDEX_ENABLED:
+        return jsonify({'error': 'Device index is disabled (DEVICE_INDEX_ENABLED=false)'}), 404
+    if not device_index.ready:
+        response = jsonify({'error': 'Device index is still being built'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '5'
+        return response
+    
+    kind = request.args.get('kind') or None
+    if kind is not None and kind not in CONFLICT_KINDS:
+        return jsonify({'error': f"Unknown conflict kind '{kind}'. Use one of: {', '.join(CONFLICT_KINDS)}"}), 400
+    limit = max(1, min(request.args.get('limit', default=100, type=int), 1000))
+    
+    report = device_index.report(kind=kind, limit=limit)
+    return jsonify(dict(report, success=True, count=len(report['conflicts']))), 200
+
+
+@api.route('/api/admin/daily-summaries', methods=['GET'])
+def get_daily_summaries():
+    """Per-device daily summaries of compacted snapshots, newest day first
+    
+    day_from/day_to (YYYY-MM-DD, inclusive) bound the range; equality filters on
+    device_key, employee_id, department, hostname, serial_number and system_model.
+    """
+    if not storage:
+        return jsonify({'error': 'Database connection not available'}), 500
+    limit = request.args.get('limit', default=100, type=int)
+    offset = max(0, request.args.get('offset', default=0, type=int))
+    filters = {key: value for key, value in request.args.items()
+               if key not in ('limit', 'offset', 'day_from', 'day_to')}
+    try:
+        rows = storage.list_daily(filters, request.args.get('day_from'), request.args.get('day_to'),
+                                  limit=limit, offset=offset)
+    except StorageUnavailable as e:
+        return storage_unavailable(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    for row in rows:
+        row['storage_summary'] = json.loads(row.get('storage_summary') or '[]')
+        row['source_ids'] = json.loads(row.get('source_ids') or '[]')
+    return jsonify({'success': True, 'summaries': rows, 'count': len(rows)}), 200
+
+
+@api.route('/api/admin/analytics', methods=['GET'])
+def get_fleet_analytics():
+    """Aggregates over the columnar archive (see columnar_archive.py)
+    
+    metric is a numeric column (omit to count rows), group_by a comma-separated
+    list of dimensions, where a repeatable filter such as department=IT or
+    ram_total_gb>=16, percentiles a comma-separated list (default 50,90,99).
+    """
+    if not NUMPY_AVAILABLE:
+        return jsonify({'error': 'Fleet analytics needs NumPy on the server (pip install numpy)'}), 501
+    if not os.path.isdir(settings.ANALYTICS_ARCHIVE_DIR):
+        return jsonify({'error': 'No columnar archive yet; run columnar_archive.py first'}), 404
+    try:
+        result = run_query(
+            settings.ANALYTICS_ARCHIVE_DIR,
+            metric=request.args.get('metric') or None,
+            group_by=[column for column in request.args.get('group_by', '').split(',') if column],
+            where=request.args.getlist('where'),
+            percentiles=parse_percentiles(request.args.get('percentiles', '50,90,99')),
+            limit=request.args.get('limit', default=DEFAULT_GROUP_LIMIT, type=int),
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(dict(result, success=True)), 200
+
+
+@api.route('/api/admin/forecast/storage', methods=['GET'])
+def get_storage_forecast():
+    """Mounts predicted to fill up, soonest first
+    
+    Trends are fitted per device and mount from the storage_details of its
+    snapshots and updated on every insert. Optional department and max_days
+    filters; include_stable=true also lists mounts that are not growing.
+    """
+    if not settings.STORAGE_FORECAST_ENABLED:
+        return jsonify({'error': 'Storage forecast is disabled (STORAGE_FORECAST_ENABLED=false)'}), 404
+    if not storage_forecast.ready:
+        response = jsonify({'error': 'Storage forecast is still being built'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '5'
+        return response
+    
+    limit = max(1, min(request.args.get('limit', default=DEFAULT_FORECAST_LIMIT, type=int), MAX_FORECAST_LIMIT))
+    report = storage_forecast.report(
+        department=request.args.get('department') or None,
+        max_days=request.args.get('max_days', type=float),
+        include_stable=request.args.get('include_stable', '').lower() == 'true',
+        limit=limit,
+    )
+    return jsonify(dict(report, success=True, count=len(report['forecasts']))), 200
+
+
+@api.route('/api/admin/submissions/stream', methods=['GET'])
+def stream_submissions():
+    """Server-Sent Events: one compact `submission` event per new insert
+    
+    Optional department filter. A reconnecting client sends Last-Event-ID (the
+    browser EventSource does this itself) and gets the events it missed from a
+    bounded buffer; if that id is too old it receives a `reset` event and should
+    reload the list from /api/admin/submissions before continuing.
+    """
+    feed = submission_feed._get_current_object()
+    if feed.subscriber_count >= settings.STREAM_MAX_CLIENTS:
+        response = jsonify({'error': 'Too many stream clients'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '30'
+        return response
+    
+    department = request.args.get('department') or None
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id') or None
+    heartbeat_seconds = settings.STREAM_HEARTBEAT_SECONDS
+    max_seconds = settings.STREAM_MAX_SECONDS
+    
+    def events():
+        # Subscribed on the first read, so a response that is never sent leaves nothing behind
+        subscription, backlog, resumed = feed.subscribe(department, last_event_id)
+        try:
+            # Client reconnect delay, in milliseconds
+            yield 'retry: 3000\n\n'
+            if not resumed:
+                yield format_sse({'last_event_id': last_event_id}, event='reset')
+            for event in backlog:
+                yield format_sse(event, event['id'], 'submission')
+            # Streams end after max_seconds so worker threads get recycled; EventSource reconnects
+            deadline = time.monotonic() + max_seconds
+            while time.monotonic() < deadline:
+                event = subscription.get(timeout=heartbeat_seconds)
+                if event is None:
+                    if subscription.overflowed:
+                        # Too far behind: end here and resume from the buffer on reconnect
+                        return
+                    yield ': keepalive\n\n'
+                    continue
+                yield format_sse(event, event['id'], 'submission')
+        finally:
+            feed.unsubscribe(subscription)
+    
+    response = Response(stream_with_context(events()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Tell nginx-style proxies not to buffer the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@api.route('/api/admin/submissions/<submission_id>', methods=['GET'])
 def get_submission_by_id(submission_id):
     """Get a specific submission by ID"""
     try:
-        if not supabase:
+        if not storage:
             return jsonify({'error': 'Database connection not available'}), 500
         
-        result = supabase.table('system_details')\
-            .select('*')\
-            .eq('id', submission_id)\
-            .execute()
+        try:
+            submission = storage.get_by_id(submission_id)
+        except StorageUnavailable as e:
+            return storage_unavailable(e)
         
-        if not result.data:
+        if not submission:
             return jsonify({'error': 'Submission not found'}), 404
         
         return jsonify({
             'success': True,
-            'submission': result.data[0]
+            'submission': submission
         }), 200
         
     except Exception as e:
@@ -436,8 +1102,9 @@ def get_submission_by_id(submission_id):
 
 
 if __name__ == '__main__':
-    print(f"Starting Flask API server on http://{FLASK_HOST}:{FLASK_PORT}")
-    print(f"API endpoint: {API_BASE_URL}/api/system-details")
-    print(f"Debug mode: {FLASK_DEBUG}")
-    app.run(debug=FLASK_DEBUG, host=FLASK_HOST, port=FLASK_PORT)
+    # Single-process development server; for production see wsgi.py / gunicorn.conf.py
+    print(f"Starting Flask API server on http://{config.FLASK_HOST}:{config.FLASK_PORT}")
+    print(f"API endpoint: {config.API_BASE_URL}/api/system-details")
+    print(f"Debug mode: {config.FLASK_DEBUG}")
+    create_app().run(debug=config.FLASK_DEBUG, host=config.FLASK_HOST, port=config.FLASK_PORT)
 
@@ -1,7 +1,9 @@
 # app.py
 # Simple wrapper so Vercel finds a Flask 'app' entrypoint.
 
-from api_server import app
+from api_server import create_app
+
+app = create_app()
 
 # Optionally expose application also as 'application' for WSGI compatibility:
 # application = app
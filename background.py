@@ -0,0 +1,84 @@
+"""
+Background Tasks
+Small bounded executor for side effects that do not have to finish before
+the HTTP response: rendering the text report, writing backup files. Each
+task is logged when it completes and counted in the metrics registry.
+"""
+
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import metrics
+
+
+class BackgroundTasks:
+    """Thread pool with a cap on queued + running tasks.
+
+    When the cap is reached submit() runs the task in the calling thread, so a
+    slow disk slows requests down instead of growing an unbounded queue. With
+    workers=0 every task runs inline (serverless: nothing runs after the response).
+    """
+
+    def __init__(self, workers=2, max_pending=1000):
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='background') if workers > 0 else None
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self.pending = 0
+
+    @property
+    def inline(self):
+        """True if every task runs in the calling thread (workers=0)"""
+        return self._executor is None
+
+    def submit(self, name, func, *args, **kwargs):
+        """Run func(*args, **kwargs) in the background; returns True if it was queued"""
+        if self._executor is None:
+            self._run(name, func, args, kwargs, time.monotonic())
+            return False
+        if not self._slots.acquire(blocking=False):
+            metrics.inc('background_tasks_inline_total', task=name)
+            self._run(name, func, args, kwargs, time.monotonic())
+            return False
+        with self._lock:
+            self.pending += 1
+        try:
+            self._executor.submit(self._run_queued, name, func, args, kwargs, time.monotonic())
+        except RuntimeError:
+            # Shutting down: do it now rather than lose it
+            self._release()
+            self._run(name, func, args, kwargs, time.monotonic())
+            return False
+        return True
+
+    def _release(self):
+        with self._lock:
+            self.pending -= 1
+        self._slots.release()
+
+    def _run_queued(self, name, func, args, kwargs, queued_at):
+        try:
+            self._run(name, func, args, kwargs, queued_at)
+        finally:
+            self._release()
+
+    @staticmethod
+    def _run(name, func, args, kwargs, queued_at):
+        started = time.monotonic()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            metrics.inc('background_task_errors_total', task=name)
+            print(f"Background task {name} failed: {type(e).__name__}: {e}")
+            return None
+        finished = time.monotonic()
+        metrics.inc('background_tasks_total', task=name)
+        print(f"Background task {name} done in {(finished - started) * 1000:.0f} ms "
+              f"(waited {(started - queued_at) * 1000:.0f} ms){f': {result}' if result else ''}")
+        return result
+
+    def shutdown(self, wait=True):
+        """Stop accepting tasks; with wait, finish the queued ones first"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
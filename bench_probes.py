@@ -0,0 +1,73 @@
+"""
+Probe Benchmark
+Compares the native /proc backend (procfs.py) with psutil for the RAM and
+storage probes: checks that both produce the same storage/ram entries, then
+times each.
+
+Usage:
+    python bench_probes.py [iterations]
+"""
+
+import sys
+import timeit
+import contextlib
+
+import get_system_details as gsd
+
+
+@contextlib.contextmanager
+def only(backend):
+    """Run the probes with one backend, the other disabled"""
+    saved = gsd.PROCFS_AVAILABLE, gsd.PSUTIL_AVAILABLE
+    gsd.PROCFS_AVAILABLE = backend == 'procfs'
+    gsd.PSUTIL_AVAILABLE = backend == 'psutil'
+    try:
+        yield
+    finally:
+        gsd.PROCFS_AVAILABLE, gsd.PSUTIL_AVAILABLE = saved
+
+
+def collect(backend):
+    """(ram, storage) from one backend"""
+    with only(backend):
+        return gsd.get_ram_details(), gsd.get_storage_details()
+
+
+def compare():
+    """Print any difference between the two backends' entries"""
+    procfs_ram, procfs_storage = collect('procfs')
+    psutil_ram, psutil_storage = collect('psutil')
+    same = True
+    # available/used move between the two reads; the field set and everything static must match
+    if set(procfs_ram) != set(psutil_ram) or procfs_ram.get('total_gb') != psutil_ram.get('total_gb'):
+        print(f"RAM differs:\n  procfs {procfs_ram}\n  psutil {psutil_ram}")
+        same = False
+    static = ('drive', 'device', 'fstype', 'total_gb')
+    procfs_mounts = [tuple(d.get(k) for k in static) for d in procfs_storage]
+    psutil_mounts = [tuple(d.get(k) for k in static) for d in psutil_storage]
+    if procfs_mounts != psutil_mounts:
+        print(f"Storage differs:\n  procfs {procfs_mounts}\n  psutil {psutil_mounts}")
+        same = False
+    print("Outputs match" if same else "Outputs differ")
+    return same
+
+
+def main(iterations=200):
+    if not gsd.PROCFS_AVAILABLE:
+        print("procfs backend is Linux-only")
+        return 1
+    if not gsd.PSUTIL_AVAILABLE:
+        print("psutil is not installed; nothing to compare against")
+        return 1
+    ok = compare()
+    for backend in ('procfs', 'psutil'):
+        # Each probe timed on its own, so the RAM figure is not dominated by the storage scan
+        with only(backend):
+            ram = timeit.timeit(gsd.get_ram_details, number=iterations) / iterations
+            storage = timeit.timeit(gsd.get_storage_details, number=iterations) / iterations
+        print(f"{backend:7s} ram {ram * 1e6:8.1f} us   storage {storage * 1e6:8.1f} us")
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 200))
@@ -0,0 +1,56 @@
+"""
+Wire Format Benchmark
+Compares JSON and MessagePack (wire.py) bodies for a collector payload: body
+size, client-side encode time and server-side decode time.
+
+Usage:
+    python bench_wire.py [mounts] [iterations]
+"""
+
+import sys
+import json
+import timeit
+
+import wire
+from api_client import build_payload
+from get_system_details import collect_system_details, storage_entry
+
+
+def sample_payload(mounts):
+    """A quick-profile payload from this machine, padded to `mounts` storage entries"""
+    details = collect_system_details('E12345', 'someone@example.com', 'Engineering', profile='quick')
+    storage = [e for e in details['storage'] if 'total_bytes' in e]
+    for i in range(len(storage), mounts):
+        storage.append(storage_entry(f'/mnt/volume{i}', 512 * 1024**3 + i, 200 * 1024**3 + i,
+                                     280 * 1024**3, f'/dev/sd{chr(97 + i % 26)}1', 'ext4'))
+    details['storage'] = storage[:mounts]
+    return build_payload(details)
+
+
+def main(mounts=8, iterations=2000):
+    if not wire.MSGPACK_AVAILABLE:
+        print("msgpack is not installed (pip install msgpack)")
+        return 1
+    payload = sample_payload(mounts)
+    json_bytes = json.dumps(wire.json_body(payload)).encode('utf-8')
+    msgpack_bytes = wire.encode(payload)
+
+    print(f"Payload with {len(payload['system_details']['storage'])} storage entries")
+    print(f"  JSON     {len(json_bytes):6d} bytes")
+    print(f"  msgpack  {len(msgpack_bytes):6d} bytes ({len(msgpack_bytes) / len(json_bytes):.0%} of JSON)")
+
+    timings = {
+        'JSON encode': lambda: json.dumps(wire.json_body(payload)).encode('utf-8'),
+        'msgpack encode': lambda: wire.encode(payload),
+        'JSON decode': lambda: json.loads(json_bytes),
+        'msgpack decode': lambda: wire.decode(msgpack_bytes),
+    }
+    for name, func in timings.items():
+        seconds = timeit.timeit(func, number=iterations) / iterations
+        print(f"  {name:15s} {seconds * 1e6:8.1f} us")
+    return 0
+
+
+if __name__ == '__main__':
+    args = [int(a) for a in sys.argv[1:3]]
+    sys.exit(main(*args))
@@ -0,0 +1,111 @@
+"""
+Circuit Breaker
+Stops calling a dependency (the primary database) once its recent failure
+rate crosses a threshold, lets a single probe through after a cool-down,
+and closes again when the probe succeeds.
+"""
+
+import time
+import threading
+from collections import deque
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the dependency while the circuit is open"""
+
+
+class CircuitBreaker:
+    """Failure-rate circuit breaker over a rolling window of recent calls.
+
+    Calls slower than slow_call_seconds count as failures, so a database that
+    hangs trips the breaker just like one that errors. With is_failure set,
+    only exceptions it accepts count as failures; the rest (a validation error
+    from a database that is up) count as successful calls and are re-raised.
+    """
+
+    def __init__(self, name='primary', failure_rate_threshold=0.5, window_size=20,
+                 min_calls=5, cooldown_seconds=30.0, slow_call_seconds=None, is_failure=None):
+        self.name = name
+        self.is_failure = is_failure
+        self.failure_rate_threshold = failure_rate_threshold
+        self.min_calls = min_calls
+        self.cooldown_seconds = cooldown_seconds
+        self.slow_call_seconds = slow_call_seconds
+        self._outcomes = deque(maxlen=window_size)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.cooldown_seconds:
+                return HALF_OPEN
+            return self._state
+
+    def allow_request(self):
+        """True if a call may go through now (in half-open, only one probe at a time)"""
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN:
+                if time.monotonic() - self._opened_at < self.cooldown_seconds:
+                    return False
+                self._state = HALF_OPEN
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self._state == HALF_OPEN:
+                # Probe succeeded: start over with a clean window
+                self._state = CLOSED
+                self._outcomes.clear()
+                self._probe_in_flight = False
+                print(f"Circuit '{self.name}' closed")
+                return
+            self._outcomes.append(True)
+
+    def record_failure(self):
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._trip()
+                return
+            self._outcomes.append(False)
+            if len(self._outcomes) >= self.min_calls:
+                failures = self._outcomes.count(False)
+                if failures / len(self._outcomes) >= self.failure_rate_threshold:
+                    self._trip()
+
+    def _trip(self):
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._probe_in_flight = False
+        self._outcomes.clear()
+        print(f"Circuit '{self.name}' opened for {self.cooldown_seconds}s")
+
+    def call(self, func, *args, **kwargs):
+        """Run func through the breaker. Raises CircuitOpenError if not allowed."""
+        if not self.allow_request():
+            raise CircuitOpenError(f"Circuit '{self.name}' is open")
+        started = time.monotonic()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            if self.is_failure is None or self.is_failure(e):
+                self.record_failure()
+            else:
+                self.record_success()
+            raise
+        if self.slow_call_seconds is not None and time.monotonic() - started > self.slow_call_seconds:
+            self.record_failure()
+        else:
+            self.record_success()
+        return result
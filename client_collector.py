@@ -7,72 +7,86 @@ Run this script on Windows machines to collect accurate system details.
 import requests
 import json
 import sys
-from get_system_details import collect_system_details
+import argparse
+from get_system_details import collect_system_details, COLLECTION_PROFILES, DEFAULT_PROFILE
+from api_client import DEFAULT_API_URL, build_payload
+from outbox import Outbox, is_retryable_failure
+from collector_policy import policy_client
 
-def send_to_api(api_url, employee_id, email, department):
-    """Collect system details and send to API"""
+
+def queue_for_later(outbox, payload):
+    """Keep an undelivered payload in the local outbox"""
+    try:
+        if outbox.add(payload):
+            print(f"📥 Saved to outbox ({outbox.path}); it will be sent on the next run.")
+    except OSError as e:
+        print(f"⚠️  Could not write outbox: {e}")
+
+
+def send_to_api(api_url, employee_id, email, department, profile=None):
+    """Collect system details and send to API (profile None = the server's collector policy)"""
+    outbox = Outbox()
+    payload = None
     try:
+        # Server-side collector policy: profile, probe timeouts, batch size (cached between runs)
+        client, policy = policy_client(api_url)
+        profile = profile or policy['profile']
+        
         # Collect system details on client machine
-        print("Collecting system details...")
-        details = collect_system_details(employee_id, email, department)
+        print(f"Collecting system details ({profile} profile)...")
+        details = collect_system_details(employee_id, email, department, profile=profile,
+                                         timeouts=policy['timeouts'])
         
         # Prepare request payload with client-collected data
-        payload = {
-            'employee_id': employee_id,
-            'email': email,
-            'department': department,
-            'system_details': {
-                'username': details.get('username'),
-                'hostname': details.get('hostname'),
-                'system_manufacturer': details.get('system_manufacturer'),
-                'system_model': details.get('system_model'),
-                'ip_address': details.get('ip_address'),
-                'serial_number': details.get('serial_number'),
-                'os_info': details.get('os_info') or details.get('windows', {}),
-                'storage': details.get('storage', []),
-                'ram': details.get('ram', {}),
-                'collected_at': details.get('collected_at')
-            }
-        }
+        payload = build_payload(details, employee_id, email, department)
         
-        # Send to API
-        print(f"Sending data to {api_url}...")
-        response = requests.post(
-            f"{api_url}/api/system-details",
-            json=payload,
-            headers={'Content-Type': 'application/json'},
-            timeout=30
-        )
+        # Send to API (pooled session, retries transient failures)
+        print(f"Sending data to {client.api_url}...")
+        response = client.submit(payload)
         
         if response.status_code == 200:
             result = response.json()
             print("\n✅ Success! System details sent to API.")
             print(f"\nResponse: {json.dumps(result, indent=2)}")
+            
+            # API is reachable: replay anything left over from earlier runs
+            replayed = outbox.flush(client, batch_size=policy['batch_size'])
+            if replayed:
+                print(f"📤 Replayed {replayed} queued submission(s) from the outbox.")
             return result
         else:
             print(f"\n❌ Error: {response.status_code}")
             print(f"Response: {response.text}")
+            if is_retryable_failure(response):
+                queue_for_later(outbox, payload)
+                if outbox.defer_for(response):
+                    # Busy server: the outbox waits until it asked clients to come back (plus jitter)
+                    print("⏳ Server is busy; the saved submission will be retried later.")
             return None
             
     except requests.exceptions.RequestException as e:
         print(f"\n❌ Network error: {e}")
+        if payload is not None:
+            queue_for_later(outbox, payload)
         return None
     except Exception as e:
         print(f"\n❌ Error: {e}")
         return None
 
-
 if __name__ == '__main__':
     # Default API URL (can be overridden via command line)
-    API_URL = 'https://backend-blue-beta.vercel.app'
-    
-    if len(sys.argv) > 1:
-        API_URL = sys.argv[1]
+    parser = argparse.ArgumentParser(description="Collect system details and send them to the API")
+    parser.add_argument('api_url', nargs='?', default=DEFAULT_API_URL, help="API base URL")
+    parser.add_argument('--profile', choices=sorted(COLLECTION_PROFILES), default=None,
+                        help=f"Collection profile (default: the server's collector policy, else {DEFAULT_PROFILE})")
+    args = parser.parse_args()
+    API_URL = args.api_url
     
     print("=" * 60)
     print("System Details Client Collector")
     print("=" * 60)
-    print(f"API URL: {API_URL}\n")
+    print(f"API URL: {API_URL}")
+    print(f"Profile: {args.profile or 'from server policy'}\n")
     
     # Get user input
     employee_id = input("Enter Employee ID: ").strip()
@@ -84,7 +98,7 @@ if __name__ == '__main__':
         sys.exit(1)
     
     # Send to API
-    result = send_to_api(API_URL, employee_id, email, department)
+    result = send_to_api(API_URL, employee_id, email, department, args.profile)
     
     if result:
         print("\n" + "=" * 60)
@@ -0,0 +1,291 @@
+"""
+Resident Collector Agent
+Keeps running in the background, samples RAM and storage at a short interval
+and ships a compact min/max/avg summary to the API on a longer interval.
+
+Identity facts (hostname, serial number, model, OS...) are probed once at
+startup and refreshed rarely; each sample only runs the `quick` probes, which
+never start a subprocess. Memory stays bounded: the aggregator keeps running
+totals per metric, not the samples themselves.
+
+Usage:
+    python collector_agent.py --employee-id E123 --email me@example.com --department IT
+    python collector_agent.py https://my-api.example.com --sample-interval 30 --report-interval 600 ...
+"""
+
+import sys
+import time
+import signal
+import argparse
+import datetime
+import threading
+
+import requests
+
+from get_system_details import (
+    collect_system_details, run_probe, get_profile, COLLECTION_PROFILES, DEFAULT_PROFILE,
+)
+from api_client import DEFAULT_API_URL, build_payload, schedule_delay
+from outbox import Outbox, is_retryable_failure
+from collector_policy import DEFAULT_POLICY, policy_client
+
+DEFAULT_SAMPLE_INTERVAL = 60           # seconds between RAM/storage samples
+DEFAULT_REPORT_INTERVAL = DEFAULT_POLICY['submission_interval_seconds']  # unless the server's policy says otherwise
+DEFAULT_IDENTITY_REFRESH = 24 * 3600   # seconds between full identity re-probes
+
+# Upper bound on tracked mounts, so a machine with hundreds of mounts cannot grow the aggregator
+MAX_TRACKED_MOUNTS = 32
+
+
+class RunningStat:
+    """Count/min/max/sum of one metric; O(1) memory regardless of sample count"""
+
+    __slots__ = ('count', 'min', 'max', 'total')
+
+    def __init__(self):
+        self.count = 0
+        self.min = None
+        self.max = None
+        self.total = 0.0
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def summary(self):
+        return {
+            'min': self.min,
+            'max': self.max,
+            'avg': round(self.total / self.count, 2),
+        }
+
+
+class UsageAggregator:
+    """Folds RAM/storage samples into per-metric running statistics"""
+
+    def __init__(self, max_mounts=MAX_TRACKED_MOUNTS):
+        self.max_mounts = max_mounts
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.samples = 0
+        self.window_start = None
+        self.window_end = None
+        self.ram_used_percent = RunningStat()
+        self.ram_used_gb = RunningStat()
+        self.storage = {}
+
+    def add_sample(self, ram, storage):
+        """Record one sample (get_ram_details() / get_storage_details() shapes)"""
+        now = datetime.datetime.now().isoformat()
+        with self._lock:
+            self.samples += 1
+            self.window_start = self.window_start or now
+            self.window_end = now
+            if ram and 'error' not in ram:
+                if isinstance(ram.get('used_percent'), (int, float)):
+                    self.ram_used_percent.add(ram['used_percent'])
+                if isinstance(ram.get('used_gb'), (int, float)):
+                    self.ram_used_gb.add(ram['used_gb'])
+            for mount in storage or []:
+                drive = mount.get('drive')
+                if not drive or not isinstance(mount.get('used_percent'), (int, float)):
+                    continue
+                stat = self.storage.get(drive)
+                if stat is None:
+                    if len(self.storage) >= self.max_mounts:
+                        continue
+                    stat = self.storage[drive] = RunningStat()
+                stat.add(mount['used_percent'])
+
+    def drain(self):
+        """Return the summary of the current window and start a new one (None if empty)"""
+        with self._lock:
+            if not self.samples:
+                return None
+            summary = {
+                'window_start': self.window_start,
+                'window_end': self.window_end,
+                'samples': self.samples,
+                'ram_used_percent': self.ram_used_percent.summary() if self.ram_used_percent.count else None,
+                'ram_used_gb': self.ram_used_gb.summary() if self.ram_used_gb.count else None,
+                'storage_used_percent': {drive: stat.summary() for drive, stat in self.storage.items()},
+            }
+            self.reset()
+            return summary
+
+
+class CollectorAgent:
+    """Samples on one interval, reports on another, sleeps in between.
+
+    report_interval and identity_profile left as None follow the server's
+    collector policy, which is re-checked (from its local cache) before each report.
+    """
+
+    def __init__(self, api_url, employee_id, email, department,
+                 sample_interval=DEFAULT_SAMPLE_INTERVAL, report_interval=None,
+                 identity_profile=None, identity_refresh=DEFAULT_IDENTITY_REFRESH,
+                 outbox=None):
+        self.api_url = api_url
+        self.employee_id = employee_id
+        self.email = email
+        self.department = department
+        self.sample_interval = sample_interval
+        self._report_interval = report_interval
+        self._identity_profile = identity_profile
+        self.report_interval = report_interval or DEFAULT_REPORT_INTERVAL
+        self.identity_profile = identity_profile or DEFAULT_PROFILE
+        self.identity_refresh = identity_refresh
+        self.client = None
+        self.policy = dict(DEFAULT_POLICY)
+        self.outbox = outbox or Outbox()
+        self.aggregator = UsageAggregator()
+        self.identity = None
+        self._identity_at = 0.0
+        self._quick = get_profile('quick')
+        self._latest = {}
+        self._stop = threading.Event()
+
+    def refresh_policy(self):
+        """Apply the current collector policy to whatever was not set explicitly"""
+        self.client, self.policy = policy_client(self.api_url)
+        self.report_interval = self._report_interval or max(self.policy['submission_interval_seconds'],
+                                                            self.sample_interval)
+        self.identity_profile = self._identity_profile or self.policy['profile']
+
+    def next_report_delay(self):
+        """Seconds until the next report: the interval, stretched and jittered by the server's load hints"""
+        schedule = self.client.last_schedule if self.client else None
+        if schedule:
+            # The hint is for the policy interval; stretch ours (which may be set explicitly) the same way
+            scale = self.report_interval / self.policy['submission_interval_seconds']
+            schedule = dict(schedule, next_submission_after=schedule['next_submission_after'] * scale,
+                            jitter=schedule['jitter'] * scale)
+        return schedule_delay(schedule, self.report_interval)
+
+    def refresh_identity(self, force=False):
+        """Run the identity profile once; later calls reuse it until identity_refresh elapses"""
+        if not force and self.identity and time.monotonic() - self._identity_at < self.identity_refresh:
+            return self.identity
+        print(f"Collecting identity ({self.identity_profile} profile)...")
+        self.identity = collect_system_details(self.employee_id, self.email, self.department,
+                                               profile=self.identity_profile, timeouts=self.policy['timeouts'])
+        self._identity_at = time.monotonic()
+        return self.identity
+
+    def sample(self):
+        """Take one RAM/storage sample with the subprocess-free quick probes"""
+        ram = run_probe('ram', self._quick)
+        storage = run_probe('storage', self._quick)
+        self._latest = {'ram': ram, 'storage': storage}
+        self.aggregator.add_sample(ram, storage)
+
+    def build_report(self, summary):
+        """Identity facts + latest sample + window summary, in the /api/system-details shape"""
+        details = dict(self.refresh_identity())
+        details.update(self._latest)
+        details['collected_at'] = datetime.datetime.now().isoformat()
+        payload = build_payload(details, self.employee_id, self.email, self.department)
+        payload['system_details']['usage_summary'] = summary
+        return payload
+
+    def queue(self, payload):
+        try:
+            self.outbox.add(payload)
+        except OSError as e:
+            print(f"Could not write outbox: {e}")
+
+    def report(self):
+        """Send the current window's summary; queue it in the outbox if the API is unreachable"""
+        summary = self.aggregator.drain()
+        if summary is None:
+            return False
+        self.refresh_policy()
+        payload = self.build_report(summary)
+        client = self.client
+        try:
+            response = client.submit(payload)
+        except requests.exceptions.RequestException as e:
+            print(f"Report failed ({e}); queued in outbox")
+            self.queue(payload)
+            return False
+        if response.status_code != 200:
+            print(f"Report rejected: {response.status_code} {response.text[:200]}")
+            if is_retryable_failure(response):
+                self.queue(payload)
+                # Server is shedding load: hold outbox replays until it asked us to come back
+                self.outbox.defer_for(response)
+            return False
+        print(f"Reported {summary['samples']} sample(s) for {summary['window_start']} - {summary['window_end']}")
+        if len(self.outbox):
+            self.outbox.flush(client, self.policy['batch_size'])
+        return True
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self):
+        """Sample and report until stop() is called; a final summary is sent on the way out"""
+        self.refresh_policy()
+        self.refresh_identity(force=True)
+        next_sample = time.monotonic()
+        # Agents started together (e.g. at login) spread their first report over half an interval
+        next_report = next_sample + schedule_delay(None, self.report_interval, default_jitter=0.5)
+        while not self._stop.is_set():
+            now = time.monotonic()
+            if now >= next_sample:
+                try:
+                    self.sample()
+                except Exception as e:
+                    print(f"Sample failed: {e}")
+                next_sample += self.sample_interval
+                # After a suspend/resume, skip missed samples instead of bursting
+                if next_sample < now:
+                    next_sample = now + self.sample_interval
+            if now >= next_report:
+                try:
+                    self.report()
+                except Exception as e:
+                    print(f"Report error: {e}")
+                next_report = time.monotonic() + max(1.0, self.next_report_delay())
+            # Block until the next deadline (or stop); no polling in between
+            self._stop.wait(max(0.0, min(next_sample, next_report) - time.monotonic()))
+        try:
+            self.report()
+        except Exception as e:
+            print(f"Final report error: {e}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run the resident system details agent")
+    parser.add_argument('api_url', nargs='?', default=DEFAULT_API_URL, help="API base URL")
+    parser.add_argument('--employee-id', required=True)
+    parser.add_argument('--email', required=True)
+    parser.add_argument('--department', required=True)
+    parser.add_argument('--sample-interval', type=float, default=DEFAULT_SAMPLE_INTERVAL,
+                        help="Seconds between RAM/storage samples (default: %(default)s)")
+    parser.add_argument('--report-interval', type=float, default=None,
+                        help="Seconds between summaries sent to the API "
+                             f"(default: the server's collector policy, else {DEFAULT_REPORT_INTERVAL})")
+    parser.add_argument('--identity-profile', choices=sorted(COLLECTION_PROFILES), default=None,
+                        help=f"Profile used for the identity snapshot (default: the server's policy, else {DEFAULT_PROFILE})")
+    args = parser.parse_args()
+
+    if args.sample_interval <= 0 or (args.report_interval is not None and args.report_interval < args.sample_interval):
+        parser.error("--report-interval must be at least --sample-interval, and both positive")
+
+    agent = CollectorAgent(args.api_url, args.employee_id, args.email, args.department,
+                           sample_interval=args.sample_interval, report_interval=args.report_interval,
+                           identity_profile=args.identity_profile)
+    signal.signal(signal.SIGTERM, lambda *_: agent.stop())
+    interval = f"{args.report_interval}s" if args.report_interval else "the policy interval"
+    print(f"Agent running: sampling every {args.sample_interval}s, reporting every {interval} to {args.api_url}")
+    try:
+        agent.run()
+    except KeyboardInterrupt:
+        agent.stop()
+        agent.report()
+    sys.exit(0)
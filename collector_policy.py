@@ -0,0 +1,209 @@
+"""
+Collector Policy
+The collection settings the server hands out at /api/collector/config: which
+API URL to submit to, the probe profile and per-probe timeouts, how often
+resident agents report and how many queued submissions go in one batch.
+
+Collectors keep the last policy on disk, use it for max_age_seconds and then
+revalidate it with If-None-Match, so tuning the fleet is a server config
+change instead of a new .exe. Without a reachable server (or on an older one)
+they fall back to the cached policy, then to the built-in defaults.
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+
+import requests
+
+from get_system_details import COLLECTION_PROFILES, DEFAULT_PROFILE, PROBE_FIELDS
+from api_client import get_client
+from outbox import DEFAULT_BATCH_SIZE, MAX_BATCH_SUBMISSIONS
+
+POLICY_PATH = '/api/collector/config'
+DEFAULT_POLICY_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.system_collector', 'policy.json')
+
+# A policy fetch must never hold up a collection for long
+POLICY_FETCH_TIMEOUT = (3, 5)
+
+# What collectors do when no policy was ever received (matches their hardcoded behaviour)
+DEFAULT_POLICY = {
+    'version': 0,
+    'api_url': None,
+    'profile': DEFAULT_PROFILE,
+    'timeouts': {},
+    'submission_interval_seconds': 15 * 60,
+    'batch_size': DEFAULT_BATCH_SIZE,
+    'max_age_seconds': 3600,
+}
+
+# Bounds that keep a mistyped server setting from stalling or flooding the fleet
+MIN_SUBMISSION_INTERVAL = 60
+MAX_PROBE_TIMEOUT = 60
+# A batch the server would reject as too large would never drain
+MAX_BATCH_SIZE = MAX_BATCH_SUBMISSIONS
+
+
+def _positive(value, default, maximum=None, minimum=1):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return default
+    if value < minimum:
+        return default
+    return min(value, maximum) if maximum else value
+
+
+def clean_policy(raw):
+    """A complete, valid policy from a possibly partial or malformed one (unknown keys dropped)"""
+    raw = raw if isinstance(raw, dict) else {}
+    policy = dict(DEFAULT_POLICY)
+    policy['version'] = _positive(raw.get('version'), 0, minimum=0)
+    api_url = raw.get('api_url')
+    if isinstance(api_url, str) and api_url.startswith(('https://', 'http://')):
+        policy['api_url'] = api_url.rstrip('/')
+    profile = str(raw.get('profile') or '').lower()
+    if profile in COLLECTION_PROFILES:
+        policy['profile'] = profile
+    timeouts = {}
+    for field, seconds in (raw.get('timeouts') or {}).items():
+        try:
+            seconds = float(seconds)
+        except (TypeError, ValueError):
+            continue
+        if field in PROBE_FIELDS and seconds > 0:
+            timeouts[field] = min(seconds, MAX_PROBE_TIMEOUT)
+    policy['timeouts'] = timeouts
+    policy['submission_interval_seconds'] = _positive(
+        raw.get('submission_interval_seconds'), DEFAULT_POLICY['submission_interval_seconds'],
+        minimum=MIN_SUBMISSION_INTERVAL)
+    policy['batch_size'] = _positive(raw.get('batch_size'), DEFAULT_BATCH_SIZE, maximum=MAX_BATCH_SIZE)
+    policy['max_age_seconds'] = _positive(raw.get('max_age_seconds'), DEFAULT_POLICY['max_age_seconds'], minimum=0)
+    return policy
+
+
+def parse_timeouts(value):
+    """{'probe': seconds} from 'serial_number=3,storage=2' (the COLLECTOR_PROBE_TIMEOUTS format)"""
+    timeouts = {}
+    for item in (value or '').split(','):
+        field, sep, seconds = item.partition('=')
+        if sep and field.strip():
+            timeouts[field.strip()] = seconds.strip()
+    return timeouts
+
+
+def build_policy(settings):
+    """The policy described by the COLLECTOR_* settings (server side)"""
+    raw = {
+        'version': settings.COLLECTOR_POLICY_VERSION,
+        'api_url': settings.COLLECTOR_API_URL or None,
+        'profile': settings.COLLECTOR_PROFILE,
+        'timeouts': parse_timeouts(settings.COLLECTOR_PROBE_TIMEOUTS),
+        'submission_interval_seconds': settings.COLLECTOR_SUBMISSION_INTERVAL_SECONDS,
+        'batch_size': settings.COLLECTOR_BATCH_SIZE,
+        'max_age_seconds': settings.COLLECTOR_POLICY_MAX_AGE_SECONDS,
+    }
+    policy = clean_policy(raw)
+    if settings.COLLECTOR_PROFILE and policy['profile'] != settings.COLLECTOR_PROFILE.lower():
+        print(f"Warning: unknown COLLECTOR_PROFILE '{settings.COLLECTOR_PROFILE}', serving '{policy['profile']}'")
+    ignored = set(raw['timeouts']) - set(policy['timeouts'])
+    if ignored:
+        print(f"Warning: ignoring COLLECTOR_PROBE_TIMEOUTS for {', '.join(sorted(ignored))}")
+    return policy
+
+
+def policy_etag(policy):
+    """Content hash of a policy, so clients revalidate even if the version was not bumped"""
+    canonical = json.dumps(policy, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:20]
+
+
+class PolicyCache:
+    """Last policy received from each API URL, kept on disk between runs"""
+
+    def __init__(self, path=None):
+        self.path = path or DEFAULT_POLICY_CACHE_PATH
+        self._lock = threading.Lock()
+
+    def _read(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+            return entries if isinstance(entries, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self, entries):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entries, f, separators=(',', ':'))
+        os.replace(tmp_path, self.path)
+
+    def _store(self, api_url, entry):
+        entries = self._read()
+        entries[api_url] = entry
+        try:
+            self._write(entries)
+        except OSError as e:
+            print(f"Could not cache collector policy: {e}")
+
+    def get(self, client, refresh=False):
+        """Policy for client's API: cached while fresh, else revalidated; None if there is none at all"""
+        with self._lock:
+            entry = self._read().get(client.api_url)
+            cached = clean_policy(entry['policy']) if entry else None
+            if cached and not refresh and time.time() - entry.get('fetched_at', 0) < cached['max_age_seconds']:
+                return cached
+            headers = {'If-None-Match': entry['etag']} if entry and entry.get('etag') else {}
+            try:
+                response = client.request('GET', POLICY_PATH, headers=headers,
+                                          timeout=POLICY_FETCH_TIMEOUT, max_retries=0)
+            except requests.exceptions.RequestException as e:
+                print(f"Collector policy not refreshed ({e}); using {'cached' if cached else 'built-in'} settings")
+                return cached
+            if response.status_code == 304 and entry:
+                entry['fetched_at'] = time.time()
+                self._store(client.api_url, entry)
+                return cached
+            if response.status_code != 200:
+                # Older servers have no policy route
+                return cached
+            try:
+                policy = clean_policy(response.json().get('policy'))
+            except ValueError:
+                return cached
+            self._store(client.api_url, {
+                'etag': response.headers.get('ETag'),
+                'fetched_at': time.time(),
+                'policy': policy,
+            })
+            if not cached or cached['version'] != policy['version']:
+                print(f"Collector policy v{policy['version']} received")
+            return policy
+
+
+_cache = PolicyCache()
+
+
+def load_policy(client, refresh=False):
+    """The policy to collect with: server's (cached), else DEFAULT_POLICY. Never raises."""
+    try:
+        return _cache.get(client, refresh) or dict(DEFAULT_POLICY)
+    except Exception as e:
+        print(f"Collector policy unavailable: {e}")
+        return dict(DEFAULT_POLICY)
+
+
+def policy_client(api_url=None, refresh=False):
+    """(client, policy) for a collector run; the client follows the policy's api_url if it sets one"""
+    client = get_client(api_url)
+    policy = load_policy(client, refresh)
+    if policy['api_url'] and policy['api_url'] != client.api_url:
+        print(f"Collector policy moves submissions to {policy['api_url']}")
+        client = get_client(policy['api_url'])
+    return client, policy
@@ -0,0 +1,355 @@
+"""
+Columnar Submission Archive
+Exports system_details to column files partitioned by month and department,
+for fleet analytics (fleet_analytics.py, /api/admin/analytics) over millions
+of snapshots without reading JSON rows:
+
+    <root>/manifest.json
+    <root>/month=2026-10/department=Finance/meta.json
+    <root>/month=2026-10/department=Finance/ram_total_gb.npy       float32, NaN = missing
+    <root>/month=2026-10/department=Finance/system_model.codes.npy int32, -1 = missing
+
+Numeric columns are typed NumPy arrays that readers memory-map; text columns
+are dictionary-encoded (codes plus the values in meta.json). Storage is
+reduced to per-snapshot totals and the fullest drive's fill. A re-exported
+month is merged with the partitions already archived for it, keyed on id:
+rows the store still holds are replaced, rows compaction has since deleted
+from it are kept.
+
+Usage:
+    python columnar_archive.py --root columnar
+    python columnar_archive.py --root columnar --since latest
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import datetime
+from array import array
+from urllib.parse import quote
+
+import config
+from records import safe_numeric
+from storage import create_storage
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+FORMAT_VERSION = 1
+MANIFEST_NAME = 'manifest.json'
+META_NAME = 'meta.json'
+
+# float32 columns; snapshot columns first, then the ones derived from storage_details
+NUMERIC_COLUMNS = [
+    'ram_total_gb', 'ram_used_gb', 'ram_available_gb', 'ram_free_gb', 'ram_used_percent',
+    'storage_total_gb', 'storage_used_gb', 'storage_used_percent', 'storage_max_used_percent', 'drive_count',
+]
+# Dictionary-encoded text columns (department is the partition key instead)
+CATEGORICAL_COLUMNS = [
+    'employee_id', 'hostname', 'serial_number', 'system_manufacturer', 'system_model',
+    'windows_system', 'windows_release', 'windows_version', 'windows_processor',
+]
+PARTITION_COLUMNS = ['month', 'department']
+
+# Partition directory name for rows without a department
+NO_DEPARTMENT = '_'
+
+
+def _utc(created_at):
+    value = datetime.datetime.fromisoformat(str(created_at).replace('Z', '+00:00'))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return value.astimezone(datetime.timezone.utc)
+
+
+def _text(value):
+    return str(value).strip() if value not in (None, '') else None
+
+
+def department_dir(department):
+    return 'department=' + (quote(department, safe='') if department else NO_DEPARTMENT)
+
+
+def storage_columns(storage_details):
+    """Per-snapshot storage totals from a storage_details value (JSON text or list)"""
+    entries = storage_details
+    if isinstance(entries, str):
+        try:
+            entries = json.loads(entries)
+        except ValueError:
+            entries = None
+    total = used = 0.0
+    fullest = None
+    drives = 0
+    for entry in entries if isinstance(entries, list) else []:
+        if not isinstance(entry, dict):
+            continue
+        total_gb = safe_numeric(entry.get('total_gb'))
+        used_gb = safe_numeric(entry.get('used_gb'))
+        if total_gb is None or used_gb is None:
+            continue
+        drives += 1
+        total += total_gb
+        used += used_gb
+        percent = safe_numeric(entry.get('used_percent'))
+        if percent is None and total_gb:
+            percent = used_gb / total_gb * 100
+        if percent is not None:
+            fullest = percent if fullest is None else max(fullest, percent)
+    if not drives:
+        return {'storage_total_gb': None, 'storage_used_gb': None, 'storage_used_percent': None,
+                'storage_max_used_percent': None, 'drive_count': 0}
+    return {
+        'storage_total_gb': total,
+        'storage_used_gb': used,
+        'storage_used_percent': used / total * 100 if total else None,
+        'storage_max_used_percent': fullest,
+        'drive_count': drives,
+    }
+
+
+class _PartitionBuffer:
+    """Columns of one (month, department) partition while it is being exported"""
+
+    def __init__(self, month, department):
+        self.month = month
+        self.department = department
+        self.ids = array('q')
+        self.created_at = array('q')
+        self.numeric = {column: array('f') for column in NUMERIC_COLUMNS}
+        self.codes = {column: array('i') for column in CATEGORICAL_COLUMNS}
+        self.dictionaries = {column: {} for column in CATEGORICAL_COLUMNS}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, row, created):
+        self.ids.append(int(row.get('id') or 0))
+        self.created_at.append(int(created.timestamp()))
+        values = storage_columns(row.get('storage_details'))
+        for column in NUMERIC_COLUMNS:
+            value = values[column] if column in values else safe_numeric(row.get(column))
+            self.numeric[column].append(float('nan') if value is None else float(value))
+        for column in CATEGORICAL_COLUMNS:
+            value = _text(row.get(column))
+            if value is None:
+                self.codes[column].append(-1)
+                continue
+            dictionary = self.dictionaries[column]
+            code = dictionary.get(value)
+            if code is None:
+                code = dictionary[value] = len(dictionary)
+            self.codes[column].append(code)
+
+    def extend(self, partition, mask):
+        """Append the rows of an archived partition selected by a boolean mask"""
+        self.ids.extend(partition.column('id')[mask].tolist())
+        self.created_at.extend(partition.column('created_at')[mask].tolist())
+        for column in NUMERIC_COLUMNS:
+            self.numeric[column].extend(partition.column(column)[mask].tolist())
+        for column in CATEGORICAL_COLUMNS:
+            values = partition.dictionary(column)
+            dictionary = self.dictionaries[column]
+            codes = self.codes[column]
+            for code in partition.column(column)[mask].tolist():
+                if code < 0:
+                    codes.append(-1)
+                    continue
+                value = values[code]
+                new_code = dictionary.get(value)
+                if new_code is None:
+                    new_code = dictionary[value] = len(dictionary)
+                codes.append(new_code)
+
+    def write(self, directory):
+        """Write the column files (oldest row first) and meta.json into directory (created)"""
+        os.makedirs(directory)
+        created_at = np.frombuffer(self.created_at, dtype=np.int64)
+        order = np.argsort(created_at, kind='stable')
+        np.save(os.path.join(directory, 'id.npy'), np.frombuffer(self.ids, dtype=np.int64)[order])
+        np.save(os.path.join(directory, 'created_at.npy'), created_at[order])
+        for column, values in self.numeric.items():
+            np.save(os.path.join(directory, f'{column}.npy'), np.frombuffer(values, dtype=np.float32)[order])
+        for column, codes in self.codes.items():
+            np.save(os.path.join(directory, f'{column}.codes.npy'), np.frombuffer(codes, dtype=np.int32)[order])
+        meta = {
+            'format_version': FORMAT_VERSION,
+            'month': self.month,
+            'department': self.department,
+            'rows': len(self),
+            'numeric_columns': NUMERIC_COLUMNS,
+            'dictionaries': {column: list(values) for column, values in self.dictionaries.items()},
+        }
+        with open(os.path.join(directory, META_NAME), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, separators=(',', ':'))
+
+
+class Partition:
+    """One exported partition; columns are memory-mapped on first use"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, META_NAME), 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self.month = self.meta['month']
+        self.department = self.meta['department']
+        self.rows = self.meta['rows']
+        self._columns = {}
+
+    def column(self, name):
+        """Numeric column, or the codes of a text column"""
+        array_ = self._columns.get(name)
+        if array_ is None:
+            file_name = f'{name}.codes.npy' if name in CATEGORICAL_COLUMNS else f'{name}.npy'
+            array_ = self._columns[name] = np.load(os.path.join(self.path, file_name), mmap_mode='r')
+        return array_
+
+    def dictionary(self, name):
+        """Values of a text column, indexed by code"""
+        return self.meta['dictionaries'][name]
+
+
+def list_partitions(root, month_from=None, month_to=None):
+    """Partitions under root, oldest month first; month bounds (YYYY-MM) are inclusive"""
+    partitions = []
+    if not os.path.isdir(root):
+        return partitions
+    for month_name in sorted(os.listdir(root)):
+        if not month_name.startswith('month='):
+            continue
+        month = month_name[len('month='):]
+        if (month_from and month < month_from) or (month_to and month > month_to):
+            continue
+        month_path = os.path.join(root, month_name)
+        for department_name in sorted(os.listdir(month_path)):
+            path = os.path.join(month_path, department_name)
+            if department_name.startswith('department=') and os.path.exists(os.path.join(path, META_NAME)):
+                partitions.append(Partition(path))
+    return partitions
+
+
+def read_manifest(root):
+    try:
+        with open(os.path.join(root, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'format_version': FORMAT_VERSION, 'months': {}}
+
+
+def _write_manifest(root, manifest):
+    tmp_path = os.path.join(root, MANIFEST_NAME + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, os.path.join(root, MANIFEST_NAME))
+
+
+class ColumnarExporter:
+    """Streams the store oldest first and writes one month of partitions at a time"""
+
+    def __init__(self, root):
+        if not NUMPY_AVAILABLE:
+            raise RuntimeError('NumPy is required for the columnar archive (pip install numpy)')
+        self.root = root
+
+    def _carry_over(self, month, buffers):
+        """Add the archived rows of month that this export did not return; returns how many"""
+        exported = set()
+        for buffer in buffers.values():
+            exported.update(buffer.ids)
+        exported_ids = np.fromiter(exported, dtype=np.int64, count=len(exported))
+        carried = 0
+        for partition in list_partitions(self.root, month, month):
+            keep = ~np.isin(partition.column('id'), exported_ids)
+            if not keep.any():
+                continue
+            buffer = buffers.get(partition.department)
+            if buffer is None:
+                buffer = buffers[partition.department] = _PartitionBuffer(month, partition.department)
+            buffer.extend(partition, keep)
+            carried += int(keep.sum())
+        return carried
+
+    def _write_month(self, month, buffers, manifest):
+        """Replace the month directory with the exported rows merged into its archived ones"""
+        # Rows compacted away since the last export are only left here
+        carried = self._carry_over(month, buffers)
+        final_path = os.path.join(self.root, f'month={month}')
+        tmp_path = os.path.join(self.root, f'.month={month}.tmp')
+        old_path = os.path.join(self.root, f'.month={month}.old')
+        for path in (tmp_path, old_path):
+            shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        for buffer in buffers.values():
+            buffer.write(os.path.join(tmp_path, department_dir(buffer.department)))
+        if os.path.exists(final_path):
+            os.rename(final_path, old_path)
+        os.rename(tmp_path, final_path)
+        shutil.rmtree(old_path, ignore_errors=True)
+        manifest['months'][month] = {
+            'rows': sum(len(buffer) for buffer in buffers.values()),
+            'departments': len(buffers),
+            'exported_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        }
+        _write_manifest(self.root, manifest)
+        print(f"  {month}: {manifest['months'][month]['rows']} row(s) in {len(buffers)} partition(s)"
+              f"{f', {carried} kept from the previous export' if carried else ''}")
+
+    def export(self, storage, since=None, batch_size=1000):
+        """Export months from since (YYYY-MM, 'latest' = the newest archived month, None = all)"""
+        started = time.monotonic()
+        os.makedirs(self.root, exist_ok=True)
+        manifest = read_manifest(self.root)
+        if since == 'latest':
+            since = max(manifest['months']) if manifest['months'] else None
+        after = (f'{since}-01T00:00:00+00:00', 0) if since else None
+        print(f"Exporting submissions{f' from {since}' if since else ''} to {self.root}")
+
+        month, buffers, rows = None, {}, 0
+        for row in storage.stream(batch_size=batch_size, after=after):
+            if not row.get('created_at'):
+                continue
+            created = _utc(row['created_at'])
+            row_month = created.strftime('%Y-%m')
+            if row_month != month:
+                if buffers:
+                    self._write_month(month, buffers, manifest)
+                month, buffers = row_month, {}
+            department = _text(row.get('department'))
+            buffer = buffers.get(department)
+            if buffer is None:
+                buffer = buffers[department] = _PartitionBuffer(row_month, department)
+            buffer.add(row, created)
+            rows += 1
+        if buffers:
+            self._write_month(month, buffers, manifest)
+        print(f"Exported {rows} row(s) in {time.monotonic() - started:.1f}s")
+        return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export submissions to a columnar archive for fleet analytics")
+    parser.add_argument('--root', default=config.ANALYTICS_ARCHIVE_DIR,
+                        help="Archive directory (default: %(default)s)")
+    parser.add_argument('--since', default=None,
+                        help="First month to (re)export, YYYY-MM or 'latest' (default: everything)")
+    parser.add_argument('--batch-size', type=int, default=1000, help="Rows fetched per query (default: %(default)s)")
+    args = parser.parse_args()
+    if not NUMPY_AVAILABLE:
+        print("❌ NumPy is required: pip install numpy")
+        sys.exit(1)
+
+    storage = create_storage(config.STORAGE_BACKEND, config.SUPABASE_URL, config.SUPABASE_KEY,
+                             config.SQLITE_PATH, supabase_timeout=config.SUPABASE_TIMEOUT_SECONDS)
+    if storage is None:
+        print("❌ No storage backend available")
+        sys.exit(1)
+    try:
+        ColumnarExporter(args.root).export(storage, since=args.since, batch_size=args.batch_size)
+    finally:
+        storage.close()
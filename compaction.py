@@ -0,0 +1,434 @@
+"""
+Retention Compaction
+Keeps full system_details snapshots for RETENTION_DAYS and folds older ones
+into system_details_daily: one row per device per UTC day with the identity
+fields of its last snapshot and min/avg/max RAM and per-mount storage use.
+
+Days are handled oldest first, one at a time: the raw rows are written to a
+gzipped JSON-lines archive (optional), the day's summaries are upserted, then
+the raw rows are deleted. Every summary lists the ids folded into it, so a
+run stopped anywhere in between is simply started again: rows already in a
+summary are only deleted, late rows for a compacted day are merged in.
+
+Usage:
+    python compaction.py --retention-days 90
+    python compaction.py --retention-days 90 --archive-dir archive --max-days 7 --dry-run
+"""
+
+import os
+import sys
+import gzip
+import json
+import time
+import argparse
+import datetime
+import threading
+
+import config
+from records import safe_numeric
+from device_index import identity_keys
+from storage import create_storage, MAX_PAGE_SIZE
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: no cross-process lock; run the CLI from one place only
+    fcntl = None
+
+DEFAULT_BATCH_SIZE = 500
+# Ids per delete call (Supabase puts them in the URL)
+DELETE_CHUNK_SIZE = 200
+# Mounts summarized per device, so a machine with hundreds of mounts cannot blow up a row
+MAX_MOUNTS = 32
+
+ARCHIVE_PREFIX = 'system_details_'
+
+
+def _utc(created_at):
+    value = datetime.datetime.fromisoformat(str(created_at).replace('Z', '+00:00'))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return value.astimezone(datetime.timezone.utc)
+
+
+def cutoff_for(retention_days, now=None):
+    """UTC midnight retention_days ago: rows created before it are compacted"""
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    day = now.astimezone(datetime.timezone.utc).date() - datetime.timedelta(days=retention_days)
+    return datetime.datetime.combine(day, datetime.time(), tzinfo=datetime.timezone.utc)
+
+
+def device_key(row):
+    """Stable per-device key: serial number, else hostname, else the employee"""
+    key = identity_keys(row)['device']
+    if key:
+        return key
+    employee = str(row.get('employee_id') or '').strip()
+    return f"employee:{employee}" if employee else 'unknown'
+
+
+class _Stat:
+    """min/max/total/count of one metric, mergeable with an earlier summary"""
+
+    __slots__ = ('count', 'min', 'max', 'total')
+
+    def __init__(self):
+        self.count = 0
+        self.min = None
+        self.max = None
+        self.total = 0.0
+
+    def add(self, value, count=1, low=None, high=None):
+        if value is None:
+            return
+        low = value if low is None else low
+        high = value if high is None else high
+        self.count += count
+        self.total += value * count
+        self.min = low if self.min is None else min(self.min, low)
+        self.max = high if self.max is None else max(self.max, high)
+
+    def avg(self):
+        return round(self.total / self.count, 2) if self.count else None
+
+
+def _usage_summary(row):
+    """The row's usage_summary as a dict ({} for snapshots without one)"""
+    try:
+        usage = json.loads(row.get('usage_summary') or '{}')
+    except (TypeError, ValueError):
+        return {}
+    return usage if isinstance(usage, dict) else {}
+
+
+class DailySummary:
+    """One device's snapshots for one day"""
+
+    def __init__(self, day, key):
+        self.day = day
+        self.key = key
+        self.ids = set()
+        self.samples = 0
+        self.first_seen = None
+        self.last_seen = None
+        self.identity = None
+        self.ram_total_gb = None
+        self.ram_used_gb = _Stat()
+        self.ram_used_percent = _Stat()
+        self.mounts = {}           # drive -> {'total_gb', 'used_gb': _Stat, 'used_percent': _Stat}
+        self.archive_files = []
+
+    def _seen(self, first, last, identity):
+        if self.first_seen is None or first < self.first_seen:
+            self.first_seen = first
+        if self.last_seen is None or last >= self.last_seen:
+            self.last_seen = last
+            self.identity = identity
+
+    def _mount(self, drive):
+        mount = self.mounts.get(drive)
+        if mount is None and len(self.mounts) < MAX_MOUNTS:
+            mount = self.mounts[drive] = {'total_gb': None, 'used_gb': _Stat(), 'used_percent': _Stat()}
+        return mount
+
+    def add(self, row):
+        """Fold in one system_details row (skipped if an earlier run already did)"""
+        if row['id'] in self.ids:
+            return
+        self.ids.add(row['id'])
+        self.samples += 1
+        self._seen(row['created_at'], row['created_at'], row)
+        total = safe_numeric(row.get('ram_total_gb'))
+        if total is not None and row['created_at'] >= self.last_seen:
+            self.ram_total_gb = total
+        usage = _usage_summary(row)
+        for name in ('ram_used_gb', 'ram_used_percent'):
+            value = safe_numeric(row.get(name))
+            if value is None:
+                continue
+            # Agent reports carry the min/max of their whole sampling window, not just the last sample
+            window = usage.get(name) if isinstance(usage.get(name), dict) else {}
+            low, high = safe_numeric(window.get('min')), safe_numeric(window.get('max'))
+            getattr(self, name).add(value, low=value if low is None else min(low, value),
+                                    high=value if high is None else max(high, value))
+        try:
+            storage = json.loads(row.get('storage_details') or '[]')
+        except (TypeError, ValueError):
+            storage = []
+        for entry in storage if isinstance(storage, list) else []:
+            if not isinstance(entry, dict) or not entry.get('drive'):
+                continue
+            mount = self._mount(entry['drive'])
+            if mount is None:
+                continue
+            mount['total_gb'] = safe_numeric(entry.get('total_gb')) or mount['total_gb']
+            mount['used_gb'].add(safe_numeric(entry.get('used_gb')))
+            mount['used_percent'].add(safe_numeric(entry.get('used_percent')))
+
+    def merge(self, summary):
+        """Fold in a system_details_daily row written by an earlier run"""
+        self.ids.update(json.loads(summary.get('source_ids') or '[]'))
+        samples = int(summary.get('samples') or 0)
+        self.samples += samples
+        self._seen(summary['first_seen'], summary['last_seen'], summary)
+        if summary.get('ram_total_gb') is not None and summary['last_seen'] >= self.last_seen:
+            self.ram_total_gb = summary['ram_total_gb']
+        for name in ('ram_used_gb', 'ram_used_percent'):
+            if summary.get(f'{name}_avg') is not None:
+                getattr(self, name).add(summary[f'{name}_avg'], samples,
+                                        summary.get(f'{name}_min'), summary.get(f'{name}_max'))
+        for entry in json.loads(summary.get('storage_summary') or '[]'):
+            mount = self._mount(entry.get('drive'))
+            if mount is None:
+                continue
+            mount['total_gb'] = mount['total_gb'] or entry.get('total_gb')
+            for name in ('used_gb', 'used_percent'):
+                if entry.get(f'{name}_avg') is not None:
+                    mount[name].add(entry[f'{name}_avg'], entry.get('samples') or samples,
+                                    entry.get(f'{name}_min'), entry.get(f'{name}_max'))
+        if summary.get('archive_file'):
+            self.archive_files.extend(summary['archive_file'].split(','))
+
+    def to_row(self):
+        """system_details_daily row"""
+        identity = self.identity or {}
+        row = {'day': self.day, 'device_key': self.key}
+        for column in ('employee_id', 'email', 'department', 'username', 'hostname', 'system_manufacturer',
+                       'system_model', 'ip_address', 'serial_number', 'windows_system', 'windows_release',
+                       'windows_version'):
+            row[column] = identity.get(column)
+        row.update({
+            'samples': self.samples,
+            'first_seen': self.first_seen,
+            'last_seen': self.last_seen,
+            'ram_total_gb': self.ram_total_gb,
+        })
+        for name in ('ram_used_gb', 'ram_used_percent'):
+            stat = getattr(self, name)
+            row[f'{name}_min'], row[f'{name}_avg'], row[f'{name}_max'] = stat.min, stat.avg(), stat.max
+        row['storage_summary'] = json.dumps([
+            {
+                'drive': drive,
+                'total_gb': mount['total_gb'],
+                'used_gb_min': mount['used_gb'].min, 'used_gb_avg': mount['used_gb'].avg(),
+                'used_gb_max': mount['used_gb'].max,
+                'used_percent_min': mount['used_percent'].min, 'used_percent_avg': mount['used_percent'].avg(),
+                'used_percent_max': mount['used_percent'].max,
+                'samples': mount['used_gb'].count or mount['used_percent'].count,
+            }
+            for drive, mount in sorted(self.mounts.items())
+        ])
+        row['source_ids'] = json.dumps(sorted(self.ids))
+        row['archive_file'] = ','.join(dict.fromkeys(self.archive_files)) or None
+        return row
+
+
+class _DayArchive:
+    """Gzipped JSON lines of one day's raw rows, renamed into place once complete"""
+
+    def __init__(self, directory, day):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.day = day
+        self.partial_path = os.path.join(directory, f"{ARCHIVE_PREFIX}{day}.partial.gz")
+        self._file = gzip.open(self.partial_path, 'wt', encoding='utf-8')
+        self.first_id = None
+        self.last_id = None
+
+    def write(self, row):
+        self._file.write(json.dumps(row, separators=(',', ':'), default=str) + '\n')
+        self.first_id = row['id'] if self.first_id is None else self.first_id
+        self.last_id = row['id']
+
+    def finish(self):
+        """Close and rename; returns the archive file name"""
+        self._file.close()
+        # The id range makes the name unique per set of rows: a rerun after a partial delete
+        # archives the remaining rows next to, not over, the earlier file
+        name = f"{ARCHIVE_PREFIX}{self.day}_{self.first_id}-{self.last_id}.jsonl.gz"
+        os.replace(self.partial_path, os.path.join(self.directory, name))
+        return name
+
+    def abort(self):
+        self._file.close()
+        try:
+            os.remove(self.partial_path)
+        except OSError:
+            pass
+
+
+class Compactor:
+    """Folds snapshots older than the retention window into daily summaries"""
+
+    def __init__(self, storage, retention_days, archive_dir=None, batch_size=DEFAULT_BATCH_SIZE,
+                 dry_run=False, on_deleted=None):
+        if retention_days < 1:
+            raise ValueError('retention_days must be at least 1')
+        self.storage = storage
+        self.retention_days = retention_days
+        self.archive_dir = archive_dir or None
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        # Called with each day's deleted ids (e.g. to drop them from in-memory indexes)
+        self.on_deleted = on_deleted
+        self.counts = {}
+
+    def run(self, now=None, max_days=None):
+        """Compact every day before the cutoff (at most max_days of them); returns the counts"""
+        started = time.monotonic()
+        cutoff = cutoff_for(self.retention_days, now)
+        self.counts = {'days': 0, 'rows': 0, 'summaries': 0, 'deleted': 0, 'archived_files': 0}
+        print(f"Compacting snapshots before {cutoff.date()}{' (dry run)' if self.dry_run else ''}")
+
+        current = None
+        try:
+            for row in self.storage.stream(batch_size=self.batch_size):
+                created = _utc(row['created_at'])
+                if created >= cutoff:
+                    break
+                row_day = created.date().isoformat()
+                if current is None or current['day'] != row_day:
+                    if current is not None:
+                        self._finish_day(current)
+                        current = None
+                        if max_days and self.counts['days'] >= max_days:
+                            break
+                    current = self._start_day(row_day)
+                if row.get('id') is None:
+                    continue
+                if current['archive']:
+                    current['archive'].write(row)
+                key = device_key(row)
+                summary = current['summaries'].get(key)
+                if summary is None:
+                    summary = current['summaries'][key] = DailySummary(row_day, key)
+                summary.add(row)
+                current['touched'].add(key)
+                current['ids'].append(row['id'])
+                self.counts['rows'] += 1
+            if current is not None:
+                self._finish_day(current)
+                current = None
+        finally:
+            if current is not None and current['archive']:
+                current['archive'].abort()
+
+        self.counts['seconds'] = round(time.monotonic() - started, 1)
+        print(f"Compacted {self.counts['rows']} snapshot(s) from {self.counts['days']} day(s) into "
+              f"{self.counts['summaries']} daily summar{'y' if self.counts['summaries'] == 1 else 'ies'}, "
+              f"deleted {self.counts['deleted']} in {self.counts['seconds']}s")
+        return self.counts
+
+    def _start_day(self, day):
+        """State for one day, seeded with the summaries earlier runs wrote for it"""
+        summaries = {}
+        offset = 0
+        while True:
+            rows = self.storage.list_daily(day_from=day, day_to=day, limit=MAX_PAGE_SIZE, offset=offset)
+            for row in rows:
+                summary = summaries[row['device_key']] = DailySummary(day, row['device_key'])
+                summary.merge(row)
+            if len(rows) < MAX_PAGE_SIZE:
+                break
+            offset += len(rows)
+        archive = _DayArchive(self.archive_dir, day) if self.archive_dir and not self.dry_run else None
+        return {'day': day, 'summaries': summaries, 'touched': set(), 'ids': [], 'archive': archive}
+
+    def _finish_day(self, current):
+        """Archive, upsert the summaries, then delete the raw rows of one day"""
+        day, raw_ids = current['day'], current['ids']
+        # Summaries no row of this run belongs to are left as they are
+        summaries = [current['summaries'][key] for key in sorted(current['touched'])]
+        self.counts['days'] += 1
+        self.counts['summaries'] += len(summaries)
+        if self.dry_run:
+            return
+        archive_file = current['archive'].finish() if current['archive'] else None
+        if archive_file:
+            self.counts['archived_files'] += 1
+            for summary in summaries:
+                summary.archive_files.append(archive_file)
+        self.storage.upsert_daily([summary.to_row() for summary in summaries])
+
+        for start in range(0, len(raw_ids), DELETE_CHUNK_SIZE):
+            chunk = raw_ids[start:start + DELETE_CHUNK_SIZE]
+            self.counts['deleted'] += self.storage.delete(chunk)
+            if self.on_deleted:
+                self.on_deleted(chunk)
+        print(f"  {day}: {len(raw_ids)} snapshot(s) -> {len(summaries)} summar{'y' if len(summaries) == 1 else 'ies'}"
+              f"{f', archived to {archive_file}' if archive_file else ''}")
+
+
+def _lock(path):
+    """Open file holding the compaction lock, None without one, False if another process has it"""
+    if not path or fcntl is None:
+        return None
+    lock_file = open(path, 'a')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False
+    return lock_file
+
+
+def run_locked(compactor, lock_path, **kwargs):
+    """compactor.run() unless another process is compacting; returns the counts or None"""
+    lock_file = _lock(lock_path)
+    if lock_file is False:
+        print("Compaction already running in another process; skipped")
+        return None
+    try:
+        return compactor.run(**kwargs)
+    finally:
+        if lock_file:
+            lock_file.close()
+
+
+def start_compaction(compactor, interval_seconds, lock_path=None, on_done=None):
+    """Daemon thread that runs the compactor every interval_seconds (first run after one interval)"""
+    def loop():
+        while True:
+            time.sleep(interval_seconds)
+            try:
+                counts = run_locked(compactor, lock_path)
+                if counts and counts['deleted'] and on_done:
+                    on_done(counts)
+            except Exception as e:
+                print(f"Compaction stopped (resumes on the next run): {e}")
+    thread = threading.Thread(target=loop, name='compaction', daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Fold old system_details snapshots into daily per-device summaries")
+    parser.add_argument('--retention-days', type=int, default=config.RETENTION_DAYS or None,
+                        help="Keep full snapshots this many days (default: RETENTION_DAYS)")
+    parser.add_argument('--archive-dir', default=config.COMPACTION_ARCHIVE_DIR,
+                        help="Write raw rows here as gzipped JSON lines first ('' = no archive; default: %(default)s)")
+    parser.add_argument('--max-days', type=int, default=None, help="Stop after this many days")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help="Rows fetched per query (default: %(default)s)")
+    parser.add_argument('--dry-run', action='store_true', help="Count what would be compacted without writing")
+    args = parser.parse_args()
+    if not args.retention_days or args.retention_days < 1:
+        parser.error("--retention-days (or RETENTION_DAYS) must be at least 1")
+
+    # Straight to the configured store: no spool, a failed day is redone on the next run
+    storage = create_storage(config.STORAGE_BACKEND, config.SUPABASE_URL, config.SUPABASE_KEY,
+                             config.SQLITE_PATH, supabase_timeout=config.SUPABASE_TIMEOUT_SECONDS)
+    if storage is None:
+        print("❌ No storage backend available")
+        sys.exit(1)
+
+    compactor = Compactor(storage, args.retention_days, args.archive_dir, args.batch_size, args.dry_run)
+    try:
+        if run_locked(compactor, config.COMPACTION_LOCK_PATH, max_days=args.max_days) is None:
+            sys.exit(1)
+    except Exception as e:
+        print(f"❌ Compaction stopped: {e}")
+        print("Run the same command again to resume.")
+        sys.exit(1)
+    finally:
+        storage.close()
@@ -12,11 +12,126 @@ load_dotenv()
 SUPABASE_URL = os.getenv('SUPABASE_URL')
 SUPABASE_KEY = os.getenv('SUPABASE_KEY')
 
+# Storage backend: 'supabase', 'sqlite' or 'auto' (Supabase when configured, else SQLite)
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'auto')
+SQLITE_PATH = os.getenv('SQLITE_PATH', 'system_details.db')
+# Per-request timeout for Supabase calls (the client default is 120 s)
+SUPABASE_TIMEOUT_SECONDS = float(os.getenv('SUPABASE_TIMEOUT_SECONDS', '10'))
+
+# Fallback chain for database writes: Supabase -> local spool -> reject.
+# Leave STORAGE_SPOOL_PATH empty to disable spooling.
+STORAGE_SPOOL_PATH = os.getenv('STORAGE_SPOOL_PATH', 'storage_spool.db')
+SPOOL_REDRAIN_INTERVAL_SECONDS = float(os.getenv('SPOOL_REDRAIN_INTERVAL_SECONDS', '30'))
+# Circuit breaker around Supabase: open when the failure rate over the last
+# BREAKER_WINDOW calls reaches BREAKER_FAILURE_RATE, probe again after the cool-down
+BREAKER_FAILURE_RATE = float(os.getenv('BREAKER_FAILURE_RATE', '0.5'))
+BREAKER_WINDOW = int(os.getenv('BREAKER_WINDOW', '20'))
+BREAKER_MIN_CALLS = int(os.getenv('BREAKER_MIN_CALLS', '5'))
+BREAKER_COOLDOWN_SECONDS = float(os.getenv('BREAKER_COOLDOWN_SECONDS', '30'))
+# Calls slower than this count as failures
+BREAKER_SLOW_CALL_SECONDS = float(os.getenv('BREAKER_SLOW_CALL_SECONDS', '5'))
+
 # Flask API configuration
 FLASK_HOST = os.getenv('FLASK_HOST', '0.0.0.0')
 FLASK_PORT = int(os.getenv('FLASK_PORT', '5000'))
-FLASK_DEBUG = os.getenv('FLASK_DEBUG', 'True').lower() == 'true'
+# Debugger and reloader: only for local development, never on a server
+FLASK_DEBUG = os.getenv('FLASK_DEBUG', 'False').lower() == 'true'
+
+# Function platforms (Vercel, AWS Lambda) start a fresh process per cold start and freeze it after
+# each response. Detected from VERCEL / AWS_LAMBDA_FUNCTION_NAME; set SERVERLESS=true/false to override
+SERVERLESS = os.getenv(
+    'SERVERLESS', 'True' if os.getenv('VERCEL') or os.getenv('AWS_LAMBDA_FUNCTION_NAME') else 'False'
+).lower() == 'true'
+
+# Multi-process serving (gunicorn.conf.py): worker processes (0 = one per CPU) and threads per worker
+SERVER_WORKERS = int(os.getenv('SERVER_WORKERS', '0'))
+SERVER_THREADS = int(os.getenv('SERVER_THREADS', '4'))
+SERVER_TIMEOUT_SECONDS = int(os.getenv('SERVER_TIMEOUT_SECONDS', '60'))
 
 # API Base URL
 API_BASE_URL = os.getenv('API_BASE_URL', 'http://localhost:5000')
 
+
+# Ingest admission control
+# Token buckets: sustained requests per minute and burst size per client key
+RATE_LIMIT_EMPLOYEE_PER_MINUTE = float(os.getenv('RATE_LIMIT_EMPLOYEE_PER_MINUTE', '10'))
+RATE_LIMIT_EMPLOYEE_BURST = int(os.getenv('RATE_LIMIT_EMPLOYEE_BURST', '5'))
+RATE_LIMIT_SERIAL_PER_MINUTE = float(os.getenv('RATE_LIMIT_SERIAL_PER_MINUTE', '10'))
+RATE_LIMIT_SERIAL_BURST = int(os.getenv('RATE_LIMIT_SERIAL_BURST', '5'))
+# Whole offices can share one NAT address, so the per-IP bucket is much larger
+RATE_LIMIT_IP_PER_MINUTE = float(os.getenv('RATE_LIMIT_IP_PER_MINUTE', '300'))
+RATE_LIMIT_IP_BURST = int(os.getenv('RATE_LIMIT_IP_BURST', '60'))
+# Global cap on ingest requests writing to the database at once
+MAX_INFLIGHT_DB_WRITES = int(os.getenv('MAX_INFLIGHT_DB_WRITES', '8'))
+ADMISSION_WAIT_SECONDS = float(os.getenv('ADMISSION_WAIT_SECONDS', '2'))
+# Optional shared limiter state (e.g. redis://localhost:6379/0); in-memory when unset
+RATE_LIMIT_REDIS_URL = os.getenv('RATE_LIMIT_REDIS_URL')
+
+# Reverse proxies in front of the app whose X-Forwarded-For entry is trusted for the client IP
+# (Vercel adds one); 0 uses the socket address and ignores the header
+TRUSTED_PROXY_HOPS = int(os.getenv('TRUSTED_PROXY_HOPS', '1' if os.getenv('VERCEL') else '0'))
+
+# Collector policy served at /api/collector/config. Collectors cache it for
+# COLLECTOR_POLICY_MAX_AGE_SECONDS, then revalidate; bump the version when changing it.
+# COLLECTOR_API_URL moves collectors to another server ('' = keep the one they were given);
+# COLLECTOR_PROBE_TIMEOUTS overrides profile timeouts, e.g. "serial_number=3,storage=2"
+COLLECTOR_POLICY_VERSION = int(os.getenv('COLLECTOR_POLICY_VERSION', '1'))
+COLLECTOR_API_URL = os.getenv('COLLECTOR_API_URL', '')
+COLLECTOR_PROFILE = os.getenv('COLLECTOR_PROFILE', 'full')
+COLLECTOR_PROBE_TIMEOUTS = os.getenv('COLLECTOR_PROBE_TIMEOUTS', '')
+COLLECTOR_SUBMISSION_INTERVAL_SECONDS = int(os.getenv('COLLECTOR_SUBMISSION_INTERVAL_SECONDS', '900'))
+COLLECTOR_BATCH_SIZE = int(os.getenv('COLLECTOR_BATCH_SIZE', '50'))
+COLLECTOR_POLICY_MAX_AGE_SECONDS = int(os.getenv('COLLECTOR_POLICY_MAX_AGE_SECONDS', '3600'))
+
+# Ingest load hints: submissions per minute one worker should absorb. Ingest responses carry
+# Next-Submission-After / Submission-Jitter headers that stretch as the rate approaches it, and
+# load-related 429/503 answers get a Retry-After spread over up to INGEST_MAX_RETRY_AFTER_SECONDS
+INGEST_TARGET_PER_MINUTE = float(os.getenv('INGEST_TARGET_PER_MINUTE', '300'))
+INGEST_MAX_RETRY_AFTER_SECONDS = float(os.getenv('INGEST_MAX_RETRY_AFTER_SECONDS', '900'))
+
+# Idempotency keys: how long and how many recent submission responses are remembered
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv('IDEMPOTENCY_TTL_SECONDS', '86400'))
+IDEMPOTENCY_MAX_KEYS = int(os.getenv('IDEMPOTENCY_MAX_KEYS', '10000'))
+
+# /api/admin/submissions totals: facet counters are recounted from the store this often (0 = never);
+# totals for other filters come from a COUNT query cached this long
+FACET_RECONCILE_SECONDS = float(os.getenv('FACET_RECONCILE_SECONDS', '3600'))
+COUNT_CACHE_SECONDS = float(os.getenv('COUNT_CACHE_SECONDS', '60'))
+
+# /api/admin/submissions/stream: events kept for Last-Event-ID resume, open streams per worker
+# (each holds a server thread), keepalive interval and how long one stream lasts before reconnecting
+STREAM_BUFFER_SIZE = int(os.getenv('STREAM_BUFFER_SIZE', '1000'))
+STREAM_MAX_CLIENTS = int(os.getenv('STREAM_MAX_CLIENTS', '2'))
+STREAM_HEARTBEAT_SECONDS = float(os.getenv('STREAM_HEARTBEAT_SECONDS', '15'))
+STREAM_MAX_SECONDS = float(os.getenv('STREAM_MAX_SECONDS', '600'))
+
+# Background tasks (text reports, backup files) run after the response on this many threads;
+# past BACKGROUND_MAX_PENDING queued tasks they run inline again
+BACKGROUND_WORKERS = int(os.getenv('BACKGROUND_WORKERS', '2'))
+BACKGROUND_MAX_PENDING = int(os.getenv('BACKGROUND_MAX_PENDING', '1000'))
+
+# In-memory search index for /api/admin/search (built from the store at startup, not on SERVERLESS)
+SEARCH_INDEX_ENABLED = os.getenv('SEARCH_INDEX_ENABLED', 'True').lower() == 'true'
+
+# Device identity index for /api/admin/conflicts and the identity_flags on submission responses
+DEVICE_INDEX_ENABLED = os.getenv('DEVICE_INDEX_ENABLED', 'True').lower() == 'true'
+# With several worker processes each holds its own indexes; every INDEX_SYNC_SECONDS they pick up
+# rows stored by the other workers (0 = off, fine for a single process)
+INDEX_SYNC_SECONDS = float(os.getenv('INDEX_SYNC_SECONDS', '0'))
+
+# Retention: snapshots older than RETENTION_DAYS are folded into per-device daily summaries
+# (system_details_daily) every COMPACTION_INTERVAL_HOURS, raw rows archived to COMPACTION_ARCHIVE_DIR
+# first ('' = no archive). 0 keeps everything; one worker at a time holds COMPACTION_LOCK_PATH
+RETENTION_DAYS = int(os.getenv('RETENTION_DAYS', '0'))
+COMPACTION_INTERVAL_HOURS = float(os.getenv('COMPACTION_INTERVAL_HOURS', '24'))
+COMPACTION_ARCHIVE_DIR = os.getenv('COMPACTION_ARCHIVE_DIR', 'archive')
+COMPACTION_LOCK_PATH = os.getenv('COMPACTION_LOCK_PATH', 'compaction.lock')
+
+# Columnar archive written by columnar_archive.py and queried by /api/admin/analytics
+ANALYTICS_ARCHIVE_DIR = os.getenv('ANALYTICS_ARCHIVE_DIR', 'columnar')
+
+# Per-mount storage trends for /api/admin/forecast/storage: older samples count half as much
+# every FORECAST_HALF_LIFE_DAYS, and a mount counts as full at FORECAST_FULL_PERCENT
+STORAGE_FORECAST_ENABLED = os.getenv('STORAGE_FORECAST_ENABLED', 'True').lower() == 'true'
+FORECAST_HALF_LIFE_DAYS = float(os.getenv('FORECAST_HALF_LIFE_DAYS', '30'))
+FORECAST_FULL_PERCENT = float(os.getenv('FORECAST_FULL_PERCENT', '95'))
@@ -0,0 +1,244 @@
+"""
+Device Identity Index
+Tracks which employees, hostnames and serial numbers each device identity has
+been seen with, so conflicts (a serial under two employees after a handover, a
+hostname reused by another machine) and placeholder identities are flagged at
+ingest time with O(1) work per submission. Backs /api/admin/conflicts.
+
+MAC addresses are not collected, so the network key is the reported IP address.
+Only globally routable addresses are checked: private (RFC 1918), carrier-grade
+NAT, link-local and other special-purpose addresses are shared by many machines
+or handed out again by DHCP, so a second device behind one is not a conflict.
+"""
+
+import datetime
+import ipaddress
+import threading
+from collections import deque
+
+from get_system_details import is_placeholder_serial, is_placeholder_ip
+from search_index import RecentIds, sync_horizon
+
+# Values stored per identity key; beyond this the key is already a conflict and more adds nothing
+MAX_VALUES_PER_KEY = 20
+# Further values remembered per key (without timestamps) so each is flagged once; beyond this none are
+MAX_OVERFLOW_PER_KEY = 1000
+# Submission ids kept per conflict / placeholder kind as examples
+MAX_EXAMPLE_IDS = 10
+
+PLACEHOLDER_HOSTNAMES = frozenset(['', 'unknown', 'localhost', 'localhost.localdomain', 'none'])
+
+# conflict kind -> (identity key, attribute whose distinct values must stay at one)
+CONFLICT_KINDS = {
+    'serial_employees': ('serial', 'employee_id'),
+    'serial_hostnames': ('serial', 'hostname'),
+    'hostname_serials': ('hostname', 'serial'),
+    'ip_devices': ('ip', 'device'),
+}
+_CONFLICT_KIND_FOR = {value: kind for kind, value in CONFLICT_KINDS.items()}
+
+
+def _norm(value):
+    return str(value).strip() if value is not None else ''
+
+
+def is_shared_ip(ip):
+    """True if an address is not globally routable (RFC 1918, CGNAT, link-local, ...) or not an address"""
+    try:
+        return not ipaddress.ip_address(ip).is_global
+    except ValueError:
+        return True
+
+
+def identity_keys(row):
+    """Normalized identity values of a row; placeholders come back as None"""
+    serial = _norm(row.get('serial_number'))
+    hostname = _norm(row.get('hostname')).lower()
+    ip = _norm(row.get('ip_address'))
+    keys = {
+        'serial': None if is_placeholder_serial(serial) else serial.upper(),
+        'hostname': None if hostname in PLACEHOLDER_HOSTNAMES else hostname,
+        'ip': None if is_placeholder_ip(ip) else ip,
+    }
+    # What "one device" means for the IP check: its serial, else its hostname
+    keys['device'] = keys['serial'] or keys['hostname']
+    return keys
+
+
+class _KeyStats:
+    __slots__ = ('values', 'overflow', 'count', 'first_seen', 'last_seen')
+
+    def __init__(self):
+        self.values = {}
+        self.overflow = {}        # attribute -> values seen after MAX_VALUES_PER_KEY
+        self.count = 0
+        self.first_seen = None
+        self.last_seen = None
+
+
+class _Conflict:
+    __slots__ = ('kind', 'key', 'detected_at', 'ids')
+
+    def __init__(self, kind, key, detected_at):
+        self.kind = kind
+        self.key = key
+        self.detected_at = detected_at
+        self.ids = deque(maxlen=MAX_EXAMPLE_IDS)
+
+
+class DeviceIndex:
+    """Per-identity value sets plus the conflicts and placeholders found so far"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+        self._pending = None
+        self._fresh = None
+        self.ready = False
+
+    def _reset(self):
+        self._keys = {}           # (key kind, value) -> _KeyStats
+        self._conflicts = {}      # (conflict kind, value) -> _Conflict
+        self._placeholders = {}   # identity kind -> {'count': n, 'ids': deque}
+        # Recent rows already counted (streamed and inserted, or synced twice)
+        self._seen = RecentIds(sync_horizon(datetime.datetime.now(datetime.timezone.utc).isoformat()))
+
+    def _touch(self, key_kind, key, seen_at):
+        stats = self._keys.get((key_kind, key))
+        if stats is None:
+            stats = self._keys[(key_kind, key)] = _KeyStats()
+            stats.first_seen = seen_at
+        stats.count += 1
+        stats.last_seen = seen_at or stats.last_seen
+        return stats
+
+    def _track(self, stats, key_kind, key, attribute, value, row_id, seen_at, flags):
+        if value is None:
+            return
+        values = stats.values.setdefault(attribute, {})
+        if value in values:
+            return
+        if len(values) < MAX_VALUES_PER_KEY:
+            values[value] = seen_at
+        else:
+            overflow = stats.overflow.setdefault(attribute, set())
+            if value in overflow or len(overflow) >= MAX_OVERFLOW_PER_KEY:
+                return
+            overflow.add(value)
+        if len(values) > 1:
+            # Flag the submission that introduced the new value, not every later one
+            kind = _CONFLICT_KIND_FOR[(key_kind, attribute)]
+            conflict = self._conflicts.get((kind, key))
+            if conflict is None:
+                conflict = self._conflicts[(kind, key)] = _Conflict(kind, key, seen_at)
+            conflict.ids.append(row_id)
+            flags.append({'kind': kind, 'key': key, 'values': sorted(values)})
+
+    def _add(self, row):
+        row_id = row.get('id')
+        flags = []
+        if row_id is not None and not self._seen.add(row_id, row.get('created_at')):
+            return flags
+        keys = identity_keys(row)
+        seen_at = row.get('created_at')
+
+        for kind, raw in (('serial', row.get('serial_number')), ('hostname', row.get('hostname')),
+                          ('ip', row.get('ip_address'))):
+            if keys[kind] is None and raw is not None:
+                # Placeholder reported (None means the probe did not run, which is not a placeholder)
+                entry = self._placeholders.setdefault(kind, {'count': 0, 'values': {}, 'ids': deque(maxlen=MAX_EXAMPLE_IDS)})
+                entry['count'] += 1
+                shown = _norm(raw)
+                if len(entry['values']) < MAX_VALUES_PER_KEY or shown in entry['values']:
+                    entry['values'][shown] = entry['values'].get(shown, 0) + 1
+                entry['ids'].append(row_id)
+                flags.append({'kind': f'placeholder_{kind}', 'key': shown})
+
+        employee = _norm(row.get('employee_id')) or None
+        if keys['serial']:
+            stats = self._touch('serial', keys['serial'], seen_at)
+            self._track(stats, 'serial', keys['serial'], 'employee_id', employee, row_id, seen_at, flags)
+            self._track(stats, 'serial', keys['serial'], 'hostname', keys['hostname'], row_id, seen_at, flags)
+        if keys['hostname']:
+            stats = self._touch('hostname', keys['hostname'], seen_at)
+            self._track(stats, 'hostname', keys['hostname'], 'serial', keys['serial'], row_id, seen_at, flags)
+        if keys['ip'] and not is_shared_ip(keys['ip']):
+            stats = self._touch('ip', keys['ip'], seen_at)
+            self._track(stats, 'ip', keys['ip'], 'device', keys['device'], row_id, seen_at, flags)
+        return flags
+
+    def add(self, row):
+        """Record one stored row; returns the conflict/placeholder flags it raised"""
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append(row)
+                # Flags are computed against what is known so far; the rebuilt state is authoritative
+                return self._fresh_flags(row)
+            return self._add(row)
+
+    def _fresh_flags(self, row):
+        keys = identity_keys(row)
+        flags = [{'kind': f'placeholder_{kind}', 'key': _norm(row.get(field))}
+                 for kind, field in (('serial', 'serial_number'), ('hostname', 'hostname'), ('ip', 'ip_address'))
+                 if keys[kind] is None and row.get(field) is not None]
+        return flags
+
+    def begin_build(self):
+        with self._lock:
+            self._pending = []
+        self._fresh = DeviceIndex()
+
+    def feed(self, row):
+        self._fresh._add(row)
+
+    def finish_build(self):
+        with self._lock:
+            fresh = self._fresh
+            for row in self._pending:
+                fresh._add(row)
+            self._keys, self._conflicts, self._placeholders = fresh._keys, fresh._conflicts, fresh._placeholders
+            self._seen = fresh._seen
+            self._pending = None
+            self._fresh = None
+            self.ready = True
+        print(f"Device index: {len(self._keys)} identities, {len(self._conflicts)} conflict(s)")
+
+    def abort_build(self):
+        with self._lock:
+            pending, self._pending, self._fresh = self._pending or [], None, None
+            for row in pending:
+                self._add(row)
+
+    def forget_before(self, created_at):
+        with self._lock:
+            self._seen.forget_before(created_at)
+
+    def report(self, kind=None, limit=100):
+        """Conflicts (most recently detected first) and placeholder counts"""
+        with self._lock:
+            conflicts = [c for c in self._conflicts.values() if kind is None or c.kind == kind]
+            conflicts.sort(key=lambda c: c.detected_at or '', reverse=True)
+            items = []
+            for conflict in conflicts[:limit]:
+                key_kind, attribute = CONFLICT_KINDS[conflict.kind]
+                stats = self._keys[(key_kind, conflict.key)]
+                items.append({
+                    'kind': conflict.kind,
+                    key_kind: conflict.key,
+                    attribute + 's': [{'value': v, 'first_seen': t} for v, t in stats.values[attribute].items()],
+                    'submissions': stats.count,
+                    'first_seen': stats.first_seen,
+                    'last_seen': stats.last_seen,
+                    'detected_at': conflict.detected_at,
+                    'example_ids': list(conflict.ids),
+                })
+            placeholders = {
+                kind: {'count': entry['count'], 'values': dict(entry['values']), 'example_ids': list(entry['ids'])}
+                for kind, entry in self._placeholders.items()
+            }
+            return {
+                'ready': self.ready,
+                'total_conflicts': len(conflicts),
+                'conflicts': items,
+                'placeholders': placeholders,
+            }
@@ -0,0 +1,216 @@
+"""
+Facet Counts
+Submission totals per department, OS and model, maintained at ingest time so
+/api/admin/submissions can report totals and facet counts without counting
+the table. Built from the store at startup, recounted periodically with
+COUNT ... GROUP BY queries to stay in line with it (deletes, missed inserts),
+and topped up on every insert.
+"""
+
+import time
+import datetime
+import threading
+from collections import Counter, OrderedDict
+
+from search_index import RecentIds, sync_horizon
+
+# Facet name in the API -> system_details column
+FACETS = {
+    'department': 'department',
+    'os': 'windows_system',
+    'os_release': 'windows_release',
+    'model': 'system_model',
+}
+# Facets kept per department as well, for department-filtered listings
+DEPARTMENT_FACETS = ('os', 'os_release', 'model')
+
+DEFAULT_FACET_LIMIT = 20
+# storage.count() answers for filters the counters cannot serve are reused for this long
+COUNT_CACHE_SECONDS = 60
+COUNT_CACHE_MAX_KEYS = 1000
+
+
+def _value(row, column):
+    value = row.get(column)
+    return str(value).strip() if value not in (None, '') else None
+
+
+class FacetCounts:
+    """Exact counters over stored rows, keyed by facet value (and by department)"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+        self._pending = None
+        self._fresh = None
+        self.ready = False
+        self.built_at = None
+
+    def _reset(self):
+        self.total = 0
+        self._counts = {facet: Counter() for facet in FACETS}
+        self._by_department = {}      # department -> {facet: Counter}
+        self._seen = RecentIds(sync_horizon(datetime.datetime.now(datetime.timezone.utc).isoformat()))
+
+    def _add(self, row):
+        row_id = row.get('id')
+        if row_id is None or not self._seen.add(row_id, row.get('created_at')):
+            # Spooled rows are not listed yet; synced rows may arrive twice
+            return
+        self.total += 1
+        values = {facet: _value(row, column) for facet, column in FACETS.items()}
+        for facet, value in values.items():
+            self._counts[facet][value] += 1
+        department = values['department']
+        scoped = self._by_department.get(department)
+        if scoped is None:
+            scoped = self._by_department[department] = {facet: Counter() for facet in DEPARTMENT_FACETS}
+        for facet in DEPARTMENT_FACETS:
+            scoped[facet][values[facet]] += 1
+
+    def add(self, row):
+        """Count one stored row"""
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append(row)
+            else:
+                self._add(row)
+
+    def begin_build(self):
+        with self._lock:
+            self._pending = []
+        self._fresh = FacetCounts()
+
+    def feed(self, row):
+        self._fresh._add(row)
+
+    def finish_build(self):
+        with self._lock:
+            fresh = self._fresh
+            for row in self._pending:
+                fresh._add(row)
+            drift = fresh.total - self.total if self.ready else 0
+            self.total, self._counts = fresh.total, fresh._counts
+            self._by_department, self._seen = fresh._by_department, fresh._seen
+            self._pending = None
+            self._fresh = None
+            self.ready = True
+            self.built_at = time.time()
+        print(f"Facet counts: {self.total} submission(s)" + (f", corrected by {drift:+d}" if drift else ""))
+
+    def abort_build(self):
+        with self._lock:
+            pending, self._pending, self._fresh = self._pending or [], None, None
+            for row in pending:
+                self._add(row)
+
+    def forget_before(self, created_at):
+        with self._lock:
+            self._seen.forget_before(created_at)
+
+    def recount(self, storage):
+        """Replace the counters with COUNT ... GROUP BY results from the store.
+
+        A few queries over the facet columns instead of streaming every row. Inserts
+        racing the queries may be off by one until the next recount.
+        """
+        started = time.monotonic()
+        total = storage.count()
+        counts = {facet: Counter() for facet in FACETS}
+        for facet, column in FACETS.items():
+            for (value,), n in storage.group_counts([column]).items():
+                counts[facet][_value({column: value}, column)] += n
+        by_department = {}
+        for facet in DEPARTMENT_FACETS:
+            column = FACETS[facet]
+            for (department, value), n in storage.group_counts(['department', column]).items():
+                department = _value({'department': department}, 'department')
+                scoped = by_department.get(department)
+                if scoped is None:
+                    scoped = by_department[department] = {name: Counter() for name in DEPARTMENT_FACETS}
+                scoped[facet][_value({column: value}, column)] += n
+        with self._lock:
+            drift = total - self.total if self.ready else 0
+            self.total, self._counts, self._by_department = total, counts, by_department
+            self.ready = True
+            self.built_at = time.time()
+        print(f"Facet counts recounted in {time.monotonic() - started:.1f}s: {total} submission(s)"
+              + (f", corrected by {drift:+d}" if drift else ""))
+
+    def count(self, filters):
+        """Exact total for filters, or None when the counters cannot answer it.
+
+        Answers no filter, one facet filter, or department plus one department facet.
+        """
+        filters = {k: v for k, v in (filters or {}).items() if v not in (None, '')}
+        columns = {column: facet for facet, column in FACETS.items()}
+        if any(column not in columns for column in filters):
+            return None
+        with self._lock:
+            if not self.ready:
+                return None
+            if not filters:
+                return self.total
+            if len(filters) == 1:
+                (column, value), = filters.items()
+                return self._counts[columns[column]].get(value, 0)
+            if len(filters) == 2 and 'department' in filters:
+                column = next(c for c in filters if c != 'department')
+                if columns[column] in DEPARTMENT_FACETS:
+                    scoped = self._by_department.get(filters['department'])
+                    return scoped[columns[column]].get(filters[column], 0) if scoped else 0
+            return None
+
+    def facets(self, department=None, limit=DEFAULT_FACET_LIMIT):
+        """{facet: [{'value', 'count'}, ...]} largest first; scoped to one department if given"""
+        with self._lock:
+            if department:
+                scoped = self._by_department.get(department) or {}
+                counters = {facet: scoped.get(facet, Counter()) for facet in DEPARTMENT_FACETS}
+            else:
+                counters = self._counts
+            return {
+                facet: [{'value': value, 'count': n} for value, n in counter.most_common(limit)]
+                for facet, counter in counters.items()
+            }
+
+
+class CountCache:
+    """storage.count() results for arbitrary filters, reused for a short while"""
+
+    def __init__(self, ttl_seconds=COUNT_CACHE_SECONDS, max_keys=COUNT_CACHE_MAX_KEYS):
+        self.ttl_seconds = ttl_seconds
+        self.max_keys = max_keys
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def count(self, storage, filters):
+        """(count, cached) for filters"""
+        key = tuple(sorted((filters or {}).items()))
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(key)
+                return entry[1], True
+        count = storage.count(filters)
+        with self._lock:
+            self._entries[key] = (now + self.ttl_seconds, count)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_keys:
+                self._entries.popitem(last=False)
+        return count, False
+
+
+def start_reconcile(storage, facet_counts, interval_seconds):
+    """Daemon thread that recounts facet_counts from the store every interval_seconds"""
+    def loop():
+        while True:
+            time.sleep(interval_seconds)
+            try:
+                facet_counts.recount(storage)
+            except Exception as e:
+                print(f"Facet count reconciliation failed: {e}")
+    thread = threading.Thread(target=loop, name='facet-reconcile', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,275 @@
+"""
+Fleet Analytics
+Filters, group-bys and percentiles over the columnar archive written by
+columnar_archive.py. Partitions outside the month/department filters are
+never opened; the rest are memory-mapped and evaluated with vectorized NumPy
+operations, so only the selected values of the needed columns are read.
+
+Filters (ANDed):
+    department=Finance          text columns: = and !=
+    ram_total_gb>=16            numeric columns: = != < <= > >=
+    month>=2026-01              month bounds
+
+Usage:
+    python fleet_analytics.py ram_total_gb --group-by system_model
+    python fleet_analytics.py storage_max_used_percent --group-by department --where windows_release=10 -p 50,90,99
+"""
+
+import re
+import sys
+import json
+import time
+import argparse
+
+import config
+from columnar_archive import (
+    NUMPY_AVAILABLE, NUMERIC_COLUMNS, CATEGORICAL_COLUMNS, PARTITION_COLUMNS, list_partitions,
+)
+
+if NUMPY_AVAILABLE:
+    import numpy as np
+
+DEFAULT_PERCENTILES = (50, 90, 99)
+DEFAULT_GROUP_LIMIT = 100
+MAX_GROUP_LIMIT = 10000
+
+DIMENSIONS = CATEGORICAL_COLUMNS + PARTITION_COLUMNS
+
+_CONDITION = re.compile(r'^([a-z_]+)\s*(!=|>=|<=|=|>|<)\s*(.*)$')
+
+
+def parse_where(expressions):
+    """[(column, op, value)] from 'column<op>value' strings; raises ValueError on bad input"""
+    conditions = []
+    for expression in expressions or ():
+        match = _CONDITION.match(expression.strip())
+        if not match:
+            raise ValueError(f"Bad filter '{expression}'. Use column=value, column>=number, ...")
+        column, op, value = match.groups()
+        if column in NUMERIC_COLUMNS:
+            try:
+                value = float(value)
+            except ValueError:
+                raise ValueError(f"Filter on {column} needs a number, got '{value}'")
+        elif column in DIMENSIONS:
+            if op not in ('=', '!=') and column != 'month':
+                raise ValueError(f"{column} only supports = and !=")
+        else:
+            raise ValueError(f"Unknown column '{column}'. Use one of: {', '.join(NUMERIC_COLUMNS + DIMENSIONS)}")
+        conditions.append((column, op, value))
+    return conditions
+
+
+def parse_percentiles(value):
+    """(50, 90, ...) from '50,90'; each between 0 and 100"""
+    percentiles = []
+    for item in str(value).split(','):
+        if item.strip():
+            percentile = float(item)
+            if not 0 <= percentile <= 100:
+                raise ValueError(f"Percentile {percentile} is not between 0 and 100")
+            percentiles.append(percentile)
+    return tuple(percentiles)
+
+
+def _compare(values, op, value):
+    if op == '=':
+        return values == value
+    if op == '!=':
+        return values != value
+    if op == '<':
+        return values < value
+    if op == '<=':
+        return values <= value
+    if op == '>':
+        return values > value
+    return values >= value
+
+
+def _partition_matches(partition, conditions):
+    """False if a month/department condition rules the whole partition out"""
+    for column, op, value in conditions:
+        if column == 'month' and not _compare(partition.month, op, value):
+            return False
+        if column == 'department' and not _compare(partition.department or '', op, value):
+            return False
+    return True
+
+
+def _row_mask(partition, conditions):
+    """Boolean mask of the partition rows passing the column conditions, or None for all of them"""
+    mask = None
+    for column, op, value in conditions:
+        if column in PARTITION_COLUMNS:
+            continue
+        if column in CATEGORICAL_COLUMNS:
+            try:
+                code = partition.dictionary(column).index(value)
+            except ValueError:
+                # Value never occurs in this partition
+                code = None
+            codes = partition.column(column)
+            if code is None:
+                condition = np.zeros(partition.rows, dtype=bool) if op == '=' else np.ones(partition.rows, dtype=bool)
+            else:
+                condition = _compare(codes, op, code)
+        else:
+            # NaN (missing) fails every comparison except !=
+            condition = _compare(partition.column(column), op, value)
+        mask = condition if mask is None else mask & condition
+    return mask
+
+
+class _GlobalCodes:
+    """Maps partition-local dictionary codes of one dimension onto codes shared by all partitions"""
+
+    def __init__(self):
+        self.values = [None]          # global code 0 = missing
+        self._codes = {None: 0}
+
+    def code(self, value):
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def remap(self, partition, column, local_codes):
+        # Local code -1 (missing) lands on the last slot of the lookup table, which maps to 0
+        lookup = np.array([self.code(value) for value in partition.dictionary(column)] + [0], dtype=np.int64)
+        return lookup[local_codes]
+
+
+def run_query(root, metric=None, group_by=(), where=(), percentiles=DEFAULT_PERCENTILES,
+              limit=DEFAULT_GROUP_LIMIT):
+    """Aggregate metric over the archive rows passing where, per group_by combination.
+
+    Groups come back largest first with count, mean, min, max and the requested
+    percentiles of metric (rows where it is missing are left out), or with the
+    row count only when metric is None.
+    """
+    if not NUMPY_AVAILABLE:
+        raise RuntimeError('NumPy is required for fleet analytics (pip install numpy)')
+    if metric is not None and metric not in NUMERIC_COLUMNS:
+        raise ValueError(f"Unknown metric '{metric}'. Use one of: {', '.join(NUMERIC_COLUMNS)}")
+    for column in group_by:
+        if column not in DIMENSIONS:
+            raise ValueError(f"Cannot group by '{column}'. Use one of: {', '.join(DIMENSIONS)}")
+    conditions = parse_where(where)
+    limit = max(1, min(limit, MAX_GROUP_LIMIT))
+    started = time.perf_counter()
+
+    month_from = [value for column, op, value in conditions if column == 'month' and op in ('>=', '=')]
+    month_to = [value for column, op, value in conditions if column == 'month' and op in ('<=', '=')]
+    partitions = list_partitions(root, max(month_from) if month_from else None, min(month_to) if month_to else None)
+    global_codes = {column: _GlobalCodes() for column in group_by}
+    value_parts, key_parts = [], {column: [] for column in group_by}
+    scanned = 0
+
+    for partition in partitions:
+        if not _partition_matches(partition, conditions):
+            continue
+        scanned += 1
+        mask = _row_mask(partition, conditions)
+        if metric is not None:
+            values = partition.column(metric)
+            present = ~np.isnan(values)
+            mask = present if mask is None else mask & present
+        selected = np.flatnonzero(mask) if mask is not None else np.arange(partition.rows)
+        if not len(selected):
+            continue
+        value_parts.append(values[selected].astype(np.float64) if metric is not None else np.zeros(len(selected)))
+        for column in group_by:
+            if column in PARTITION_COLUMNS:
+                code = global_codes[column].code(getattr(partition, column))
+                key_parts[column].append(np.full(len(selected), code, dtype=np.int64))
+            else:
+                local = partition.column(column)[selected]
+                key_parts[column].append(global_codes[column].remap(partition, column, local))
+
+    result = {
+        'metric': metric,
+        'group_by': list(group_by),
+        'partitions_scanned': scanned,
+        'rows': 0,
+        'total_groups': 0,
+        'groups': [],
+    }
+    if value_parts:
+        values = np.concatenate(value_parts)
+        result['rows'] = int(len(values))
+        if group_by:
+            keys = np.stack([np.concatenate(key_parts[column]) for column in group_by], axis=1)
+            unique_keys, inverse = np.unique(keys, axis=0, return_inverse=True)
+            inverse = inverse.reshape(-1)
+        else:
+            unique_keys, inverse = np.zeros((1, 0), dtype=np.int64), np.zeros(len(values), dtype=np.int64)
+        stats = _group_stats(values, inverse, len(unique_keys), percentiles if metric else ())
+        order = np.argsort(-stats['count'], kind='stable')
+        result['total_groups'] = int(len(unique_keys))
+        for group in order[:limit]:
+            entry = {'key': {column: global_codes[column].values[unique_keys[group][i]]
+                             for i, column in enumerate(group_by)},
+                     'count': int(stats['count'][group])}
+            if metric is not None:
+                for name in ('mean', 'min', 'max'):
+                    entry[name] = round(float(stats[name][group]), 2)
+                for percentile in percentiles:
+                    entry[f'p{percentile:g}'] = round(float(stats['percentiles'][percentile][group]), 2)
+            result['groups'].append(entry)
+    result['took_ms'] = round((time.perf_counter() - started) * 1000, 3)
+    return result
+
+
+def _group_stats(values, groups, group_count, percentiles):
+    """count/mean/min/max and linearly interpolated percentiles per group, without a Python loop over groups"""
+    order = np.lexsort((values, groups))
+    ordered = values[order]
+    counts = np.bincount(groups, minlength=group_count)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    stats = {
+        'count': counts,
+        'mean': np.bincount(groups, weights=values, minlength=group_count) / counts,
+        'min': np.minimum.reduceat(ordered, starts),
+        'max': np.maximum.reduceat(ordered, starts),
+        'percentiles': {},
+    }
+    for percentile in percentiles:
+        position = starts + (counts - 1) * (percentile / 100.0)
+        lower = np.floor(position).astype(np.int64)
+        upper = np.ceil(position).astype(np.int64)
+        stats['percentiles'][percentile] = ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+    return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Aggregate the columnar submission archive")
+    parser.add_argument('metric', nargs='?', default=None,
+                        help=f"Numeric column to aggregate (omit to count rows): {', '.join(NUMERIC_COLUMNS)}")
+    parser.add_argument('--group-by', '-g', default='', help=f"Comma-separated: {', '.join(DIMENSIONS)}")
+    parser.add_argument('--where', '-w', action='append', default=[], help="Filter, e.g. department=IT (repeatable)")
+    parser.add_argument('--percentiles', '-p', default=','.join(str(p) for p in DEFAULT_PERCENTILES))
+    parser.add_argument('--limit', type=int, default=DEFAULT_GROUP_LIMIT)
+    parser.add_argument('--root', default=config.ANALYTICS_ARCHIVE_DIR,
+                        help="Archive directory (default: %(default)s)")
+    parser.add_argument('--json', action='store_true', help="Print the raw result")
+    args = parser.parse_args()
+    if not NUMPY_AVAILABLE:
+        print("❌ NumPy is required: pip install numpy")
+        sys.exit(1)
+
+    try:
+        result = run_query(args.root, args.metric, [c for c in args.group_by.split(',') if c], args.where,
+                           parse_percentiles(args.percentiles), args.limit)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.json:
+        print(json.dumps(result, indent=2))
+        sys.exit(0)
+
+    print(f"{result['rows']} row(s) from {result['partitions_scanned']} partition(s) "
+          f"in {result['took_ms']} ms, {result['total_groups']} group(s)")
+    for group in result['groups']:
+        key = ', '.join(f"{column}={value}" for column, value in group['key'].items()) or 'all'
+        figures = ', '.join(f"{name}={value}" for name, value in group.items() if name not in ('key',))
+        print(f"  {key}: {figures}")
@@ -9,12 +9,15 @@ Fetches and displays system information including:
 """
 
 import os
+import re
 import socket
 import platform
 import shutil
 import sys
 import subprocess
 import datetime
+import threading
+import time
 
 # GUI
 try:
@@ -25,13 +28,40 @@ try:
 except Exception:
     TK_AVAILABLE = False
 
+# Native /proc reader for RAM and mounts on Linux; psutil covers the other platforms
+import procfs
+from procfs import PROCFS_AVAILABLE
+
 try:
     import psutil
     PSUTIL_AVAILABLE = True
 except ImportError:
     PSUTIL_AVAILABLE = False
-    print("Warning: psutil not installed. RAM details will be limited.")
-    print("Install it with: pip install psutil\n")
+    if not PROCFS_AVAILABLE:
+        print("Warning: psutil not installed. RAM details will be limited.")
+        print("Install it with: pip install psutil\n")
+
+
+# Serial numbers that firmware, VMs and browsers report instead of a real one
+PLACEHOLDER_SERIALS = frozenset([
+    '', 'unknown', 'not specified', 'to be filled by o.e.m.', 'default string',
+    'system serial number', 'not available via browser', 'none', 'n/a', '0',
+    '0123456789', '1234567890', 'chassis serial number',
+])
+
+
+def is_placeholder_serial(value):
+    """True if a serial number is missing or a known placeholder"""
+    return value is None or str(value).strip().lower() in PLACEHOLDER_SERIALS
+
+
+# IP addresses that say nothing about where a machine is
+PLACEHOLDER_IPS = frozenset(['', 'unknown', 'none', 'n/a', '127.0.0.1', '0.0.0.0', '::1', '::'])
+
+
+def is_placeholder_ip(value):
+    """True if an IP address is missing, loopback/unspecified or a placeholder"""
+    return value is None or str(value).strip().lower() in PLACEHOLDER_IPS
 
 
 def is_serverless_environment():
@@ -57,244 +87,251 @@ def get_username():
             return 'Unknown'
 
 
-def get_hostname():
-    """Get the hostname"""
+DEFAULT_RESOLVE_BUDGET = 2
+
+
+def _route_address():
+    """Local address of the default route; a UDP connect sends nothing and does no DNS"""
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            s.connect(("8.8.8.8", 80))
+            return s.getsockname()[0]
+    except OSError:
+        return None
+
+
+def network_fingerprint():
+    """Hostname plus interface addresses; changes whenever the network configuration does"""
     try:
         hostname = socket.gethostname()
-        # In serverless environments, hostname might be an IP or container ID
-        # Try to get FQDN if available
+    except OSError:
+        hostname = ''
+    if PSUTIL_AVAILABLE:
         try:
-            fqdn = socket.getfqdn()
-            if fqdn and fqdn != hostname and '.' in fqdn:
-                return fqdn
-        except:
+            addresses = sorted(addr.address for addrs in psutil.net_if_addrs().values() for addr in addrs)
+            return (hostname, tuple(addresses))
+        except Exception:
             pass
-        return hostname
-    except:
-        return 'Unknown'
+    if PROCFS_AVAILABLE:
+        return (hostname, tuple(procfs.local_addresses()))
+    return (hostname, _route_address())
 
 
-def get_system_manufacturer():
-    """Get the system manufacturer"""
-    try:
-        if sys.platform == 'win32':
-            # Try WMIC first
-            try:
-                result = subprocess.run(
-                    ["wmic", "computersystem", "get", "manufacturer"],
-                    capture_output=True,
-                    text=True,
-                    check=False,
-                    timeout=5
-                )
-                output = (result.stdout or "").strip().splitlines()
-                values = [line.strip() for line in output if line and "Manufacturer" not in line]
-                if values and values[0]:
-                    return values[0]
-            except:
-                pass
-            
-            # PowerShell fallback
-            try:
-                ps_cmd = [
-                    "powershell",
-                    "-NoProfile",
-                    "-Command",
-                    "(Get-CimInstance Win32_ComputerSystem).Manufacturer"
-                ]
-                result = subprocess.run(ps_cmd, capture_output=True, text=True, check=False, timeout=5)
-                value = (result.stdout or "").strip()
-                if value:
-                    return value
-            except:
-                pass
-        elif sys.platform.startswith('linux'):
-            # Try to get manufacturer from DMI (Linux)
-            try:
-                result = subprocess.run(
-                    ["cat", "/sys/class/dmi/id/sys_vendor"],
-                    capture_output=True,
-                    text=True,
-                    check=False,
-                    timeout=2
-                )
-                value = (result.stdout or "").strip()
+def _lookup_fqdn():
+    hostname = socket.gethostname()
+    fqdn = socket.getfqdn()
+    if fqdn and fqdn != hostname and '.' in fqdn:
+        return fqdn
+    return hostname
+
+
+def _lookup_ip_address():
+    address = _route_address()
+    if address:
+        return address
+    return socket.gethostbyname(socket.gethostname())
+
+
+class NetworkResolver:
+    """DNS-dependent lookups run on daemon threads, cached per network fingerprint.
+
+    start() kicks lookups off early so they overlap with the other probes; get()
+    waits at most `budget` seconds and returns None if the answer is not in yet.
+    A lookup that finishes late still fills the cache for the next collection.
+    """
+
+    LOOKUPS = {'fqdn': _lookup_fqdn, 'ip_address': _lookup_ip_address}
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._fingerprint = None
+        self._values = {}
+        self._pending = {}
+
+    def _refresh(self):
+        # Called with the lock held: drop everything cached under an old configuration
+        fingerprint = network_fingerprint()
+        if fingerprint != self._fingerprint:
+            self._fingerprint = fingerprint
+            self._values = {}
+            self._pending = {}
+        return fingerprint
+
+    def start(self, *names):
+        with self._lock:
+            fingerprint = self._refresh()
+            for name in names:
+                if name in self._values or name in self._pending:
+                    continue
+                done = threading.Event()
+                self._pending[name] = done
+                thread = threading.Thread(target=self._run, args=(name, fingerprint, done),
+                                          name=f'resolve-{name}', daemon=True)
+                thread.start()
+
+    def _run(self, name, fingerprint, done):
+        try:
+            value = self.LOOKUPS[name]()
+        except Exception:
+            value = None
+        with self._lock:
+            if self._fingerprint == fingerprint:
                 if value:
-                    return value
-            except:
-                pass
-            # Alternative: dmidecode (requires root)
-            try:
-                result = subprocess.run(
-                    ["dmidecode", "-s", "system-manufacturer"],
-                    capture_output=True,
-                    text=True,
-                    check=False,
-                    timeout=2
-                )
-                value = (result.stdout or "").strip()
-                if value and value.lower() not in ['', 'not specified', 'unknown']:
-                    return value
-            except:
-                pass
-        
-        return 'Unknown'
+                    self._values[name] = value
+                if self._pending.get(name) is done:
+                    del self._pending[name]
+        done.set()
+
+    def get(self, name, budget=DEFAULT_RESOLVE_BUDGET):
+        self.start(name)
+        with self._lock:
+            if name in self._values:
+                return self._values[name]
+            done = self._pending.get(name)
+        if done is not None:
+            done.wait(budget)
+        with self._lock:
+            return self._values.get(name)
+
+    def clear(self):
+        with self._lock:
+            self._fingerprint = None
+            self._values = {}
+            self._pending = {}
+
+
+resolver = NetworkResolver()
+
+
+def get_hostname(resolve_fqdn=True, budget=DEFAULT_RESOLVE_BUDGET):
+    """Get the hostname (the FQDN if reverse DNS answers within budget seconds)"""
+    try:
+        hostname = socket.gethostname()
+        if not resolve_fqdn:
+            return hostname
+        # In serverless environments, hostname might be an IP or container ID
+        # Try to get FQDN if available
+        return resolver.get('fqdn', budget) or hostname
     except:
         return 'Unknown'
 
 
-def get_system_model():
-    """Get the system model"""
+def _read_sysfs(path):
+    """Read a small sysfs/DMI file directly (no subprocess); '' if unreadable"""
+    try:
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            return f.read().strip()
+    except OSError:
+        return ''
+
+
+def _query_hardware_identity(wmic_args, wmic_header, cim_query, dmi_file, dmidecode_key,
+                             timeout=5, fallbacks=True, accept=None):
+    """Look up one hardware identity string (manufacturer, model, serial).
+
+    Windows: WMIC, then PowerShell/CIM if fallbacks is set.
+    Linux: the DMI file in sysfs, then dmidecode (needs root) if fallbacks is set.
+    accept(value) decides whether a value is real; defaults to non-empty.
+    """
+    accept = accept or (lambda value: bool(value))
     try:
         if sys.platform == 'win32':
             # Try WMIC first
             try:
                 result = subprocess.run(
-                    ["wmic", "computersystem", "get", "model"],
+                    ["wmic"] + wmic_args,
                     capture_output=True,
                     text=True,
                     check=False,
-                    timeout=5
+                    timeout=timeout
                 )
                 output = (result.stdout or "").strip().splitlines()
-                values = [line.strip() for line in output if line and "Model" not in line]
-                if values and values[0]:
+                values = [line.strip() for line in output if line and wmic_header not in line]
+                if values and accept(values[0]):
                     return values[0]
             except:
                 pass
             
-            # PowerShell fallback
-            try:
-                ps_cmd = [
-                    "powershell",
-                    "-NoProfile",
-                    "-Command",
-                    "(Get-CimInstance Win32_ComputerSystem).Model"
-                ]
-                result = subprocess.run(ps_cmd, capture_output=True, text=True, check=False, timeout=5)
-                value = (result.stdout or "").strip()
-                if value:
-                    return value
-            except:
-                pass
+            # PowerShell fallback (works on newer Windows)
+            if fallbacks:
+                try:
+                    ps_cmd = [
+                        "powershell",
+                        "-NoProfile",
+                        "-Command",
+                        cim_query
+                    ]
+                    result = subprocess.run(ps_cmd, capture_output=True, text=True, check=False, timeout=timeout)
+                    value = (result.stdout or "").strip()
+                    if accept(value):
+                        return value
+                except:
+                    pass
         elif sys.platform.startswith('linux'):
-            # Try to get model from DMI (Linux)
-            try:
-                result = subprocess.run(
-                    ["cat", "/sys/class/dmi/id/product_name"],
-                    capture_output=True,
-                    text=True,
-                    check=False,
-                    timeout=2
-                )
-                value = (result.stdout or "").strip()
-                if value:
-                    return value
-            except:
-                pass
+            # DMI data is exposed in sysfs (readable without root for most fields)
+            value = _read_sysfs(f"/sys/class/dmi/id/{dmi_file}")
+            if accept(value):
+                return value
             # Alternative: dmidecode (requires root)
-            try:
-                result = subprocess.run(
-                    ["dmidecode", "-s", "system-product-name"],
-                    capture_output=True,
-                    text=True,
-                    check=False,
-                    timeout=2
-                )
-                value = (result.stdout or "").strip()
-                if value and value.lower() not in ['', 'not specified', 'unknown']:
-                    return value
-            except:
-                pass
+            if fallbacks:
+                try:
+                    result = subprocess.run(
+                        ["dmidecode", "-s", dmidecode_key],
+                        capture_output=True,
+                        text=True,
+                        check=False,
+                        timeout=timeout
+                    )
+                    value = (result.stdout or "").strip()
+                    if accept(value) and value.lower() not in ['not specified', 'unknown']:
+                        return value
+                except:
+                    pass
         
         return 'Unknown'
     except:
         return 'Unknown'
 
 
-def get_ip_address():
-    """Get primary IPv4 address (non-loopback)"""
-    try:
-        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
-            # This doesn't send data; it just selects the outbound interface
-            s.connect(("8.8.8.8", 80))
-            return s.getsockname()[0]
-    except:
-        try:
-            return socket.gethostbyname(socket.gethostname())
-        except:
-            return 'Unknown'
+def get_system_manufacturer(timeout=5, fallbacks=True):
+    """Get the system manufacturer"""
+    return _query_hardware_identity(
+        ["computersystem", "get", "manufacturer"], "Manufacturer",
+        "(Get-CimInstance Win32_ComputerSystem).Manufacturer",
+        "sys_vendor", "system-manufacturer",
+        timeout=timeout, fallbacks=fallbacks
+    )
 
 
-def get_serial_number():
-    """Get machine serial number"""
-    try:
-        if sys.platform == 'win32':
-            # Try WMIC first (may be deprecated but often available)
-            try:
-                result = subprocess.run(
-                    ["wmic", "bios", "get", "serialnumber"],
-                    capture_output=True,
-                    text=True,
-                    check=False,
-                    timeout=5
-                )
-                output = (result.stdout or "").strip().splitlines()
-                values = [line.strip() for line in output if line and "SerialNumber" not in line]
-                if values and values[0]:
-                    return values[0]
-            except:
-                pass
+def get_system_model(timeout=5, fallbacks=True):
+    """Get the system model"""
+    return _query_hardware_identity(
+        ["computersystem", "get", "model"], "Model",
+        "(Get-CimInstance Win32_ComputerSystem).Model",
+        "product_name", "system-product-name",
+        timeout=timeout, fallbacks=fallbacks
+    )
 
-            # PowerShell fallback (works on newer Windows)
-            try:
-                ps_cmd = [
-                    "powershell",
-                    "-NoProfile",
-                    "-Command",
-                    "(Get-CimInstance Win32_BIOS).SerialNumber"
-                ]
-                result = subprocess.run(ps_cmd, capture_output=True, text=True, check=False, timeout=5)
-                value = (result.stdout or "").strip()
-                if value:
-                    return value
-            except:
-                pass
-        elif sys.platform.startswith('linux'):
-            # Try to get serial from DMI (Linux)
-            try:
-                result = subprocess.run(
-                    ["cat", "/sys/class/dmi/id/product_serial"],
-                    capture_output=True,
-                    text=True,
-                    check=False,
-                    timeout=2
-                )
-                value = (result.stdout or "").strip()
-                if value and value.lower() not in ['', 'not specified', 'unknown', 'to be filled by o.e.m.']:
-                    return value
-            except:
-                pass
-            # Alternative: dmidecode (requires root)
-            try:
-                result = subprocess.run(
-                    ["dmidecode", "-s", "system-serial-number"],
-                    capture_output=True,
-                    text=True,
-                    check=False,
-                    timeout=2
-                )
-                value = (result.stdout or "").strip()
-                if value and value.lower() not in ['', 'not specified', 'unknown', 'to be filled by o.e.m.']:
-                    return value
-            except:
-                pass
-        
-        return 'Unknown'
+
+def get_ip_address(budget=DEFAULT_RESOLVE_BUDGET):
+    """Get primary IPv4 address (non-loopback), or 'Unknown' if not found within budget seconds"""
+    try:
+        return resolver.get('ip_address', budget) or 'Unknown'
     except:
         return 'Unknown'
 
 
+def get_serial_number(timeout=5, fallbacks=True):
+    """Get machine serial number"""
+    return _query_hardware_identity(
+        ["bios", "get", "serialnumber"], "SerialNumber",
+        "(Get-CimInstance Win32_BIOS).SerialNumber",
+        "product_serial", "system-serial-number",
+        timeout=timeout, fallbacks=fallbacks,
+        accept=lambda value: not is_placeholder_serial(value)
+    )
+
+
 def get_os_info():
     """Get OS/platform version details (works on Windows, Linux, macOS)"""
     try:
@@ -310,65 +347,200 @@ def get_os_info():
         return {'error': 'Could not retrieve OS version'}
 
 
-def get_storage_details():
-    """Get storage details for all drives/mounts"""
+def get_os_info_basic():
+    """OS details from os.uname()/sys.getwindowsversion() only.
+
+    platform.processor() and friends may spawn `uname -p` or `cmd /c ver`;
+    this variant never starts a subprocess.
+    """
+    try:
+        if sys.platform == 'win32':
+            version = sys.getwindowsversion()
+            release = str(version.major)
+            full_version = f"{version.major}.{version.minor}.{version.build}"
+            return {
+                'system': 'Windows',
+                'release': release,
+                'version': full_version,
+                'platform': f"Windows-{release}-{full_version}",
+                'processor': os.environ.get('PROCESSOR_IDENTIFIER') or os.environ.get('PROCESSOR_ARCHITECTURE', 'Unknown')
+            }
+        uname = os.uname()
+        return {
+            'system': uname.sysname,
+            'release': uname.release,
+            'version': uname.version,
+            'platform': f"{uname.sysname}-{uname.release}-{uname.machine}",
+            'processor': uname.machine
+        }
+    except:
+        return {'error': 'Could not retrieve OS version'}
+
+
+def storage_entry(drive, total, used, free, device=None, fstype=None):
+    """One storage_details entry from byte counts (None for zero-sized pseudo mounts)"""
+    if not total:
+        return None
+    entry = {'drive': drive}
+    if device is not None:
+        entry['device'] = device
+        entry['fstype'] = fstype
+    entry.update({
+        'total_gb': round(total / (1024**3), 2),
+        'used_gb': round(used / (1024**3), 2),
+        'free_gb': round(free / (1024**3), 2),
+        'used_percent': round((used / total) * 100, 2),
+        # Exact counts for the binary wire format; dropped from JSON bodies and stored rows
+        'total_bytes': total,
+        'used_bytes': used,
+        'free_bytes': free
+    })
+    return entry
+
+
+# Filesystem types left out of storage_details by default: kernel pseudo filesystems,
+# tmpfs, container layers, snap/AppImage squashfs loops and network shares (shared
+# storage rather than this machine's disks, and the usual source of hung statvfs calls)
+EXCLUDED_FSTYPES = frozenset([
+    'autofs', 'binfmt_misc', 'bpf', 'cgroup', 'cgroup2', 'configfs', 'debugfs', 'devpts', 'devtmpfs',
+    'efivarfs', 'fusectl', 'hugetlbfs', 'mqueue', 'nsfs', 'proc', 'pstore', 'ramfs', 'rpc_pipefs',
+    'securityfs', 'sysfs', 'tracefs', 'tmpfs', 'overlay', 'aufs', 'squashfs',
+    'nfs', 'nfs4', 'cifs', 'smb3', 'smbfs', 'afs', 'ceph', 'glusterfs', 'fuse.sshfs', '9p',
+    'devfs', 'nullfs',
+])
+
+DEFAULT_STORAGE_TIMEOUT = 5
+
+# Mounts whose previous usage query never returned, with the thread still blocked on it
+_stuck_mounts = {}
+_stuck_lock = threading.Lock()
+
+
+def _query_usage(paths, usage_func, timeout):
+    """Run usage_func on every path concurrently, each on its own daemon thread.
+
+    Returns {path: result}; the result is the exception for paths that failed and
+    None for paths that did not answer within timeout seconds. Daemon threads are
+    used so a mount stuck in the kernel cannot block interpreter exit, and a mount
+    still stuck from an earlier call is not queried again until it recovers.
+    """
+    results = {}
+    threads = {}
+
+    def worker(path):
+        try:
+            value = usage_func(path)
+        except OSError as e:
+            value = e
+        results[path] = value
+
+    for path in paths:
+        with _stuck_lock:
+            stuck = _stuck_mounts.get(path)
+            if stuck is not None:
+                if stuck.is_alive():
+                    results[path] = None
+                    continue
+                del _stuck_mounts[path]
+        thread = threading.Thread(target=worker, args=(path,), name=f'disk-usage:{path}', daemon=True)
+        thread.start()
+        threads[path] = thread
+
+    deadline = time.monotonic() + timeout
+    for path, thread in threads.items():
+        thread.join(max(0.0, deadline - time.monotonic()))
+        if thread.is_alive():
+            with _stuck_lock:
+                _stuck_mounts[path] = thread
+            results[path] = None
+    return {path: results.get(path) for path in paths}
+
+
+def _unavailable_entry(drive, timeout, device=None, fstype=None):
+    entry = {'drive': drive}
+    if device is not None:
+        entry['device'] = device
+        entry['fstype'] = fstype
+    entry['available'] = False
+    entry['error'] = f"Mount did not respond within {timeout}s"
+    return entry
+
+
+def _list_partitions(exclude_fstypes):
+    """(mountpoint, device, fstype) for mounts worth reporting, bind mounts collapsed"""
+    if PROCFS_AVAILABLE:
+        # With the filter off, list every mount; otherwise start from device-backed ones
+        partitions = procfs.disk_partitions(all=exclude_fstypes is None)
+        # major:minor is the filesystem's identity, shared by all of its bind mounts
+        keyed = [(p.dev_id, p) for p in partitions]
+    else:
+        partitions = psutil.disk_partitions(all=exclude_fstypes is None)
+        # No major:minor here; only block device paths identify a filesystem reliably
+        keyed = [(p.device if p.device.startswith('/dev/') else None, p) for p in partitions]
+    seen = set()
+    result = []
+    for key, partition in keyed:
+        if exclude_fstypes and partition.fstype in exclude_fstypes:
+            continue
+        # Bind mounts (and repeated mounts of one filesystem) share a device: keep the first
+        if key and key in seen:
+            continue
+        seen.add(key)
+        result.append((partition.mountpoint, partition.device, partition.fstype))
+    return result
+
+
+def get_storage_details(timeout=DEFAULT_STORAGE_TIMEOUT, exclude_fstypes=EXCLUDED_FSTYPES):
+    """Get storage details for all drives/mounts.
+
+    Args:
+        timeout: Seconds to wait for each mount's usage; slower mounts are reported
+                 with 'available': False instead of stalling the collection
+        exclude_fstypes: Filesystem types to skip (Linux/macOS); None reports every mount
+    """
     storage_info = []
     try:
         if sys.platform == 'win32':
-            # Get all drives on Windows
-            drives = []
-            for letter in 'ABCDEFGHIJKLMNOPQRSTUVWXYZ':
-                drive = f"{letter}:\\"
-                if os.path.exists(drive):
-                    drives.append(drive)
-            
+            # Get all drives on Windows (a disconnected network drive can hang, so probe under the timeout)
+            drives = [f"{letter}:\\" for letter in 'ABCDEFGHIJKLMNOPQRSTUVWXYZ']
+            usages = _query_usage(drives, shutil.disk_usage, timeout)
             for drive in drives:
-                try:
-                    total, used, free = shutil.disk_usage(drive)
-                    storage_info.append({
-                        'drive': drive,
-                        'total_gb': round(total / (1024**3), 2),
-                        'used_gb': round(used / (1024**3), 2),
-                        'free_gb': round(free / (1024**3), 2),
-                        'used_percent': round((used / total) * 100, 2)
-                    })
-                except:
-                    continue
+                usage = usages[drive]
+                if usage is None:
+                    storage_info.append(_unavailable_entry(drive, timeout))
+                elif not isinstance(usage, Exception):
+                    entry = storage_entry(drive, *usage)
+                    if entry:
+                        storage_info.append(entry)
         elif sys.platform.startswith('linux') or sys.platform == 'darwin':
             # Get mount points on Linux/Unix
             try:
-                if PSUTIL_AVAILABLE:
-                    partitions = psutil.disk_partitions()
-                    for partition in partitions:
-                        try:
-                            usage = psutil.disk_usage(partition.mountpoint)
-                            storage_info.append({
-                                'drive': partition.mountpoint,
-                                'device': partition.device,
-                                'fstype': partition.fstype,
-                                'total_gb': round(usage.total / (1024**3), 2),
-                                'used_gb': round(usage.used / (1024**3), 2),
-                                'free_gb': round(usage.free / (1024**3), 2),
-                                'used_percent': round((usage.used / usage.total) * 100, 2)
-                            })
-                        except PermissionError:
-                            continue
+                if PROCFS_AVAILABLE or PSUTIL_AVAILABLE:
+                    # procfs: one mountinfo read plus a statvfs per mount; same numbers as psutil
+                    usage_func = procfs.disk_usage if PROCFS_AVAILABLE else psutil.disk_usage
+                    partitions = _list_partitions(exclude_fstypes)
+                    usages = _query_usage([p[0] for p in partitions], usage_func, timeout)
+                    for mountpoint, device, fstype in partitions:
+                        usage = usages[mountpoint]
+                        if usage is None:
+                            storage_info.append(_unavailable_entry(mountpoint, timeout, device, fstype))
+                        elif not isinstance(usage, Exception):
+                            entry = storage_entry(mountpoint, usage.total, usage.used, usage.free,
+                                                   device, fstype)
+                            if entry:
+                                storage_info.append(entry)
                 else:
                     # Fallback: try common mount points
                     common_mounts = ['/', '/home', '/var', '/tmp']
+                    usages = _query_usage(common_mounts, shutil.disk_usage, timeout)
                     for mount in common_mounts:
-                        if os.path.exists(mount):
-                            try:
-                                total, used, free = shutil.disk_usage(mount)
-                                storage_info.append({
-                                    'drive': mount,
-                                    'total_gb': round(total / (1024**3), 2),
-                                    'used_gb': round(used / (1024**3), 2),
-                                    'free_gb': round(free / (1024**3), 2),
-                                    'used_percent': round((used / total) * 100, 2)
-                                })
-                            except:
-                                continue
+                        usage = usages[mount]
+                        if usage is None:
+                            storage_info.append(_unavailable_entry(mount, timeout))
+                        elif not isinstance(usage, Exception):
+                            entry = storage_entry(mount, *usage)
+                            if entry:
+                                storage_info.append(entry)
             except Exception as e:
                 storage_info.append({'error': str(e)})
     except Exception as e:
@@ -377,25 +549,124 @@ def get_storage_details():
     return storage_info
 
 
+def ram_entry(total, available, used, free, percent):
+    """RAM details from byte counts (see storage_entry for the *_bytes fields)"""
+    return {
+        'total_gb': round(total / (1024**3), 2),
+        'available_gb': round(available / (1024**3), 2),
+        'used_gb': round(used / (1024**3), 2),
+        'free_gb': round(free / (1024**3), 2),
+        'used_percent': round(percent, 2),
+        'total_bytes': total,
+        'available_bytes': available,
+        'used_bytes': used,
+        'free_bytes': free
+    }
+
+
 def get_ram_details():
     """Get RAM details"""
+    if PROCFS_AVAILABLE:
+        try:
+            ram = procfs.virtual_memory()
+            return ram_entry(ram.total, ram.available, ram.used, ram.free, ram.percent)
+        except (OSError, KeyError, ValueError) as e:
+            if not PSUTIL_AVAILABLE:
+                return {'error': str(e)}
     if PSUTIL_AVAILABLE:
         try:
             ram = psutil.virtual_memory()
-            return {
-                'total_gb': round(ram.total / (1024**3), 2),
-                'available_gb': round(ram.available / (1024**3), 2),
-                'used_gb': round(ram.used / (1024**3), 2),
-                'free_gb': round(ram.free / (1024**3), 2),
-                'used_percent': round(ram.percent, 2)
-            }
+            return ram_entry(ram.total, ram.available, ram.used, ram.free, ram.percent)
         except Exception as e:
             return {'error': str(e)}
     else:
         return {'error': 'psutil not available. Install with: pip install psutil'}
 
 
-def collect_system_details(employee_id: str, email: str, department: str, client_data: dict = None):
+# Named collection profiles. Each lists the probes it runs and their options:
+#   timeouts      per-probe timeout in seconds (subprocesses; per-mount usage for storage;
+#                 DNS budget for hostname/ip_address)
+#   fallbacks     try secondary sources (PowerShell, dmidecode) when the first one fails
+#   resolve_fqdn  reverse-resolve the hostname (can block on bad DNS)
+#   detailed_os   use platform.* (may spawn `uname -p`) instead of os.uname()
+COLLECTION_PROFILES = {
+    # Periodic check-in: RAM and storage plus cheap identity; never spawns a subprocess
+    'quick': {
+        'probes': ('username', 'hostname', 'os_info', 'storage', 'ram'),
+        'timeouts': {'storage': 2},
+        'fallbacks': False,
+        'resolve_fqdn': False,
+        'detailed_os': False,
+    },
+    # Hardware identity from the primary source only, with short timeouts
+    'standard': {
+        'probes': ('username', 'hostname', 'system_manufacturer', 'system_model', 'ip_address',
+                   'serial_number', 'os_info', 'storage', 'ram'),
+        'timeouts': {'system_manufacturer': 3, 'system_model': 3, 'serial_number': 3, 'storage': 3,
+                     'ip_address': 1},
+        'fallbacks': False,
+        'resolve_fqdn': False,
+        'detailed_os': True,
+    },
+    # Everything, with every fallback (the original behaviour)
+    'full': {
+        'probes': ('username', 'hostname', 'system_manufacturer', 'system_model', 'ip_address',
+                   'serial_number', 'os_info', 'storage', 'ram'),
+        'timeouts': {'system_manufacturer': 5, 'system_model': 5, 'serial_number': 5, 'storage': 5,
+                     'hostname': 2, 'ip_address': 2},
+        'fallbacks': True,
+        'resolve_fqdn': True,
+        'detailed_os': True,
+    },
+}
+
+DEFAULT_PROFILE = 'full'
+
+# Every identity/usage field a collection can carry
+PROBE_FIELDS = COLLECTION_PROFILES['full']['probes']
+
+
+def get_profile(name):
+    """Profile settings by name; raises ValueError for unknown names"""
+    profile = COLLECTION_PROFILES.get((name or DEFAULT_PROFILE).lower())
+    if profile is None:
+        raise ValueError(f"Unknown collection profile '{name}'. Choose from: {', '.join(COLLECTION_PROFILES)}")
+    return profile
+
+
+def run_probe(field, profile):
+    """Run one probe with the profile's options"""
+    timeout = profile['timeouts'].get(field, 5)
+    if field == 'username':
+        return get_username()
+    if field == 'hostname':
+        return get_hostname(resolve_fqdn=profile['resolve_fqdn'], budget=profile['timeouts'].get(field, 1))
+    if field == 'system_manufacturer':
+        return get_system_manufacturer(timeout=timeout, fallbacks=profile['fallbacks'])
+    if field == 'system_model':
+        return get_system_model(timeout=timeout, fallbacks=profile['fallbacks'])
+    if field == 'ip_address':
+        return get_ip_address(budget=profile['timeouts'].get(field, 1))
+    if field == 'serial_number':
+        return get_serial_number(timeout=timeout, fallbacks=profile['fallbacks'])
+    if field == 'os_info':
+        return get_os_info() if profile['detailed_os'] else get_os_info_basic()
+    if field == 'storage':
+        return get_storage_details(timeout=timeout)
+    if field == 'ram':
+        return get_ram_details()
+    raise ValueError(f"Unknown probe '{field}'")
+
+
+def with_timeouts(settings, timeouts):
+    """Copy of profile settings with some per-probe timeouts overridden"""
+    if not timeouts:
+        return settings
+    return dict(settings, timeouts=dict(settings['timeouts'], **timeouts))
+
+
+def collect_system_details(employee_id: str, email: str, department: str, client_data: dict = None,
+                           profile: str = DEFAULT_PROFILE, timeouts: dict = None):
     """Collect all system details and include user-provided metadata.
     
     Args:
@@ -404,7 +675,10 @@ def collect_system_details(employee_id: str, email: str, department: str, client
         department: Department name
         client_data: Optional dict with client-collected system details to use instead of server-side collection.
                     Should include: username, hostname, system_manufacturer, system_model, ip_address,
-                    serial_number, os_info (or windows), storage, ram, collected_at
+                    serial_number, os_info (or windows), storage, ram, collected_at, collection_profile
+        profile: Collection profile for server-side collection ('quick', 'standard' or 'full').
+                 Fields outside the profile are reported as None.
+        timeouts: Optional per-probe timeout overrides in seconds (e.g. from the collector policy)
     
     Note:
         In serverless environments (Vercel, AWS Lambda, etc.), server-side collection will return
@@ -412,17 +686,28 @@ def collect_system_details(employee_id: str, email: str, department: str, client
     """
     # If client data is provided, use it (for client-side collection)
     if client_data:
+        # Older clients don't send a profile; they always ran the full collection
+        profile_name = client_data.get('collection_profile') or DEFAULT_PROFILE
+        probes = COLLECTION_PROFILES.get(profile_name, COLLECTION_PROFILES[DEFAULT_PROFILE])['probes']
+        
+        def client_value(field, default='Unknown'):
+            # Fields the client's profile did not probe are not authoritative
+            if field not in probes:
+                return None
+            return client_data.get(field, default)
+        
         details = {
             'employee_id': employee_id,
             'email': email,
             'department': department,
             'collected_at': client_data.get('collected_at', datetime.datetime.now().isoformat()),
-            'username': client_data.get('username', 'Unknown'),
-            'hostname': client_data.get('hostname', 'Unknown'),
-            'system_manufacturer': client_data.get('system_manufacturer', 'Unknown'),
-            'system_model': client_data.get('system_model', 'Unknown'),
-            'ip_address': client_data.get('ip_address', 'Unknown'),
-            'serial_number': client_data.get('serial_number', 'Unknown'),
+            'collection_profile': profile_name,
+            'username': client_value('username'),
+            'hostname': client_value('hostname'),
+            'system_manufacturer': client_value('system_manufacturer'),
+            'system_model': client_value('system_model'),
+            'ip_address': client_value('ip_address'),
+            'serial_number': client_value('serial_number'),
             'os_info': client_data.get('os_info') or client_data.get('windows', {}),
             'storage': client_data.get('storage', []),
             'ram': client_data.get('ram', {}),
@@ -430,6 +715,9 @@ def collect_system_details(employee_id: str, email: str, department: str, client
         # Ensure os_info is properly formatted
         if 'os_info' not in details or not details['os_info']:
             details['os_info'] = client_data.get('windows', {})
+        # Resident agents (collector_agent.py) attach a min/max/avg summary of their samples
+        if client_data.get('usage_summary'):
+            details['usage_summary'] = client_data['usage_summary']
     else:
         # Server-side collection (fallback)
         # Warning: In serverless environments, this collects server info, not client info
@@ -442,21 +730,30 @@ def collect_system_details(employee_id: str, email: str, department: str, client
                 UserWarning
             )
         
+        settings = with_timeouts(get_profile(profile), timeouts)
         details = {
             'employee_id': employee_id,
             'email': email,
             'department': department,
             'collected_at': datetime.datetime.now().isoformat(),
-            'username': get_username(),
-            'hostname': get_hostname(),
-            'system_manufacturer': get_system_manufacturer(),
-            'system_model': get_system_model(),
-            'ip_address': get_ip_address(),
-            'serial_number': get_serial_number(),
-            'os_info': get_os_info(),
-            'storage': get_storage_details(),
-            'ram': get_ram_details(),
+            'collection_profile': (profile or DEFAULT_PROFILE).lower(),
         }
+        # Start the DNS-dependent lookups first so they overlap with the other probes
+        lookups = []
+        if 'hostname' in settings['probes'] and settings['resolve_fqdn']:
+            lookups.append('fqdn')
+        if 'ip_address' in settings['probes']:
+            lookups.append('ip_address')
+        if lookups:
+            resolver.start(*lookups)
+        for field in PROBE_FIELDS:
+            details[field] = None
+        # ...and wait for them last, once the other probes have run
+        network_fields = ('hostname', 'ip_address')
+        ordered = [f for f in PROBE_FIELDS if f not in network_fields] + list(network_fields)
+        for field in ordered:
+            if field in settings['probes']:
+                details[field] = run_probe(field, settings)
     
     return details
 
@@ -472,6 +769,8 @@ def format_details_text(details: dict) -> str:
     lines.append(f"Employee ID: {details.get('employee_id', '')}")
     lines.append(f"Email: {details.get('email', '')}")
     lines.append(f"Department: {details.get('department', '')}")
+    if details.get('collection_profile'):
+        lines.append(f"Collection Profile: {details['collection_profile']}")
     lines.append("")
     lines.append(f"Username: {details.get('username', '')}")
     lines.append(f"Hostname: {details.get('hostname', '')}")
@@ -497,7 +796,12 @@ def format_details_text(details: dict) -> str:
     if storage:
         for d in storage:
             if 'error' in d:
-                lines.append(f"Error: {d['error']}")
+                if d.get('drive'):
+                    lines.append(f"Drive: {d['drive']}")
+                    lines.append(f"  Unavailable: {d['error']}")
+                    lines.append("")
+                else:
+                    lines.append(f"Error: {d['error']}")
             else:
                 lines.append(f"Drive: {d.get('drive', '')}")
                 lines.append(f"  Total: {d.get('total_gb', 'N/A')} GB")
@@ -517,6 +821,19 @@ def format_details_text(details: dict) -> str:
         lines.append(f"Free RAM: {ram.get('free_gb', 'N/A')} GB")
     else:
         lines.append(f"Error: {ram.get('error', '')}")
+    usage = details.get('usage_summary')
+    if usage:
+        lines.append("")
+        lines.append("-" * 60)
+        lines.append("USAGE SUMMARY")
+        lines.append("-" * 60)
+        lines.append(f"Window: {usage.get('window_start', '')} - {usage.get('window_end', '')}")
+        lines.append(f"Samples: {usage.get('samples', 0)}")
+        ram_usage = usage.get('ram_used_percent')
+        if ram_usage:
+            lines.append(f"RAM Used %: min {ram_usage.get('min')} / max {ram_usage.get('max')} / avg {ram_usage.get('avg')}")
+        for drive, stat in (usage.get('storage_used_percent') or {}).items():
+            lines.append(f"{drive} Used %: min {stat.get('min')} / max {stat.get('max')} / avg {stat.get('avg')}")
     lines.append("")
     lines.append("=" * 60)
     lines.append("End of System Details")
@@ -524,11 +841,91 @@ def format_details_text(details: dict) -> str:
     return "\n".join(lines)
 
 
-def save_details_to_file(details_text: str, employee_id: str) -> str:
-    """Save details as a .txt file and return the filename."""
+# "Label: value" lines of format_details_text() and the details keys they came from
+_TEXT_FIELDS = {
+    'Collected At': 'collected_at', 'Employee ID': 'employee_id', 'Email': 'email',
+    'Department': 'department', 'Collection Profile': 'collection_profile',
+    'Username': 'username', 'Hostname': 'hostname', 'System Manufacturer': 'system_manufacturer',
+    'System Model': 'system_model', 'IP Address': 'ip_address', 'Serial Number': 'serial_number',
+}
+_TEXT_OS_FIELDS = {'System': 'system', 'Release': 'release', 'Version': 'version',
+                   'Platform': 'platform', 'Processor': 'processor'}
+_GB_VALUE = re.compile(r'^(\S+) GB(?: \((\S+)%\))?$')
+
+
+def _text_value(value):
+    # format_details_text writes None as "None" and missing values as ""/"N/A"
+    return None if value in ('None', 'N/A') else value
+
+
+def _text_number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_details_text(text: str) -> dict:
+    """Rebuild a details dict from format_details_text() output (e.g. a system_details_*.txt backup).
+
+    Storage entries come back without device/fstype, which the text does not carry.
+    """
+    details = {'os_info': {}, 'storage': [], 'ram': {}}
+    section = None
+    drive = None
+    for raw_line in text.splitlines():
+        line = raw_line.strip()
+        if not line or set(line) <= set('=-'):
+            continue
+        if line in ('OS/PLATFORM INFORMATION', 'STORAGE DETAILS', 'RAM DETAILS', 'USAGE SUMMARY',
+                    'SYSTEM DETAILS', 'End of System Details'):
+            section = line
+            continue
+        label, sep, value = line.partition(': ')
+        if not sep:
+            label, value = line.rstrip(':'), ''
+        if section == 'SYSTEM DETAILS' and label in _TEXT_FIELDS:
+            details[_TEXT_FIELDS[label]] = _text_value(value)
+        elif section == 'OS/PLATFORM INFORMATION' and label in _TEXT_OS_FIELDS:
+            details['os_info'][_TEXT_OS_FIELDS[label]] = _text_value(value)
+        elif section == 'STORAGE DETAILS':
+            if label == 'Drive':
+                drive = {'drive': value}
+                details['storage'].append(drive)
+            elif label == 'Error':
+                details['storage'].append({'error': value})
+            elif drive is not None and label == 'Unavailable':
+                drive.update({'available': False, 'error': value})
+            elif drive is not None and label in ('Total', 'Used', 'Free'):
+                match = _GB_VALUE.match(value)
+                if match:
+                    drive[f'{label.lower()}_gb'] = _text_number(match.group(1))
+                    if label == 'Used':
+                        drive['used_percent'] = _text_number(match.group(2))
+        elif section == 'RAM DETAILS':
+            if label == 'Error':
+                details['ram'] = {'error': value}
+                continue
+            key = {'Total RAM': 'total_gb', 'Used RAM': 'used_gb',
+                   'Available RAM': 'available_gb', 'Free RAM': 'free_gb'}.get(label)
+            match = _GB_VALUE.match(value) if key else None
+            if match:
+                details['ram'][key] = _text_number(match.group(1))
+                if key == 'used_gb':
+                    details['ram']['used_percent'] = _text_number(match.group(2))
+    return details
+
+
+def details_backup_filename(employee_id: str) -> str:
+    """Backup file name for a submission made now"""
     safe_emp = (employee_id or 'unknown').strip().replace(' ', '_')
     timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
-    filename = f"system_details_{safe_emp}_{timestamp}.txt"
+    return f"system_details_{safe_emp}_{timestamp}.txt"
+
+
+def save_details_to_file(details_text: str, employee_id: str, filename: str = None) -> str:
+    """Save details as a .txt file and return the filename."""
+    filename = filename or details_backup_filename(employee_id)
     with open(filename, 'w', encoding='utf-8') as f:
         f.write(details_text)
     return filename
@@ -0,0 +1,43 @@
+"""
+Gunicorn Configuration
+Serves wsgi:app with one worker process per CPU so ingest can use every core:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+The app is imported once in the master (preload_app) and forked; each worker
+then opens its own storage connections and starts its own background threads
+in post_worker_init. Settings come from config.py / .env.
+"""
+
+import os
+import sys
+import multiprocessing
+
+# config.py lives next to this file, whatever directory gunicorn is started from
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Workers keep separate indexes; have them pick up each other's inserts unless configured otherwise
+os.environ.setdefault('INDEX_SYNC_SECONDS', '30')
+
+import config as app_config  # "config" itself is a gunicorn setting name
+
+bind = f"{app_config.FLASK_HOST}:{app_config.FLASK_PORT}"
+workers = app_config.SERVER_WORKERS or multiprocessing.cpu_count()
+# Requests mostly wait on the database, so a few threads per worker keep it busy
+worker_class = 'gthread'
+threads = app_config.SERVER_THREADS
+timeout = app_config.SERVER_TIMEOUT_SECONDS
+graceful_timeout = 30
+preload_app = True
+accesslog = '-'
+
+
+def post_worker_init(worker):
+    """Start this worker's resources (nothing connection- or thread-backed survives a fork)"""
+    worker.wsgi.extensions['system_details'].start()
+
+
+def worker_exit(server, worker):
+    resources = getattr(worker, 'wsgi', None) and worker.wsgi.extensions.get('system_details')
+    if resources:
+        resources.close()
@@ -0,0 +1,86 @@
+"""
+Idempotency Key Index
+Remembers the response of recent submissions by idempotency key so a
+client retry returns the original result instead of inserting a duplicate.
+Bounded (LRU) and TTL-evicted, per process.
+"""
+
+import time
+import threading
+from collections import OrderedDict
+
+
+class IdempotencyStore:
+    """Maps idempotency keys to stored (status, body, mimetype) responses"""
+
+    def __init__(self, max_entries=10000, ttl_seconds=86400):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        # Keys whose first request is still running -> Event set when it finishes
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def _evict(self, now):
+        while self._entries:
+            key, (expires_at, _) = next(iter(self._entries.items()))
+            if expires_at > now and len(self._entries) <= self.max_entries:
+                break
+            self._entries.popitem(last=False)
+
+    def get(self, key):
+        """Stored response for key, or None"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, response = entry
+            if expires_at <= now:
+                del self._entries[key]
+                return None
+            return response
+
+    def begin(self, key, wait_seconds=10.0):
+        """Claim a key before processing.
+
+        Returns (stored_response, claimed). stored_response is set if the key
+        was already completed; claimed is True if the caller must process the
+        request and then call complete() or abandon().
+        If another request holds the key, waits up to wait_seconds for it.
+        """
+        deadline = time.monotonic() + wait_seconds
+        while True:
+            stored = self.get(key)
+            if stored is not None:
+                return stored, False
+            with self._lock:
+                event = self._in_flight.get(key)
+                if event is None:
+                    self._in_flight[key] = threading.Event()
+                    return None, True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not event.wait(remaining):
+                return None, False
+
+    def complete(self, key, response):
+        """Store the response for a claimed key and release waiters"""
+        now = time.monotonic()
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (now + self.ttl_seconds, response)
+            self._evict(now)
+            event = self._in_flight.pop(key, None)
+        if event is not None:
+            event.set()
+
+    def abandon(self, key):
+        """Release a claimed key without storing anything (request failed)"""
+        with self._lock:
+            event = self._in_flight.pop(key, None)
+        if event is not None:
+            event.set()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
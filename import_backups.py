@@ -0,0 +1,301 @@
+"""
+Backup Importer
+Loads the backup files the API writes next to every submission back into the
+database, e.g. after an outage:
+
+    specs_<employee>_<YYYYmmdd_HHMMSS>.json           (/api/collect-specs)
+    system_details_<employee>_<YYYYmmdd_HHMMSS>.txt   (/api/system-details)
+
+Files are parsed in a process pool, normalized with the same helpers as the
+live endpoints, de-duplicated and bulk-inserted in chunks through the storage
+layer. A SQLite checkpoint records finished files and imported record digests,
+so an interrupted run picks up where it stopped. Snapshots the store already
+holds (same saved_file, or same employee and collected_at) are skipped too, so
+the importer can run over the backups of submissions that did reach the database.
+
+Usage:
+    python import_backups.py /path/to/backups
+    python import_backups.py /path/to/backups --workers 8 --chunk-size 1000 --dry-run
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+import datetime
+import multiprocessing
+
+import config
+from records import build_db_record, format_specs_text
+from storage import create_storage
+
+DEFAULT_CHECKPOINT_PATH = 'import_checkpoint.db'
+DEFAULT_CHUNK_SIZE = 500
+
+BACKUP_NAME = re.compile(r'^(specs|system_details)_.*_(\d{8}_\d{6})\.(json|txt)$')
+
+# Columns that describe how a row was produced rather than the snapshot itself
+_DIGEST_EXCLUDED = frozenset(['formatted_text', 'saved_file', 'created_at'])
+
+# First line of both text reports (format_details_text / format_specs_text)
+_COLLECTED_AT = re.compile(r'^Collected At: (.*)$', re.MULTILINE)
+
+
+def backup_kind(filename):
+    """'specs', 'system_details' or None for files that are not API backups"""
+    match = BACKUP_NAME.match(filename)
+    if not match:
+        return None
+    kind, _, extension = match.groups()
+    if (kind, extension) not in (('specs', 'json'), ('system_details', 'txt')):
+        return None
+    return kind
+
+
+def _created_at(filename, path):
+    """Backup time from the file name (server local time), as a UTC timestamp"""
+    match = BACKUP_NAME.match(filename)
+    try:
+        saved = datetime.datetime.strptime(match.group(2), '%Y%m%d_%H%M%S')
+    except (AttributeError, ValueError):
+        saved = datetime.datetime.fromtimestamp(os.path.getmtime(path))
+    return saved.astimezone(datetime.timezone.utc).isoformat()
+
+
+def record_digest(record, collected_at=None):
+    """Identity of a snapshot: every stored value except provenance, plus collected_at"""
+    content = {k: v for k, v in record.items() if k not in _DIGEST_EXCLUDED}
+    content['collected_at'] = collected_at
+    canonical = json.dumps(content, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def snapshot_key(row):
+    """(employee_id, collected_at) of a record or stored row, read from its text report; None if unknown"""
+    match = _COLLECTED_AT.search(row.get('formatted_text') or '')
+    collected_at = match.group(1).strip() if match else ''
+    if not row.get('employee_id') or collected_at in ('', 'N/A', 'None'):
+        return None
+    return row['employee_id'], collected_at
+
+
+def parse_backup_file(path):
+    """Parse one backup file. Returns (path, record, digest, error); runs in pool workers."""
+    filename = os.path.basename(path)
+    try:
+        kind = backup_kind(filename)
+        if kind == 'specs':
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            details = (data or {}).get('details') or {}
+            if not details:
+                return path, None, None, 'No details in file'
+            # Same normalization as receive_specs
+            details = dict(details,
+                           employee_id=(details.get('employee_id') or '').strip(),
+                           email=(details.get('email') or '').strip(),
+                           department=(details.get('department') or '').strip())
+            record = build_db_record(details, format_specs_text(details), None)
+        elif kind == 'system_details':
+            from get_system_details import parse_details_text
+            with open(path, 'r', encoding='utf-8') as f:
+                text = f.read()
+            details = parse_details_text(text)
+            # Same record process_system_details stores: the text itself plus the file name
+            record = build_db_record(details, text, filename)
+        else:
+            return path, None, None, 'Not a backup file'
+        if not (record.get('employee_id') and record.get('email') and record.get('department')):
+            return path, None, None, 'Missing employee_id/email/department'
+        record['created_at'] = _created_at(filename, path)
+        return path, record, record_digest(record, details.get('collected_at')), None
+    except Exception as e:
+        return path, None, None, f'{type(e).__name__}: {e}'
+
+
+class Checkpoint:
+    """Finished files and imported digests, kept in a small SQLite file"""
+
+    def __init__(self, path=DEFAULT_CHECKPOINT_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, status TEXT NOT NULL, detail TEXT)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS digests (digest TEXT PRIMARY KEY)")
+        self.conn.commit()
+
+    def finished_files(self):
+        return {row[0] for row in self.conn.execute("SELECT path FROM files")}
+
+    def known_digests(self, digests):
+        """The subset of digests already imported"""
+        known = set()
+        digests = list(digests)
+        for start in range(0, len(digests), 500):
+            chunk = digests[start:start + 500]
+            placeholders = ', '.join('?' * len(chunk))
+            known.update(row[0] for row in self.conn.execute(
+                f"SELECT digest FROM digests WHERE digest IN ({placeholders})", chunk))
+        return known
+
+    def commit(self, files, digests):
+        """Record a chunk as done: files is [(path, status, detail)]"""
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO files (path, status, detail) VALUES (?, ?, ?)", files)
+            self.conn.executemany("INSERT OR IGNORE INTO digests (digest) VALUES (?)", [(d,) for d in digests])
+
+    def close(self):
+        self.conn.close()
+
+
+class StoredSnapshots:
+    """saved_file names and snapshot keys the store already holds, loaded per employee on first use"""
+
+    def __init__(self, storage):
+        self.storage = storage
+        self._employees = {}
+
+    def _known(self, employee_id):
+        known = self._employees.get(employee_id)
+        if known is None:
+            files, keys = set(), set()
+            if self.storage is not None:
+                for row in self.storage.stream(filters={'employee_id': employee_id}):
+                    if row.get('saved_file'):
+                        files.add(row['saved_file'])
+                    key = snapshot_key(row)
+                    if key:
+                        keys.add(key)
+            known = self._employees[employee_id] = (files, keys)
+        return known
+
+    def contains(self, record):
+        """True if the store has a row for the same backup file or the same snapshot"""
+        files, keys = self._known(record['employee_id'])
+        if record.get('saved_file') in files:
+            return True
+        key = snapshot_key(record)
+        return key is not None and key in keys
+
+
+def find_backup_files(directory, recursive=True):
+    """Backup file paths under directory, sorted"""
+    found = []
+    for root, dirs, files in os.walk(directory):
+        found.extend(os.path.join(root, name) for name in files if backup_kind(name))
+        if not recursive:
+            break
+    found.sort()
+    return found
+
+
+class Importer:
+    """Feeds parsed files into storage in de-duplicated chunks"""
+
+    def __init__(self, storage, checkpoint, chunk_size=DEFAULT_CHUNK_SIZE, dry_run=False):
+        self.storage = storage
+        self.checkpoint = checkpoint
+        self.chunk_size = chunk_size
+        self.dry_run = dry_run
+        self.stored = StoredSnapshots(storage)
+        self.counts = {'imported': 0, 'duplicates': 0, 'already_stored': 0, 'errors': 0}
+        self._chunk = []
+
+    def add(self, result):
+        self._chunk.append(result)
+        if len(self._chunk) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        chunk, self._chunk = self._chunk, []
+        if not chunk:
+            return
+        known = self.checkpoint.known_digests(r[2] for r in chunk if r[2])
+        files, records, digests = [], [], []
+        for path, record, digest, error in chunk:
+            if error:
+                files.append((path, 'error', error))
+                self.counts['errors'] += 1
+            elif digest in known:
+                files.append((path, 'duplicate', None))
+                self.counts['duplicates'] += 1
+            elif self.stored.contains(record):
+                # Delivered before (live, spooled and re-drained, or by an earlier import)
+                known.add(digest)
+                files.append((path, 'stored', None))
+                digests.append(digest)
+                self.counts['already_stored'] += 1
+            else:
+                known.add(digest)
+                files.append((path, 'imported', None))
+                records.append(record)
+                digests.append(digest)
+        if records and not self.dry_run:
+            # A failure here leaves the chunk out of the checkpoint, so a rerun retries it
+            self.storage.bulk_insert(records)
+        self.counts['imported'] += len(records)
+        if not self.dry_run:
+            self.checkpoint.commit(files, digests)
+
+
+def run_import(directory, storage, checkpoint, workers=None, chunk_size=DEFAULT_CHUNK_SIZE,
+               recursive=True, dry_run=False):
+    """Import every unfinished backup file under directory; returns the counts"""
+    started = time.monotonic()
+    finished = checkpoint.finished_files()
+    paths = [p for p in find_backup_files(directory, recursive) if p not in finished]
+    print(f"{len(paths)} backup file(s) to import ({len(finished)} already done)")
+
+    importer = Importer(storage, checkpoint, chunk_size, dry_run)
+    if paths:
+        workers = workers or os.cpu_count() or 1
+        with multiprocessing.Pool(workers) as pool:
+            for done, result in enumerate(pool.imap_unordered(parse_backup_file, paths, chunksize=64), 1):
+                importer.add(result)
+                if done % 10000 == 0:
+                    print(f"  {done}/{len(paths)} files, {importer.counts['imported']} imported")
+        importer.flush()
+
+    counts = dict(importer.counts, seconds=round(time.monotonic() - started, 1))
+    print(f"Imported {counts['imported']}, skipped {counts['duplicates']} duplicate(s) and "
+          f"{counts['already_stored']} already stored, {counts['errors']} unreadable file(s) in {counts['seconds']}s")
+    return counts
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Import specs_*.json / system_details_*.txt backups into the database")
+    parser.add_argument('directory', nargs='?', default='.', help="Directory to scan (default: current)")
+    parser.add_argument('--workers', type=int, default=None, help="Parser processes (default: CPU count)")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="Records per bulk insert (default: %(default)s)")
+    parser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT_PATH,
+                        help="Checkpoint file (default: %(default)s)")
+    parser.add_argument('--no-recursive', action='store_true', help="Only scan the top directory")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="Parse and de-duplicate (against the checkpoint and the store) without writing")
+    args = parser.parse_args()
+
+    # Straight to the configured store: no spool, a failed chunk is retried on the next run.
+    # A dry run still reads it to count what is already stored.
+    storage = create_storage(config.STORAGE_BACKEND, config.SUPABASE_URL, config.SUPABASE_KEY,
+                             config.SQLITE_PATH, supabase_timeout=config.SUPABASE_TIMEOUT_SECONDS)
+    if storage is None:
+        print("❌ No storage backend available")
+        sys.exit(1)
+
+    checkpoint = Checkpoint(args.checkpoint)
+    try:
+        run_import(args.directory, storage, checkpoint, args.workers, args.chunk_size,
+                   recursive=not args.no_recursive, dry_run=args.dry_run)
+    except Exception as e:
+        print(f"❌ Import stopped: {e}")
+        print("Run the same command again to resume.")
+        sys.exit(1)
+    finally:
+        checkpoint.close()
+        if storage:
+            storage.close()
@@ -0,0 +1,51 @@
+"""
+In-Process Metrics
+Thread-safe counters and gauges keyed by name and labels, exposed as JSON
+through /api/admin/metrics.
+"""
+
+import threading
+
+
+class MetricsRegistry:
+    """Minimal counter/gauge registry (per process)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+
+    @staticmethod
+    def _key(name, labels):
+        return (name, tuple(sorted(labels.items())))
+
+    def inc(self, name, value=1, **labels):
+        """Increment a counter"""
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        """Set a gauge to an absolute value"""
+        key = self._key(name, labels)
+        with self._lock:
+            self._gauges[key] = value
+
+    def get(self, name, **labels):
+        """Current value of a counter or gauge (0 if never touched)"""
+        key = self._key(name, labels)
+        with self._lock:
+            return self._counters.get(key, self._gauges.get(key, 0))
+
+    def snapshot(self):
+        """JSON-friendly dump: {name: [{'labels': {...}, 'value': n}, ...]}"""
+        with self._lock:
+            items = list(self._counters.items()) + list(self._gauges.items())
+        result = {}
+        for (name, labels), value in sorted(items, key=lambda item: item[0]):
+            result.setdefault(name, []).append({'labels': dict(labels), 'value': value})
+        return result
+
+
+# Default registry shared by the API server modules
+metrics = MetricsRegistry()
@@ -0,0 +1,226 @@
+"""
+Offline Outbox for the Collectors
+Persists submissions that could not be delivered and replays them later,
+oldest first, in one batched request to /api/system-details/batch. When the
+server asks clients to back off (a long Retry-After), replays are held until then.
+"""
+
+import os
+import json
+import time
+import random
+import hashlib
+import datetime
+import threading
+
+import requests
+
+from api_client import RETRYABLE_STATUSES, parse_retry_after
+
+DEFAULT_OUTBOX_PATH = os.path.join(os.path.expanduser('~'), '.system_collector', 'outbox.jsonl')
+DEFAULT_MAX_ENTRIES = 200
+DEFAULT_BATCH_SIZE = 50
+
+BATCH_PATH = '/api/system-details/batch'
+# Most submissions BATCH_PATH accepts in one request; larger batches are rejected whole
+MAX_BATCH_SUBMISSIONS = 100
+
+
+def payload_hash(payload):
+    """Stable content hash of a submission payload (used for de-duplication)"""
+    canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def is_retryable_failure(response_or_error):
+    """True if a failed submission is worth keeping for a later replay.
+
+    Network errors, throttling and server errors are transient; other 4xx
+    responses mean the payload itself was rejected and would fail forever.
+    """
+    if isinstance(response_or_error, requests.exceptions.RequestException):
+        return True
+    status = getattr(response_or_error, 'status_code', None)
+    return status is not None and (status in RETRYABLE_STATUSES or status >= 500)
+
+
+class Outbox:
+    """Small on-disk FIFO of undelivered submissions (JSON lines, oldest first)"""
+
+    def __init__(self, path=None, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path or DEFAULT_OUTBOX_PATH
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # Serialises flushes so a background replay and a foreground one never double-send
+        self._flush_lock = threading.Lock()
+
+    def _read(self):
+        entries = []
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        # Skip a torn line from an interrupted write
+                        continue
+        except FileNotFoundError:
+            pass
+        return entries
+
+    def _write(self, entries):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for entry in entries:
+                f.write(json.dumps(entry, separators=(',', ':')) + '\n')
+        os.replace(tmp_path, self.path)
+
+    def add(self, payload):
+        """Queue a payload. Returns False if an identical payload is already queued."""
+        digest = payload_hash(payload)
+        with self._lock:
+            entries = self._read()
+            if any(entry.get('hash') == digest for entry in entries):
+                return False
+            entries.append({
+                'hash': digest,
+                'queued_at': datetime.datetime.now().isoformat(),
+                'payload': payload
+            })
+            # Size cap: drop the oldest entries first
+            if len(entries) > self.max_entries:
+                entries = entries[-self.max_entries:]
+            self._write(entries)
+        return True
+
+    def pending(self):
+        """Queued entries, oldest first"""
+        with self._lock:
+            return self._read()
+
+    def __len__(self):
+        return len(self.pending())
+
+    def remove(self, hashes):
+        """Drop delivered entries by content hash"""
+        hashes = set(hashes)
+        if not hashes:
+            return
+        with self._lock:
+            entries = [entry for entry in self._read() if entry.get('hash') not in hashes]
+            if entries:
+                self._write(entries)
+            else:
+                try:
+                    os.remove(self.path)
+                except FileNotFoundError:
+                    pass
+
+    @property
+    def hold_path(self):
+        return f"{self.path}.hold"
+
+    def held_until(self):
+        """Epoch seconds before which replays should not be attempted (0 if none)"""
+        try:
+            with open(self.hold_path, 'r', encoding='utf-8') as f:
+                return float(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0.0
+
+    def defer(self, seconds, jitter=None):
+        """Hold replays for seconds plus a random share of jitter (default: a quarter of seconds)"""
+        jitter = seconds / 4 if jitter is None else jitter
+        until = time.time() + seconds + random.uniform(0, jitter)
+        try:
+            directory = os.path.dirname(self.hold_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.hold_path, 'w', encoding='utf-8') as f:
+                f.write(f"{until:.0f}")
+        except OSError as e:
+            print(f"Could not record outbox hold: {e}")
+        return until
+
+    def defer_for(self, response):
+        """Hold replays as long as a throttled (429/503) response asked; returns True if it did"""
+        if getattr(response, 'status_code', None) not in (429, 503):
+            return False
+        retry_after = parse_retry_after(response.headers.get('Retry-After'))
+        if not retry_after:
+            return False
+        self.defer(retry_after)
+        return True
+
+    def flush(self, client, batch_size=DEFAULT_BATCH_SIZE, force=False):
+        """Replay queued submissions through an ApiClient, oldest first.
+
+        Returns the number of entries removed from the outbox. Stops at the
+        first batch that fails with a transient error, so order is preserved.
+        Does nothing while a server-requested hold is in effect, unless force.
+        """
+        if not force and time.time() < self.held_until():
+            return 0
+        with self._flush_lock:
+            return self._flush(client, batch_size)
+
+    def _flush(self, client, batch_size):
+        removed = 0
+        while True:
+            batch = self.pending()[:min(batch_size, MAX_BATCH_SUBMISSIONS)]
+            if not batch:
+                return removed
+
+            done = self._send_batch(client, batch)
+            if done is None:
+                return removed
+            self.remove(done)
+            removed += len(done)
+            if len(done) < len(batch):
+                # Server could not take part of the batch right now; try again next run
+                return removed
+
+    def _send_batch(self, client, batch):
+        """Send one batch. Returns the hashes that no longer need replaying, or None."""
+        try:
+            response = client.post_payload(BATCH_PATH, {
+                'submissions': [entry['payload'] for entry in batch]
+            })
+        except requests.exceptions.RequestException as e:
+            print(f"Outbox flush failed: {e}")
+            return None
+
+        if response.status_code == 404:
+            # Older server without the batch route: replay one by one over the same connection
+            done = []
+            for entry, result in client.submit_many([entry['payload'] for entry in batch]):
+                if is_retryable_failure(result):
+                    break
+                done.append(entry['hash'])
+            return done
+
+        if response.status_code != 200:
+            print(f"Outbox flush rejected: {response.status_code}")
+            self.defer_for(response)
+            return None
+
+        results = response.json().get('results', [])
+        done = []
+        for entry, result in zip(batch, results):
+            status = result.get('status', 500)
+            if status in RETRYABLE_STATUSES or status >= 500:
+                break
+            done.append(entry['hash'])
+        return done
+
+    def flush_in_background(self, client, batch_size=DEFAULT_BATCH_SIZE):
+        """Start a daemon thread that flushes the outbox; returns the thread"""
+        thread = threading.Thread(target=self.flush, args=(client, batch_size), daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,162 @@
+"""
+Linux procfs Probes
+Reads RAM, mount and interface address information straight from /proc and
+os.statvfs, without psutil. Values are computed the same way psutil does on Linux, so
+get_system_details.py produces identical output with either backend.
+"""
+
+import os
+import sys
+from collections import namedtuple
+
+PROC_MEMINFO = '/proc/meminfo'
+PROC_MOUNTINFO = '/proc/self/mountinfo'
+PROC_FILESYSTEMS = '/proc/filesystems'
+PROC_FIB_TRIE = '/proc/net/fib_trie'
+PROC_IF_INET6 = '/proc/net/if_inet6'
+
+PROCFS_AVAILABLE = sys.platform.startswith('linux') and os.path.exists(PROC_MEMINFO)
+
+VirtualMemory = namedtuple('VirtualMemory', ['total', 'available', 'percent', 'used', 'free'])
+Partition = namedtuple('Partition', ['device', 'mountpoint', 'fstype', 'opts', 'dev_id'])
+DiskUsage = namedtuple('DiskUsage', ['total', 'used', 'free'])
+
+# mountinfo escapes these characters in paths as octal
+_ESCAPES = {'\\040': ' ', '\\011': '\t', '\\012': '\n', '\\134': '\\'}
+
+
+def _unescape(value):
+    if '\\' not in value:
+        return value
+    for escaped, char in _ESCAPES.items():
+        value = value.replace(escaped, char)
+    return value
+
+
+def read_meminfo(path=PROC_MEMINFO):
+    """Parse /proc/meminfo into {field name (bytes): value in bytes}"""
+    mems = {}
+    with open(path, 'rb') as f:
+        data = f.read()
+    for line in data.splitlines():
+        fields = line.split()
+        if len(fields) >= 2:
+            mems[fields[0][:-1]] = int(fields[1]) * 1024
+    return mems
+
+
+def _estimate_available(mems):
+    # Kernels before 3.14 have no MemAvailable. psutil estimates from /proc/zoneinfo
+    # watermarks there; free + cached is its own fallback and close enough for inventory.
+    return mems[b'MemFree'] + mems.get(b'Cached', 0)
+
+
+def virtual_memory():
+    """Total/available/used/free bytes and used percent, computed like psutil.virtual_memory()"""
+    mems = read_meminfo()
+    total = mems[b'MemTotal']
+    free = mems[b'MemFree']
+    avail = mems.get(b'MemAvailable') or _estimate_available(mems)
+    if avail < 0:
+        avail = 0
+    elif avail > total:
+        # Containers can report host-sized values; psutil and procps use MemFree then
+        avail = free
+    used = total - avail
+    percent = round((total - avail) / total * 100, 1) if total else 0.0
+    return VirtualMemory(total, avail, percent, used, free)
+
+
+def physical_fstypes(path=PROC_FILESYSTEMS):
+    """Filesystem types backed by a device (the non-"nodev" entries, plus zfs)"""
+    fstypes = set()
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if not line.startswith('nodev'):
+                fstypes.add(line)
+            elif line.split('\t')[-1] == 'zfs':
+                fstypes.add('zfs')
+    return fstypes
+
+
+def _block_device_name(dev_id):
+    """Resolve a major:minor pair to /dev/<name> via sysfs (used for /dev/root)"""
+    try:
+        with open(f'/sys/dev/block/{dev_id}/uevent', 'r') as f:
+            for line in f:
+                if line.startswith('DEVNAME='):
+                    return '/dev/' + line.strip().split('=', 1)[1]
+    except OSError:
+        pass
+    return None
+
+
+def read_mountinfo(path=PROC_MOUNTINFO):
+    """Every mount in /proc/self/mountinfo, in mount order"""
+    partitions = []
+    with open(path, 'r') as f:
+        for line in f:
+            # <id> <parent> <major:minor> <root> <mountpoint> <opts> [optional...] - <fstype> <source> <super opts>
+            left, sep, right = line.rstrip('\n').partition(' - ')
+            if not sep:
+                continue
+            fields = left.split(' ')
+            tail = right.split(' ')
+            if len(fields) < 6 or len(tail) < 2:
+                continue
+            device = _unescape(tail[1])
+            if device == 'none':
+                device = ''
+            partitions.append(Partition(device, _unescape(fields[4]), tail[0], fields[5], fields[2]))
+    return partitions
+
+
+def disk_partitions(all=False):
+    """Mounted partitions, filtered the way psutil.disk_partitions() filters them"""
+    fstypes = None if all else physical_fstypes()
+    result = []
+    for part in read_mountinfo():
+        device = part.device
+        if device in ('/dev/root', 'rootfs'):
+            device = _block_device_name(part.dev_id) or device
+            part = part._replace(device=device)
+        if fstypes is not None and (not device or part.fstype not in fstypes):
+            continue
+        result.append(part)
+    return result
+
+
+def disk_usage(path):
+    """Total/used/free bytes for the filesystem at path, computed like psutil.disk_usage()"""
+    st = os.statvfs(path)
+    total = st.f_blocks * st.f_frsize
+    used = total - st.f_bfree * st.f_frsize
+    free = st.f_bavail * st.f_frsize
+    return DiskUsage(total, used, free)
+
+
+def local_addresses():
+    """Sorted IPv4/IPv6 addresses assigned to this host's interfaces"""
+    addresses = set()
+    try:
+        with open(PROC_FIB_TRIE, 'r') as f:
+            previous = ''
+            for line in f:
+                # "|-- <addr>" is followed by "/32 host LOCAL" for addresses owned by this host
+                if line.strip() == '/32 host LOCAL' and previous.startswith('|-- '):
+                    addresses.add(previous[4:])
+                previous = line.strip()
+    except OSError:
+        pass
+    try:
+        with open(PROC_IF_INET6, 'r') as f:
+            for line in f:
+                fields = line.split()
+                if fields:
+                    addresses.add(fields[0])
+    except OSError:
+        pass
+    return sorted(addresses)
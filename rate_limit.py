@@ -0,0 +1,276 @@
+"""
+Admission Control for Ingest Routes
+Token-bucket rate limiting per client key (employee_id, serial number,
+remote address) plus a global cap on in-flight database writes, and the
+load-derived schedule hints that spread collectors out when ingest is busy.
+
+Bucket state lives in memory by default; RedisLimiterBackend shares it
+between workers and hosts when RATE_LIMIT_REDIS_URL is configured.
+"""
+
+import math
+import time
+import random
+import threading
+from collections import OrderedDict, deque
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+
+class LimiterBackend:
+    """Storage for token buckets. Subclasses implement consume() and refund()."""
+
+    def consume(self, key, rate, capacity, cost=1):
+        """Take `cost` tokens from bucket `key`.
+
+        rate is tokens per second, capacity the burst size.
+        Returns (allowed, retry_after_seconds).
+        """
+        raise NotImplementedError
+
+    def refund(self, key, rate, capacity, cost=1):
+        """Give back `cost` tokens taken by consume() (never above capacity)"""
+        raise NotImplementedError
+
+
+class MemoryLimiterBackend(LimiterBackend):
+    """Per-process buckets in an LRU-bounded dict"""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key, rate, capacity, cost=1):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            if tokens >= cost:
+                allowed, retry_after = True, 0.0
+                tokens -= cost
+            else:
+                allowed, retry_after = False, (cost - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                # Idle buckets would be full again anyway, so forgetting them is safe
+                self._buckets.popitem(last=False)
+        return allowed, retry_after
+
+    def refund(self, key, rate, capacity, cost=1):
+        now = time.monotonic()
+        with self._lock:
+            if key not in self._buckets:
+                return
+            tokens, updated = self._buckets.pop(key)
+            tokens = min(capacity, tokens + (now - updated) * rate + cost)
+            self._buckets[key] = (tokens, now)
+
+
+class RedisLimiterBackend(LimiterBackend):
+    """Buckets shared through Redis (atomic via a Lua script)"""
+
+    SCRIPT = """
+local tokens = tonumber(redis.call('HGET', KEYS[1], 't'))
+local updated = tonumber(redis.call('HGET', KEYS[1], 'u'))
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local now = tonumber(ARGV[4])
+if tokens == nil then
+    tokens = capacity
+    updated = now
+end
+tokens = math.min(capacity, tokens + (now - updated) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+    allowed = 1
+    tokens = tokens - cost
+else
+    retry_after = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 't', tokens, 'u', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(retry_after)}
+"""
+
+    REFUND_SCRIPT = """
+local tokens = tonumber(redis.call('HGET', KEYS[1], 't'))
+if tokens == nil then
+    return 0
+end
+local updated = tonumber(redis.call('HGET', KEYS[1], 'u'))
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local now = tonumber(ARGV[4])
+tokens = math.min(capacity, tokens + (now - updated) * rate + tonumber(ARGV[3]))
+redis.call('HSET', KEYS[1], 't', tokens, 'u', now)
+return 1
+"""
+
+    def __init__(self, url, prefix='ratelimit:'):
+        if not REDIS_AVAILABLE:
+            raise RuntimeError("redis package not installed. Install with: pip install redis")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._script = self.client.register_script(self.SCRIPT)
+        self._refund_script = self.client.register_script(self.REFUND_SCRIPT)
+
+    def consume(self, key, rate, capacity, cost=1):
+        allowed, retry_after = self._script(
+            keys=[self.prefix + key],
+            args=[rate, capacity, cost, time.time()]
+        )
+        return bool(allowed), float(retry_after)
+
+    def refund(self, key, rate, capacity, cost=1):
+        self._refund_script(keys=[self.prefix + key], args=[rate, capacity, cost, time.time()])
+
+
+class RateLimiter:
+    """Checks a request against one bucket per client key.
+
+    limits maps a key kind (e.g. 'employee_id', 'ip') to (per_minute, burst).
+    """
+
+    def __init__(self, backend, limits):
+        self.backend = backend
+        self.limits = limits
+
+    def check(self, keys):
+        """keys maps key kind -> value. Returns (allowed, retry_after, rejected_kind).
+
+        A request takes one token from every bucket or from none: when a later
+        bucket rejects it, the tokens already taken from earlier ones are refunded.
+        """
+        consumed = []
+        for kind, value in keys.items():
+            if not value or kind not in self.limits:
+                continue
+            per_minute, burst = self.limits[kind]
+            bucket = (f"{kind}:{value}", per_minute / 60.0, burst)
+            allowed, retry_after = self.backend.consume(*bucket)
+            if not allowed:
+                for taken in consumed:
+                    self.backend.refund(*taken)
+                return False, retry_after, kind
+            consumed.append(bucket)
+        return True, 0.0, None
+
+
+class ConcurrencyLimiter:
+    """Caps the number of requests doing database writes at the same time"""
+
+    def __init__(self, max_in_flight, acquire_timeout=2.0):
+        self.max_in_flight = max_in_flight
+        self.acquire_timeout = acquire_timeout
+        self._semaphore = threading.BoundedSemaphore(max_in_flight)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+
+    def acquire(self):
+        """Wait up to acquire_timeout for a slot. Returns False if none freed up."""
+        if not self._semaphore.acquire(timeout=self.acquire_timeout):
+            return False
+        with self._lock:
+            self.in_flight += 1
+        return True
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+        self._semaphore.release()
+
+
+class IngestLoad:
+    """Recent ingest rate turned into submission schedule hints for collectors.
+
+    Admitted and rejected requests are counted in BUCKET_SECONDS buckets over
+    the last WINDOW_SECONDS. Load is the admitted rate relative to
+    target_per_minute, or the share of write slots in use, whichever is higher.
+    Collectors are told to come back later (and over a wider random window) as
+    load grows, and rejected ones are spread over the time the current backlog
+    of rejections needs to drain at the target rate.
+    """
+
+    WINDOW_SECONDS = 60
+    BUCKET_SECONDS = 5
+    # At load 1 the recommended interval is this many times the normal one
+    MAX_STRETCH = 4.0
+
+    def __init__(self, target_per_minute, max_retry_after=900):
+        self.target_per_minute = max(1.0, target_per_minute)
+        self.max_retry_after = max_retry_after
+        self._lock = threading.Lock()
+        self._buckets = deque()   # [bucket start, admitted, rejected]
+
+    def _bucket(self, now):
+        start = now - now % self.BUCKET_SECONDS
+        if not self._buckets or self._buckets[-1][0] != start:
+            self._buckets.append([start, 0, 0])
+        while self._buckets and self._buckets[0][0] <= now - self.WINDOW_SECONDS:
+            self._buckets.popleft()
+        return self._buckets[-1]
+
+    def admitted(self):
+        with self._lock:
+            self._bucket(time.time())[1] += 1
+
+    def rejected(self):
+        with self._lock:
+            self._bucket(time.time())[2] += 1
+
+    def per_minute(self):
+        """(admitted, rejected) over the last minute"""
+        with self._lock:
+            self._bucket(time.time())
+            return sum(b[1] for b in self._buckets), sum(b[2] for b in self._buckets)
+
+    def load(self, in_flight=0, max_in_flight=0, degraded=False):
+        """0 when idle, 1 at the target rate (or every write slot busy); can exceed 1"""
+        admitted, _ = self.per_minute()
+        load = admitted / self.target_per_minute
+        if max_in_flight:
+            load = max(load, in_flight / max_in_flight)
+        if degraded:
+            # Writes are going to the spool; the store needs room to recover
+            load = max(load, 1.0)
+        return load
+
+    def schedule(self, interval, load):
+        """(next_submission_after, jitter) in seconds for a normal interval at this load.
+
+        Clients wait next_submission_after plus a random 0..jitter seconds.
+        """
+        stretch = 1.0 + (self.MAX_STRETCH - 1.0) * min(load, 1.0)
+        next_after = interval * stretch
+        jitter = next_after * (0.1 + 0.4 * min(load, 1.0))
+        return int(next_after), int(jitter)
+
+    def retry_after(self, base):
+        """Randomized Retry-After for a rejected request, spread wider the more are being rejected"""
+        _, rejected = self.per_minute()
+        spread = min(self.max_retry_after, 60.0 * rejected / self.target_per_minute)
+        return min(self.max_retry_after, base + random.uniform(0, spread))
+
+
+def retry_after_header(seconds):
+    """Retry-After header value (whole seconds, at least 1)"""
+    return str(max(1, int(math.ceil(seconds))))
+
+
+def create_limiter_backend(redis_url=None):
+    """Redis backend when configured, in-memory otherwise"""
+    if redis_url:
+        try:
+            backend = RedisLimiterBackend(redis_url)
+            print("Rate limiter: using Redis backend")
+            return backend
+        except Exception as e:
+            print(f"Warning: Could not initialize Redis rate limiter, using memory: {e}")
+    return MemoryLimiterBackend()
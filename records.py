@@ -0,0 +1,159 @@
+"""
+System Details Records
+Normalizes collected details into the flat `system_details` row shape shared
+by the ingest endpoints and every storage backend.
+"""
+
+import json
+
+TABLE_NAME = 'system_details'
+# Spooled rows the primary database rejected for good (kept in the spool file for inspection)
+DEAD_LETTER_TABLE_NAME = 'system_details_dead_letter'
+
+# Columns written by the ingest endpoints (id and created_at are assigned by the store)
+RECORD_COLUMNS = [
+    'employee_id', 'email', 'department',
+    'username', 'hostname', 'system_manufacturer', 'system_model', 'ip_address', 'serial_number',
+    'windows_system', 'windows_release', 'windows_version', 'windows_platform', 'windows_processor',
+    'ram_total_gb', 'ram_used_gb', 'ram_available_gb', 'ram_free_gb', 'ram_used_percent',
+    'storage_details', 'formatted_text', 'saved_file',
+    # JSON: the resident agent's min/max/avg window (collector_agent.py). Only sent with agent reports,
+    # so a Supabase table without the column still takes one-off snapshots
+    'usage_summary',
+]
+
+NUMERIC_COLUMNS = frozenset([
+    'ram_total_gb', 'ram_used_gb', 'ram_available_gb', 'ram_free_gb', 'ram_used_percent',
+])
+
+# Daily summaries written by compaction.py: one row per device per UTC day, keyed by (day, device_key)
+DAILY_TABLE_NAME = 'system_details_daily'
+DAILY_IDENTITY_COLUMNS = [
+    'employee_id', 'email', 'department',
+    'username', 'hostname', 'system_manufacturer', 'system_model', 'ip_address', 'serial_number',
+    'windows_system', 'windows_release', 'windows_version',
+]
+DAILY_COLUMNS = ['day', 'device_key'] + DAILY_IDENTITY_COLUMNS + [
+    'samples', 'first_seen', 'last_seen', 'ram_total_gb',
+    'ram_used_gb_min', 'ram_used_gb_avg', 'ram_used_gb_max',
+    'ram_used_percent_min', 'ram_used_percent_avg', 'ram_used_percent_max',
+    # JSON: [{drive, total_gb, used_gb_min/avg/max, used_percent_min/avg/max, samples}]
+    'storage_summary',
+    # JSON list of the system_details ids folded in, so a resumed run never counts a row twice
+    'source_ids',
+    'archive_file',
+]
+DAILY_NUMERIC_COLUMNS = frozenset([
+    'samples', 'ram_total_gb',
+    'ram_used_gb_min', 'ram_used_gb_avg', 'ram_used_gb_max',
+    'ram_used_percent_min', 'ram_used_percent_avg', 'ram_used_percent_max',
+])
+
+
+# Exact byte counts the probes attach to storage/RAM entries for the binary wire format.
+# Rows and JSON bodies keep the rounded *_gb values only.
+BYTE_COUNT_FIELDS = frozenset(['total_bytes', 'available_bytes', 'used_bytes', 'free_bytes'])
+
+
+def without_byte_counts(entry):
+    """Copy of a storage/RAM entry without the *_bytes fields"""
+    if not isinstance(entry, dict):
+        return entry
+    return {k: v for k, v in entry.items() if k not in BYTE_COUNT_FIELDS}
+
+
+def safe_numeric(value):
+    """Convert value to numeric, or None if not numeric"""
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        # "Not available", "Unknown", "N/A" etc. are not numbers
+        try:
+            return float(value)
+        except (ValueError, TypeError):
+            return None
+    return None
+
+
+def build_db_record(details: dict, formatted_text: str = None, saved_file: str = None) -> dict:
+    """Flatten a details dict (collect_system_details shape) into a system_details row"""
+    # Support both os_info and windows for backward compatibility
+    os_info = details.get('os_info') or details.get('windows') or {}
+    ram_info = details.get('ram') or {}
+    ram_ok = 'error' not in ram_info
+    storage_info = details.get('storage') or []
+
+    record = {
+        'employee_id': details.get('employee_id'),
+        'email': details.get('email'),
+        'department': details.get('department'),
+        'username': details.get('username'),
+        'hostname': details.get('hostname'),
+        'system_manufacturer': details.get('system_manufacturer'),
+        'system_model': details.get('system_model'),
+        'ip_address': details.get('ip_address'),
+        'serial_number': details.get('serial_number'),
+        'windows_system': os_info.get('system'),
+        'windows_release': os_info.get('release'),
+        'windows_version': os_info.get('version'),
+        'windows_platform': os_info.get('platform'),
+        'windows_processor': os_info.get('processor'),
+        'ram_total_gb': safe_numeric(ram_info.get('total_gb')) if ram_ok else None,
+        'ram_used_gb': safe_numeric(ram_info.get('used_gb')) if ram_ok else None,
+        'ram_available_gb': safe_numeric(ram_info.get('available_gb')) if ram_ok else None,
+        'ram_free_gb': safe_numeric(ram_info.get('free_gb')) if ram_ok else None,
+        'ram_used_percent': safe_numeric(ram_info.get('used_percent')) if ram_ok else None,
+        'storage_details': json.dumps([without_byte_counts(entry) for entry in storage_info]),
+        'formatted_text': formatted_text,
+        'saved_file': saved_file,
+    }
+    if details.get('usage_summary'):
+        record['usage_summary'] = json.dumps(details['usage_summary'])
+    return record
+
+
+def format_specs_text(details: dict) -> str:
+    """Text report stored with /api/collect-specs submissions"""
+    os_info = details.get('os_info') or details.get('windows') or {}
+    ram_info = details.get('ram') or {}
+    storage_info = details.get('storage') or []
+    return f"""
+System Details Collection
+==========================
+Employee ID: {details.get('employee_id', '')}
+Email: {details.get('email', '')}
+Department: {details.get('department', '')}
+Collected At: {details.get('collected_at', 'N/A')}
+
+System Information:
+-------------------
+Username: {details.get('username', 'Unknown')}
+Hostname: {details.get('hostname', 'Unknown')}
+IP Address: {details.get('ip_address', 'Unknown')}
+System Manufacturer: {details.get('system_manufacturer', 'Unknown')}
+System Model: {details.get('system_model', 'Unknown')}
+Serial Number: {details.get('serial_number', 'Unknown')}
+
+OS Information:
+---------------
+System: {os_info.get('system', 'Unknown')}
+Release: {os_info.get('release', 'Unknown')}
+Version: {os_info.get('version', 'Unknown')}
+Platform: {os_info.get('platform', 'Unknown')}
+Processor: {os_info.get('processor', 'Unknown')}
+
+RAM Details:
+------------
+Total RAM: {ram_info.get('total_gb', 'N/A')} GB
+Used RAM: {ram_info.get('used_gb', 'N/A')} GB ({ram_info.get('used_percent', 'N/A')}%)
+Available RAM: {ram_info.get('available_gb', 'N/A')} GB
+Free RAM: {ram_info.get('free_gb', 'N/A')} GB
+
+Storage Details:
+----------------
+{json.dumps(storage_info, indent=2) if storage_info else 'No storage information'}
+"""
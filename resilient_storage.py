@@ -0,0 +1,290 @@
+"""
+Resilient Storage
+Wraps the primary database in a circuit breaker and an ordered fallback
+chain for writes:
+
+    primary DB  ->  local spool (SQLite)  ->  reject (StorageUnavailable)
+
+Only transient failures (connection errors, timeouts, 5xx, open circuit)
+fall back to the spool; a write the database rejects outright is raised
+to the caller as before.
+
+A background re-drain moves spooled rows back into the primary once the
+breaker lets calls through again. Spooled rows the primary rejects for good
+are moved to a dead-letter table in the spool file instead of blocking it.
+"""
+
+import time
+import sqlite3
+import itertools
+import threading
+
+from circuit_breaker import CircuitBreaker, CircuitOpenError, CLOSED
+from records import DEAD_LETTER_TABLE_NAME
+from storage import StorageBackend, StorageError, SQLiteStorage
+from metrics import metrics
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: no cross-process lock, which is fine for the single-process dev server
+    fcntl = None
+
+
+class StorageUnavailable(StorageError):
+    """Neither the primary database nor the spool could take the write"""
+
+
+# Postgres SQLSTATE classes worth retrying: connection exception, transaction rollback
+# (serialization/deadlock), insufficient resources, operator intervention (statement
+# timeout, shutdown), system error
+TRANSIENT_SQLSTATE_CLASSES = frozenset(['08', '40', '53', '57', '58'])
+
+
+def is_transient_error(exc):
+    """True if a failed primary call may succeed when retried later.
+
+    Covers connection errors, timeouts, HTTP 5xx/408/429 and retryable
+    Postgres/PostgREST error codes. Anything else (validation errors, 4xx,
+    constraint violations) would fail again and is permanent.
+    """
+    if isinstance(exc, (CircuitOpenError, OSError, sqlite3.OperationalError)):
+        return True
+    if httpx is not None:
+        if isinstance(exc, httpx.TransportError):
+            return True
+        if isinstance(exc, httpx.HTTPStatusError):
+            return _transient_status(exc.response.status_code)
+    status = getattr(exc, 'status_code', None) or getattr(getattr(exc, 'response', None), 'status_code', None)
+    if isinstance(status, int):
+        return _transient_status(status)
+    # postgrest APIError: SQLSTATE or PGRST code, or the HTTP status when the body was not JSON
+    code = getattr(exc, 'code', None)
+    if isinstance(code, int) or (isinstance(code, str) and code.isdigit() and len(code) == 3):
+        return _transient_status(int(code))
+    if isinstance(code, str) and code:
+        if code.startswith('PGRST'):
+            # PGRST0xx: PostgREST could not reach or talk to the database
+            return code.startswith('PGRST0')
+        return code[:2] in TRANSIENT_SQLSTATE_CLASSES
+    return False
+
+
+def _transient_status(status):
+    return status >= 500 or status in (408, 429)
+
+
+class ResilientStorage(StorageBackend):
+    """Primary backend guarded by a circuit breaker, with a local spool for writes.
+
+    Rows written to the spool come back with `id` None, `spooled` True and
+    their `spool_id`; they reach the primary later through drain_spool(). dead_letter defaults
+    to a table next to the spool in the same SQLite file.
+
+    Re-drained rows get new ids but keep their created_at, so a sync that reads
+    rows newer than its cursor never sees them. on_redrained is called with the
+    primary's rows for every batch this process moves; on_drained_elsewhere
+    (no arguments) once the spool has been emptied by another process sharing it.
+    """
+
+    def __init__(self, primary, spool, breaker=None, drain_lock_path=None, dead_letter=None,
+                 on_redrained=None, on_drained_elsewhere=None):
+        self.primary = primary
+        self.spool = spool
+        self.dead_letter = dead_letter or SQLiteStorage(spool.path, table=DEAD_LETTER_TABLE_NAME)
+        # Permanent errors must not open the circuit: the database answered, it just said no
+        self.breaker = breaker or CircuitBreaker(primary.name, is_failure=is_transient_error)
+        self.name = f"{primary.name}+spool"
+        self._drain_lock = threading.Lock()
+        # Server workers share one spool file; only one of them may drain it at a time
+        self.drain_lock_path = drain_lock_path
+        self.on_redrained = on_redrained
+        self.on_drained_elsewhere = on_drained_elsewhere
+
+    def bulk_insert(self, records):
+        if not records:
+            return []
+        try:
+            return self.breaker.call(self.primary.bulk_insert, records)
+        except CircuitOpenError:
+            metrics.inc('storage_fallback_total', reason='circuit_open')
+        except Exception as e:
+            if not is_transient_error(e):
+                raise
+            print(f"Primary storage write failed, spooling locally: {e}")
+            metrics.inc('storage_fallback_total', reason='primary_error')
+
+        try:
+            spooled = self.spool.bulk_insert(records)
+        except Exception as e:
+            metrics.inc('storage_rejected_total')
+            raise StorageUnavailable(f"Primary database and local spool both unavailable: {e}")
+        metrics.inc('storage_spooled_total', len(records))
+        return [dict(record, id=None, spooled=True, spool_id=row['id']) for record, row in zip(records, spooled)]
+
+    def _read(self, method, *args, **kwargs):
+        try:
+            return self.breaker.call(getattr(self.primary, method), *args, **kwargs)
+        except CircuitOpenError:
+            raise StorageUnavailable('Primary database unavailable (circuit open)')
+
+    def get_by_id(self, record_id):
+        return self._read('get_by_id', record_id)
+
+    def update(self, record_id, fields):
+        # Not spooled: updates only fill in derived columns (formatted_text) of rows already stored
+        return self._read('update', record_id, fields)
+
+    def update_spooled(self, spool_id, fields):
+        """Set columns on a row still in the spool; False if it was re-drained meanwhile"""
+        return self.spool.update(spool_id, fields)
+
+    def list(self, *args, **kwargs):
+        return self._read('list', *args, **kwargs)
+
+    def count(self, filters=None):
+        return self._read('count', filters)
+
+    def group_counts(self, columns, filters=None):
+        return self._read('group_counts', columns, filters)
+
+    def delete(self, record_ids):
+        return self._read('delete', record_ids)
+
+    def upsert_daily(self, rows):
+        # Not spooled: compaction stops and resumes later instead
+        return self._read('upsert_daily', rows)
+
+    def list_daily(self, *args, **kwargs):
+        return self._read('list_daily', *args, **kwargs)
+
+    def stream(self, filters=None, batch_size=500, after=None):
+        if self.breaker.state != CLOSED:
+            raise StorageUnavailable('Primary database unavailable (circuit open)')
+        return self.primary.stream(filters, batch_size, after)
+
+    def spool_depth(self):
+        return self.spool.count()
+
+    def dead_letter_depth(self):
+        return self.dead_letter.count()
+
+    def drain_spool(self, batch_size=200):
+        """Move spooled rows into the primary, oldest first. Returns rows moved."""
+        moved = 0
+        with self._drain_lock:
+            lock_file = self._lock_other_workers()
+            if lock_file is False:
+                return 0
+            try:
+                moved = self._drain(batch_size)
+            finally:
+                if lock_file:
+                    lock_file.close()
+        if moved:
+            print(f"Re-drained {moved} spooled record(s) into {self.primary.name}")
+            metrics.inc('storage_redrained_total', moved)
+        return moved
+
+    def _lock_other_workers(self):
+        """Open file holding the cross-process drain lock, None without one, False if another process has it"""
+        if not self.drain_lock_path or fcntl is None:
+            return None
+        lock_file = open(self.drain_lock_path, 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        return lock_file
+
+    def _drain(self, batch_size):
+        moved = 0
+        while True:
+            batch = list(itertools.islice(self.spool.stream(batch_size=batch_size), batch_size))
+            if not batch:
+                break
+            try:
+                self._move(batch)
+            except Exception as e:
+                if is_transient_error(e):
+                    print(f"Spool re-drain paused: {e}")
+                    break
+                # Some row in the batch is rejected for good: find it row by row
+                count, paused = self._drain_rows(batch)
+                moved += count
+                if paused:
+                    break
+                continue
+            moved += len(batch)
+        return moved
+
+    def _move(self, rows):
+        """Insert spooled rows into the primary, then take them off the spool"""
+        # Original created_at is kept so re-drained rows sort where they belong. The spool has
+        # every column; NULLs are left out so optional ones the primary may lack are not sent
+        records = [{k: v for k, v in row.items() if k != 'id' and v is not None} for row in rows]
+        stored = self.breaker.call(self.primary.bulk_insert, records)
+        self.spool.delete([row['id'] for row in rows])
+        if self.on_redrained and stored:
+            try:
+                self.on_redrained(stored)
+            except Exception as e:
+                print(f"Re-drained record callback failed: {e}")
+
+    def _drain_rows(self, rows):
+        """Retry rows one at a time, dead-lettering the ones the primary rejects.
+
+        Returns (rows moved to the primary, paused on a transient error).
+        """
+        moved = 0
+        for row in rows:
+            try:
+                self._move([row])
+            except Exception as e:
+                if is_transient_error(e):
+                    print(f"Spool re-drain paused: {e}")
+                    return moved, True
+                print(f"Spooled record {row['id']} rejected by {self.primary.name}, dead-lettered: {e}")
+                self.dead_letter.bulk_insert([{k: v for k, v in row.items() if k != 'id'}])
+                self.spool.delete([row['id']])
+                metrics.inc('storage_dead_lettered_total')
+                continue
+            moved += 1
+        return moved, False
+
+    def start_redrain(self, interval_seconds=30.0):
+        """Start a daemon thread that periodically drains the spool"""
+        def loop():
+            depth, drained_elsewhere = 0, False
+            while True:
+                time.sleep(interval_seconds)
+                try:
+                    moved = self.drain_spool() if self.spool.count() else 0
+                    previous, depth = depth, self.spool.count()
+                    if depth < previous - moved:
+                        # Another worker moved rows this process has not indexed
+                        drained_elsewhere = True
+                    if drained_elsewhere and not depth:
+                        drained_elsewhere = False
+                        if self.on_drained_elsewhere:
+                            self.on_drained_elsewhere()
+                    metrics.set('storage_spool_depth', depth)
+                    metrics.set('storage_dead_letter_depth', self.dead_letter.count())
+                    metrics.set('storage_circuit_open', int(self.breaker.state != CLOSED))
+                except Exception as e:
+                    print(f"Spool re-drain error: {e}")
+
+        thread = threading.Thread(target=loop, name='spool-redrain', daemon=True)
+        thread.start()
+        return thread
+
+    def close(self):
+        self.primary.close()
+        self.spool.close()
+        self.dead_letter.close()
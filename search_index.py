@@ -0,0 +1,357 @@
+"""
+Submission Search Index
+In-memory inverted index over the identity columns of stored submissions,
+for /api/admin/search. Built from the store at startup and updated on every
+insert; answers term and prefix queries without touching the database.
+
+Query syntax (clauses are ANDed, matching is case-insensitive):
+    i5                  any indexed field has the word "i5"
+    processor:i5        only the processor field
+    hostname:FIN-*      hostname starts with "FIN-" (prefix)
+    model:latitude dept:finance
+"""
+
+import re
+import time
+import bisect
+import datetime
+import threading
+from array import array
+
+# Indexed columns and the short names queries can use for them
+SEARCH_FIELDS = {
+    'hostname': 'hostname',
+    'username': 'username',
+    'model': 'system_model',
+    'manufacturer': 'system_manufacturer',
+    'processor': 'windows_processor',
+    'release': 'windows_release',
+    'department': 'department',
+}
+FIELD_ALIASES = dict(SEARCH_FIELDS, system_model='system_model', system_manufacturer='system_manufacturer',
+                     windows_processor='windows_processor', windows_release='windows_release',
+                     os='windows_release', dept='department')
+
+DEFAULT_RESULT_LIMIT = 100
+MAX_RESULT_LIMIT = 1000
+
+# sync_indexes() re-reads this far behind its cursor, for rows committed after a later-stamped one
+SYNC_LOOKBACK_SECONDS = 300
+
+_WORD = re.compile(r'[a-z0-9]+')
+
+
+def index_terms(value):
+    """Terms for one field value: the whole value plus each alphanumeric word"""
+    if value is None:
+        return set()
+    value = str(value).strip().lower()
+    if not value:
+        return set()
+    terms = set(_WORD.findall(value))
+    terms.add(value)
+    return terms
+
+
+def sync_horizon(since, lookback_seconds=SYNC_LOOKBACK_SECONDS):
+    """Oldest created_at the next sync_indexes() after `since` can deliver again"""
+    return (datetime.datetime.fromisoformat(since) - datetime.timedelta(seconds=lookback_seconds)).isoformat()
+
+
+class RecentIds:
+    """Ids of recently created rows, so rows the index sync delivers twice are counted once.
+
+    Only rows created at or after `floor` are remembered: the sync never
+    re-reads older ones, and forget_before() moves the floor up with the sync
+    cursor. max_ids bounds the set in between (or when no sync runs).
+    """
+
+    def __init__(self, floor='', max_ids=100000):
+        self.floor = floor
+        self.max_ids = max_ids
+        self._ids = {}               # id -> created_at, oldest first
+
+    def __len__(self):
+        return len(self._ids)
+
+    def add(self, row_id, created_at):
+        """False if row_id was seen before"""
+        if row_id in self._ids:
+            return False
+        created_at = str(created_at or '')
+        if created_at >= self.floor:
+            self._ids[row_id] = created_at
+            if len(self._ids) > self.max_ids:
+                del self._ids[next(iter(self._ids))]
+        return True
+
+    def forget_before(self, created_at):
+        """Stop remembering rows created before created_at"""
+        if created_at <= self.floor:
+            return
+        self.floor = created_at
+        self._ids = {row_id: seen for row_id, seen in self._ids.items() if seen >= created_at}
+
+
+class SearchIndex:
+    """Field-scoped inverted index with compact, append-only posting lists.
+
+    Documents get consecutive numbers in created_at order (the store is streamed
+    oldest first, later inserts are newer), so every posting list is an ascending
+    array('I') and the most recent matches are simply the largest numbers.
+    """
+
+    def __init__(self, fields=SEARCH_FIELDS):
+        self.fields = dict(fields)
+        self._lock = threading.RLock()
+        self._postings = {}          # (column, term) -> array('I') of doc numbers
+        self._terms = {}             # column -> sorted list of terms (for prefix lookups)
+        self._doc_ids = []           # doc number -> submission id
+        self._doc_numbers = {}       # submission id -> doc number
+        self._deleted = set()
+        self._pending = None         # inserts that arrive while a build is running
+        self._fresh = None
+        self.ready = False
+
+    def __len__(self):
+        return len(self._doc_ids) - len(self._deleted)
+
+    def _add(self, row):
+        row_id = row.get('id')
+        if row_id is None or row_id in self._doc_numbers:
+            # Spooled rows have no id yet; they are picked up on the next rebuild
+            return
+        number = len(self._doc_ids)
+        self._doc_ids.append(row_id)
+        self._doc_numbers[row_id] = number
+        for column in self.fields.values():
+            for term in index_terms(row.get(column)):
+                key = (column, term)
+                postings = self._postings.get(key)
+                if postings is None:
+                    postings = self._postings[key] = array('I')
+                    bisect.insort(self._terms.setdefault(column, []), term)
+                postings.append(number)
+
+    def add(self, row):
+        """Index one stored row (needs its id)"""
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append(row)
+            else:
+                self._add(row)
+
+    def remove(self, row_ids):
+        """Hide deleted submissions from results"""
+        with self._lock:
+            for row_id in row_ids:
+                number = self._doc_numbers.get(row_id)
+                if number is not None:
+                    self._deleted.add(number)
+
+    def begin_build(self):
+        """Start a rebuild: inserts are held back until finish_build()"""
+        with self._lock:
+            self._pending = []
+        self._fresh = SearchIndex(self.fields)
+
+    def feed(self, row):
+        """Add one streamed row to the index being rebuilt"""
+        self._fresh._add(row)
+
+    def finish_build(self):
+        with self._lock:
+            fresh = self._fresh
+            for row in self._pending:
+                fresh._add(row)
+            self._postings, self._terms = fresh._postings, fresh._terms
+            self._doc_ids, self._doc_numbers = fresh._doc_ids, fresh._doc_numbers
+            self._deleted = set()
+            self._pending = None
+            self._fresh = None
+            self.ready = True
+        print(f"Search index: {len(self._doc_ids)} submission(s) indexed")
+
+    def abort_build(self):
+        with self._lock:
+            pending, self._pending, self._fresh = self._pending or [], None, None
+            for row in pending:
+                self._add(row)
+
+    def build(self, storage, batch_size=1000):
+        """(Re)build from the store, oldest first; inserts made meanwhile are applied afterwards"""
+        build_indexes(storage, [self], batch_size)
+
+    def _clause_postings(self, columns, term, prefix):
+        """Sorted doc numbers matching one clause"""
+        lists = []
+        for column in columns:
+            if prefix:
+                terms = self._terms.get(column, [])
+                start = bisect.bisect_left(terms, term)
+                for candidate in terms[start:]:
+                    if not candidate.startswith(term):
+                        break
+                    lists.append(self._postings[(column, candidate)])
+            else:
+                postings = self._postings.get((column, term))
+                if postings is not None:
+                    lists.append(postings)
+        if len(lists) == 1:
+            return lists[0]
+        merged = set()
+        for postings in lists:
+            merged.update(postings)
+        return sorted(merged)
+
+    def search(self, query, limit=DEFAULT_RESULT_LIMIT):
+        """Submission ids matching every clause of query, newest first, plus the total match count"""
+        clauses = parse_query(query)
+        if not clauses:
+            raise ValueError('Empty query')
+        with self._lock:
+            clause_postings = [self._clause_postings(*clause) for clause in clauses]
+            matches = None
+            # Shortest posting list first keeps the intersections small
+            for postings in sorted(clause_postings, key=len):
+                if matches is None:
+                    matches = set(postings)
+                else:
+                    matches.intersection_update(postings)
+                if not matches:
+                    return [], 0
+            matches -= self._deleted
+            newest = sorted(matches, reverse=True)[:limit]
+            return [self._doc_ids[number] for number in newest], len(matches)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'ready': self.ready,
+                'documents': len(self),
+                'terms': len(self._postings),
+                'postings': sum(len(p) for p in self._postings.values()),
+            }
+
+
+def parse_query(query):
+    """[(columns, term, is_prefix)] from a query string; raises ValueError on unknown fields"""
+    clauses = []
+    for token in (query or '').split():
+        field, sep, value = token.partition(':')
+        if sep:
+            column = FIELD_ALIASES.get(field.lower())
+            if column is None:
+                raise ValueError(f"Unknown search field '{field}'. Use one of: {', '.join(SEARCH_FIELDS)}")
+            columns = [column]
+        else:
+            value = token
+            columns = list(SEARCH_FIELDS.values())
+        value = value.strip().lower()
+        prefix = value.endswith('*')
+        value = value.rstrip('*')
+        if not value:
+            continue
+        clauses.append((columns, value, prefix))
+    return clauses
+
+
+def build_indexes(storage, indexes, batch_size=1000):
+    """Load several in-memory indexes from one oldest-first pass over the store.
+
+    Each index implements begin_build(), feed(row), finish_build() and abort_build().
+    """
+    started = time.monotonic()
+    for index in indexes:
+        index.begin_build()
+    try:
+        for row in storage.stream(batch_size=batch_size):
+            for index in indexes:
+                index.feed(row)
+    except Exception:
+        for index in indexes:
+            index.abort_build()
+        raise
+    for index in indexes:
+        index.finish_build()
+    print(f"Indexes loaded in {time.monotonic() - started:.1f}s")
+
+
+def sync_indexes(storage, indexes, since=None, lookback_seconds=SYNC_LOOKBACK_SECONDS, listeners=()):
+    """Add rows stored by other processes since the last sync; returns the new high-water mark.
+
+    Starts lookback_seconds before `since` so rows whose created_at was stamped
+    before a slow commit are not missed; the indexes skip ids they already hold.
+    Each row is also passed to the listener callables, which must do the same.
+    Indexes with forget_before() are told which rows the next sync can no longer repeat.
+    """
+    after = None
+    if since:
+        after = (sync_horizon(since, lookback_seconds), 0)
+    for row in storage.stream(after=after):
+        for index in indexes:
+            index.add(row)
+        for listener in listeners:
+            listener(row)
+        if row.get('created_at') and (since is None or row['created_at'] > since):
+            since = row['created_at']
+    if since:
+        forget_before(indexes, sync_horizon(since, lookback_seconds))
+    return since
+
+
+def oldest_created_at(storage):
+    """created_at of the oldest stored row, None for an empty store"""
+    for row in storage.stream(batch_size=1):
+        return row.get('created_at')
+    return None
+
+
+def forget_before(indexes, created_at):
+    """Let indexes drop the ids of rows created before created_at from their duplicate checks"""
+    for index in indexes:
+        if hasattr(index, 'forget_before'):
+            index.forget_before(created_at)
+
+
+def build_indexes_in_background(storage, indexes, sync_seconds=0, listeners=(),
+                                retry_seconds=5.0, max_retry_seconds=300.0):
+    """Run build_indexes() on a daemon thread, then sync_indexes() every sync_seconds (0 = never).
+
+    A failed build is retried after retry_seconds, doubling up to max_retry_seconds,
+    so the indexes become ready once the store is reachable again. Syncing is for
+    multi-process servers, where each worker holds its own indexes and only sees
+    its own inserts directly. The sync only sees new rows, so when the oldest
+    stored row moves forward (compaction deleted rows, possibly in another
+    worker or host) the indexes are rebuilt instead. Returns the thread.
+    """
+    def run():
+        delay = retry_seconds
+        while True:
+            try:
+                oldest = oldest_created_at(storage) if sync_seconds > 0 else None
+                if indexes:
+                    build_indexes(storage, indexes)
+                break
+            except Exception as e:
+                print(f"Index build failed, retrying in {delay:.0f}s: {e}")
+                time.sleep(delay)
+                delay = min(delay * 2, max_retry_seconds)
+        since = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        forget_before(indexes, sync_horizon(since))
+        while sync_seconds > 0:
+            time.sleep(sync_seconds)
+            try:
+                since = sync_indexes(storage, indexes, since, listeners=listeners)
+                current = oldest_created_at(storage)
+                if oldest and current != oldest and (current is None or current > oldest):
+                    print("Rows were deleted from the store, rebuilding indexes")
+                    build_indexes(storage, indexes)
+                    since = datetime.datetime.now(datetime.timezone.utc).isoformat()
+                    forget_before(indexes, sync_horizon(since))
+                oldest = current
+            except Exception as e:
+                print(f"Index sync error: {e}")
+    thread = threading.Thread(target=run, name='index-build', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,530 @@
+"""
+Storage Backends for System Details
+A small storage interface with two implementations:
+- SupabaseStorage: the hosted `system_details` table
+- SQLiteStorage: a local file in WAL mode for on-prem runs and tests
+
+Both also hold `system_details_daily`, the per-device daily summaries that
+compaction.py folds old snapshots into.
+
+Use create_storage() to pick one from configuration.
+"""
+
+import os
+import json
+import base64
+import sqlite3
+import datetime
+import threading
+from collections import Counter
+
+from records import (
+    TABLE_NAME, RECORD_COLUMNS, NUMERIC_COLUMNS, DAILY_TABLE_NAME, DAILY_COLUMNS, DAILY_NUMERIC_COLUMNS,
+)
+
+try:
+    from supabase import create_client
+    from supabase.lib.client_options import ClientOptions
+    SUPABASE_AVAILABLE = True
+except ImportError:
+    SUPABASE_AVAILABLE = False
+
+# Columns that list()/stream() accept as equality filters
+FILTER_COLUMNS = frozenset([
+    'employee_id', 'email', 'department', 'hostname', 'serial_number',
+    'system_manufacturer', 'system_model', 'windows_system', 'windows_release',
+])
+
+# Columns that list_daily() accepts as equality filters
+DAILY_FILTER_COLUMNS = frozenset([
+    'device_key', 'employee_id', 'department', 'hostname', 'serial_number', 'system_model',
+])
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+class StorageError(Exception):
+    """Raised when a storage backend cannot complete an operation"""
+
+
+def utc_timestamp():
+    """created_at value in the same ISO format Supabase returns"""
+    return datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+
+def encode_cursor(row):
+    """Opaque keyset cursor pointing just past `row` (newest-first ordering)"""
+    raw = json.dumps([row['created_at'], row['id']]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor(). Raises ValueError for malformed cursors."""
+    try:
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except Exception:
+        raise ValueError('Invalid cursor')
+    return created_at, row_id
+
+
+def clean_filters(filters, columns=FILTER_COLUMNS):
+    """Keep only supported, non-empty equality filters"""
+    return {k: v for k, v in (filters or {}).items() if k in columns and v not in (None, '')}
+
+
+class StorageBackend:
+    """Interface shared by all storage backends.
+
+    Rows are plain dicts with the records.RECORD_COLUMNS fields plus `id`
+    and `created_at`. Listing is newest first; stream() is oldest first.
+    """
+
+    name = 'base'
+
+    def insert(self, record):
+        """Store one record; returns the stored row (with id and created_at)"""
+        return self.bulk_insert([record])[0]
+
+    def bulk_insert(self, records):
+        """Store several records; returns the stored rows in input order"""
+        raise NotImplementedError
+
+    def get_by_id(self, record_id):
+        """Row with the given id, or None"""
+        raise NotImplementedError
+
+    def update(self, record_id, fields):
+        """Set some record columns on one row; returns True if the row exists"""
+        raise NotImplementedError
+
+    def list(self, filters=None, limit=DEFAULT_PAGE_SIZE, cursor=None, offset=0):
+        """One page of rows, newest first.
+
+        Returns (rows, next_cursor); next_cursor is None on the last page.
+        """
+        raise NotImplementedError
+
+    def stream(self, filters=None, batch_size=500, after=None):
+        """Yield every matching row, oldest first, fetching batch_size at a time.
+
+        after=(created_at, id) starts just past that row.
+        """
+        raise NotImplementedError
+
+    def count(self, filters=None):
+        """Exact number of matching rows"""
+        raise NotImplementedError
+
+    def group_counts(self, columns, filters=None):
+        """COUNT(*) GROUP BY columns: {(value, ...): rows} over the matching rows"""
+        raise NotImplementedError
+
+    def delete(self, record_ids):
+        """Delete rows by id; returns the number deleted"""
+        raise NotImplementedError
+
+    def upsert_daily(self, rows):
+        """Insert or replace daily summary rows, keyed by (day, device_key)"""
+        raise NotImplementedError
+
+    def list_daily(self, filters=None, day_from=None, day_to=None, limit=DEFAULT_PAGE_SIZE, offset=0):
+        """Daily summary rows, newest day first; day_from/day_to are inclusive YYYY-MM-DD bounds"""
+        raise NotImplementedError
+
+    def close(self):
+        """Release connections"""
+
+
+class SupabaseStorage(StorageBackend):
+    """system_details table in Supabase (PostgREST)"""
+
+    name = 'supabase'
+
+    def __init__(self, url, key, table=TABLE_NAME, timeout_seconds=10):
+        if not SUPABASE_AVAILABLE:
+            raise StorageError("supabase package not installed. Install with: pip install supabase")
+        # The client default is 120 s per request, far longer than any ingest caller should wait
+        self.client = create_client(url, key, options=ClientOptions(postgrest_client_timeout=timeout_seconds))
+        self.table_name = table
+        # Cleared after the first group_counts() the project refuses to aggregate
+        self._aggregates = True
+
+    def _table(self):
+        return self.client.table(self.table_name)
+
+    def bulk_insert(self, records):
+        if not records:
+            return []
+        result = self._table().insert(list(records)).execute()
+        return result.data or []
+
+    def get_by_id(self, record_id):
+        result = self._table().select('*').eq('id', record_id).execute()
+        return result.data[0] if result.data else None
+
+    def update(self, record_id, fields):
+        fields = {k: v for k, v in fields.items() if k in RECORD_COLUMNS}
+        if not fields:
+            return False
+        result = self._table().update(fields).eq('id', record_id).execute()
+        return bool(result.data)
+
+    def _filtered(self, query, filters):
+        for column, value in clean_filters(filters).items():
+            query = query.eq(column, value)
+        return query
+
+    def list(self, filters=None, limit=DEFAULT_PAGE_SIZE, cursor=None, offset=0):
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        query = self._filtered(self._table().select('*'), filters)
+        if cursor:
+            created_at, row_id = decode_cursor(cursor)
+            query = query.or_(f"created_at.lt.{created_at},and(created_at.eq.{created_at},id.lt.{row_id})")
+        query = query.order('created_at', desc=True).order('id', desc=True)
+        if cursor or not offset:
+            query = query.limit(limit)
+        else:
+            query = query.range(offset, offset + limit - 1)
+        rows = query.execute().data or []
+        next_cursor = encode_cursor(rows[-1]) if len(rows) == limit else None
+        return rows, next_cursor
+
+    def count(self, filters=None):
+        result = self._filtered(self._table().select('id', count='exact', head=True), filters).execute()
+        return result.count or 0
+
+    def group_counts(self, columns, filters=None):
+        columns = list(columns)
+        if self._aggregates:
+            try:
+                return self._aggregate_counts(columns, filters)
+            except Exception as e:
+                # PostgREST aggregates are off unless db-aggregates-enabled is set on the project
+                print(f"Supabase aggregates unavailable, counting from the columns instead: {e}")
+                self._aggregates = False
+        counts = Counter()
+        last_id = None
+        while True:
+            query = self._filtered(self._table().select(', '.join(['id'] + columns)), filters)
+            if last_id is not None:
+                query = query.gt('id', last_id)
+            rows = query.order('id').limit(MAX_PAGE_SIZE).execute().data or []
+            for row in rows:
+                counts[tuple(row.get(column) for column in columns)] += 1
+            if len(rows) < MAX_PAGE_SIZE:
+                return dict(counts)
+            last_id = rows[-1]['id']
+
+    def _aggregate_counts(self, columns, filters):
+        counts = {}
+        offset = 0
+        while True:
+            query = self._filtered(self._table().select(', '.join(columns + ['count()'])), filters)
+            for column in columns:
+                query = query.order(column)
+            rows = query.range(offset, offset + MAX_PAGE_SIZE - 1).execute().data or []
+            for row in rows:
+                counts[tuple(row.get(column) for column in columns)] = row['count']
+            if len(rows) < MAX_PAGE_SIZE:
+                return counts
+            offset += len(rows)
+
+    def delete(self, record_ids):
+        record_ids = list(record_ids)
+        if not record_ids:
+            return 0
+        result = self._table().delete().in_('id', record_ids).execute()
+        return len(result.data or [])
+
+    def _daily(self):
+        return self.client.table(DAILY_TABLE_NAME)
+
+    def upsert_daily(self, rows):
+        rows = [{column: row.get(column) for column in DAILY_COLUMNS} for row in rows]
+        for start in range(0, len(rows), 500):
+            self._daily().upsert(rows[start:start + 500], on_conflict='day,device_key').execute()
+        return len(rows)
+
+    def list_daily(self, filters=None, day_from=None, day_to=None, limit=DEFAULT_PAGE_SIZE, offset=0):
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        query = self._daily().select('*')
+        for column, value in clean_filters(filters, DAILY_FILTER_COLUMNS).items():
+            query = query.eq(column, value)
+        if day_from:
+            query = query.gte('day', day_from)
+        if day_to:
+            query = query.lte('day', day_to)
+        query = query.order('day', desc=True).order('device_key').range(offset, offset + limit - 1)
+        return query.execute().data or []
+
+    def stream(self, filters=None, batch_size=500, after=None):
+        last = after
+        while True:
+            query = self._filtered(self._table().select('*'), filters)
+            if last is not None:
+                created_at, row_id = last
+                query = query.or_(f"created_at.gt.{created_at},and(created_at.eq.{created_at},id.gt.{row_id})")
+            rows = query.order('created_at').order('id').limit(batch_size).execute().data or []
+            for row in rows:
+                yield row
+            if len(rows) < batch_size:
+                return
+            last = (rows[-1]['created_at'], rows[-1]['id'])
+
+
+class SQLiteStorage(StorageBackend):
+    """Local SQLite database in WAL mode (one connection per thread)"""
+
+    name = 'sqlite'
+
+    def __init__(self, path, table=TABLE_NAME):
+        self.path = path
+        self.table_name = table
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._create_schema()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            # WAL lets admin reads run while ingest writes; NORMAL sync is durable enough with WAL
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA temp_store=MEMORY')
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def _create_schema(self):
+        columns = ',\n'.join(
+            f"    {column} {'REAL' if column in NUMERIC_COLUMNS else 'TEXT'}" for column in RECORD_COLUMNS
+        )
+        conn = self._connect()
+        with conn:
+            conn.execute(f"""
+CREATE TABLE IF NOT EXISTS {self.table_name} (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at TEXT NOT NULL,
+{columns}
+)""")
+            # Databases created before a column was added get it now (NULL on existing rows)
+            existing = {row['name'] for row in conn.execute(f"PRAGMA table_info({self.table_name})")}
+            for column in RECORD_COLUMNS:
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE {self.table_name} ADD COLUMN {column} "
+                                 f"{'REAL' if column in NUMERIC_COLUMNS else 'TEXT'}")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{self.table_name}_created_at "
+                         f"ON {self.table_name} (created_at, id)")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{self.table_name}_serial_number "
+                         f"ON {self.table_name} (serial_number)")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{self.table_name}_department "
+                         f"ON {self.table_name} (department, created_at)")
+            daily_columns = ',\n'.join(
+                f"    {column} {'INTEGER' if column == 'samples' else 'REAL' if column in DAILY_NUMERIC_COLUMNS else 'TEXT'}"
+                for column in DAILY_COLUMNS if column not in ('day', 'device_key')
+            )
+            conn.execute(f"""
+CREATE TABLE IF NOT EXISTS {DAILY_TABLE_NAME} (
+    day TEXT NOT NULL,
+    device_key TEXT NOT NULL,
+{daily_columns},
+    PRIMARY KEY (day, device_key)
+)""")
+
+    def bulk_insert(self, records):
+        if not records:
+            return []
+        conn = self._connect()
+        stored = []
+        placeholders = ', '.join('?' for _ in range(len(RECORD_COLUMNS) + 1))
+        sql = f"INSERT INTO {self.table_name} (created_at, {', '.join(RECORD_COLUMNS)}) VALUES ({placeholders})"
+        # One transaction for the whole batch: a single fsync instead of one per row
+        with conn:
+            for record in records:
+                row = {column: record.get(column) for column in RECORD_COLUMNS}
+                row['created_at'] = record.get('created_at') or utc_timestamp()
+                cursor = conn.execute(sql, [row['created_at']] + [row[column] for column in RECORD_COLUMNS])
+                row['id'] = cursor.lastrowid
+                stored.append(row)
+        return stored
+
+    def get_by_id(self, record_id):
+        try:
+            record_id = int(record_id)
+        except (TypeError, ValueError):
+            return None
+        row = self._connect().execute(
+            f"SELECT * FROM {self.table_name} WHERE id = ?", (record_id,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def update(self, record_id, fields):
+        columns = [column for column in RECORD_COLUMNS if column in fields]
+        if not columns:
+            return False
+        conn = self._connect()
+        with conn:
+            cursor = conn.execute(
+                f"UPDATE {self.table_name} SET {', '.join(f'{c} = ?' for c in columns)} WHERE id = ?",
+                [fields[c] for c in columns] + [int(record_id)]
+            )
+        return cursor.rowcount > 0
+
+    def _where(self, filters, extra=None):
+        clauses, params = [], []
+        for column, value in clean_filters(filters).items():
+            clauses.append(f"{column} = ?")
+            params.append(value)
+        if extra:
+            clauses.append(extra[0])
+            params.extend(extra[1])
+        return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+    def list(self, filters=None, limit=DEFAULT_PAGE_SIZE, cursor=None, offset=0):
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        extra = None
+        if cursor:
+            created_at, row_id = decode_cursor(cursor)
+            extra = ('(created_at < ? OR (created_at = ? AND id < ?))', [created_at, created_at, row_id])
+        where, params = self._where(filters, extra)
+        sql = f"SELECT * FROM {self.table_name}{where} ORDER BY created_at DESC, id DESC LIMIT ?"
+        params.append(limit)
+        if offset and not cursor:
+            sql += ' OFFSET ?'
+            params.append(offset)
+        rows = [dict(row) for row in self._connect().execute(sql, params).fetchall()]
+        next_cursor = encode_cursor(rows[-1]) if len(rows) == limit else None
+        return rows, next_cursor
+
+    def stream(self, filters=None, batch_size=500, after=None):
+        conn = self._connect()
+        last = after
+        while True:
+            extra = None
+            if last is not None:
+                extra = ('(created_at > ? OR (created_at = ? AND id > ?))', [last[0], last[0], last[1]])
+            where, params = self._where(filters, extra)
+            rows = conn.execute(
+                f"SELECT * FROM {self.table_name}{where} ORDER BY created_at, id LIMIT ?",
+                params + [batch_size]
+            ).fetchall()
+            for row in rows:
+                yield dict(row)
+            if len(rows) < batch_size:
+                return
+            last = (rows[-1]['created_at'], rows[-1]['id'])
+
+    def count(self, filters=None):
+        where, params = self._where(filters)
+        return self._connect().execute(f"SELECT COUNT(*) FROM {self.table_name}{where}", params).fetchone()[0]
+
+    def group_counts(self, columns, filters=None):
+        columns = list(columns)
+        where, params = self._where(filters)
+        rows = self._connect().execute(
+            f"SELECT {', '.join(columns)}, COUNT(*) FROM {self.table_name}{where} GROUP BY {', '.join(columns)}",
+            params
+        ).fetchall()
+        return {tuple(row[:-1]): row[-1] for row in rows}
+
+    def delete(self, record_ids):
+        record_ids = [int(record_id) for record_id in record_ids]
+        if not record_ids:
+            return 0
+        conn = self._connect()
+        deleted = 0
+        with conn:
+            # Stay well under SQLite's bound-parameter limit
+            for start in range(0, len(record_ids), 500):
+                chunk = record_ids[start:start + 500]
+                cursor = conn.execute(
+                    f"DELETE FROM {self.table_name} WHERE id IN ({', '.join('?' for _ in chunk)})", chunk
+                )
+                deleted += cursor.rowcount
+        return deleted
+
+    def upsert_daily(self, rows):
+        if not rows:
+            return 0
+        conn = self._connect()
+        sql = (f"INSERT OR REPLACE INTO {DAILY_TABLE_NAME} ({', '.join(DAILY_COLUMNS)}) "
+               f"VALUES ({', '.join('?' for _ in DAILY_COLUMNS)})")
+        with conn:
+            conn.executemany(sql, [[row.get(column) for column in DAILY_COLUMNS] for row in rows])
+        return len(rows)
+
+    def list_daily(self, filters=None, day_from=None, day_to=None, limit=DEFAULT_PAGE_SIZE, offset=0):
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        clauses, params = [], []
+        for column, value in clean_filters(filters, DAILY_FILTER_COLUMNS).items():
+            clauses.append(f"{column} = ?")
+            params.append(value)
+        if day_from:
+            clauses.append('day >= ?')
+            params.append(day_from)
+        if day_to:
+            clauses.append('day <= ?')
+            params.append(day_to)
+        where = (' WHERE ' + ' AND '.join(clauses)) if clauses else ''
+        rows = self._connect().execute(
+            f"SELECT * FROM {DAILY_TABLE_NAME}{where} ORDER BY day DESC, device_key LIMIT ? OFFSET ?",
+            params + [limit, offset]
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def close(self):
+        with self._connections_lock:
+            for conn in self._connections:
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+            self._connections = []
+        self._local = threading.local()
+
+
+def create_storage(backend='auto', supabase_url=None, supabase_key=None, sqlite_path='system_details.db',
+                   supabase_timeout=10, spool_path=None, breaker=None):
+    """Build the configured storage backend.
+
+    backend is 'supabase', 'sqlite' or 'auto' (Supabase when configured,
+    otherwise or on failure the local SQLite file). With spool_path set,
+    Supabase is wrapped in a ResilientStorage that spools writes locally
+    while it is down. Returns None only if no backend could be initialized.
+    """
+    backend = (backend or 'auto').lower()
+
+    if backend in ('supabase', 'auto') and supabase_url and supabase_key:
+        try:
+            storage = SupabaseStorage(supabase_url, supabase_key, timeout_seconds=supabase_timeout)
+            print("Storage: Supabase client initialized successfully")
+            if spool_path:
+                from resilient_storage import ResilientStorage
+                try:
+                    storage = ResilientStorage(storage, SQLiteStorage(spool_path), breaker,
+                                               drain_lock_path=f"{spool_path}.lock")
+                    print(f"Storage: spooling to {spool_path} while Supabase is unavailable")
+                except Exception as e:
+                    print(f"Warning: Could not open local spool, writes will not fall back: {e}")
+            return storage
+        except Exception as e:
+            if backend == 'supabase':
+                raise StorageError(f"Could not initialize Supabase storage: {e}")
+            print(f"Warning: Could not initialize Supabase client, falling back to SQLite: {e}")
+    elif backend == 'supabase':
+        raise StorageError("STORAGE_BACKEND=supabase but SUPABASE_URL/SUPABASE_KEY are not set")
+
+    try:
+        storage = SQLiteStorage(sqlite_path)
+        print(f"Storage: using local SQLite database {sqlite_path}")
+        return storage
+    except Exception as e:
+        print(f"Warning: Could not initialize SQLite storage: {e}")
+        return None
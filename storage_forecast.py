@@ -0,0 +1,308 @@
+"""
+Storage Capacity Forecast
+Fits a trend line to used_gb of every mount of every device, from the
+storage_details of its snapshots, and predicts when each mount fills up.
+Backs /api/admin/forecast/storage.
+
+Each mount keeps the sufficient statistics of a weighted least-squares fit
+(sum of weights, t, y, t^2, t*y), so a new snapshot updates its fit in O(1)
+at ingest. Older samples are weighted down with a half-life, so the trend
+follows recent behaviour; a replaced disk (total changes) or a cleanup (used
+drops by more than RESET_FRACTION of the disk) starts the fit over. The
+startup build collects every sample first and fits all mounts of the fleet
+in one vectorized pass when NumPy is available.
+"""
+
+import json
+import threading
+import datetime
+from array import array
+
+from records import safe_numeric
+from compaction import device_key, MAX_MOUNTS
+from search_index import RecentIds, sync_horizon
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+DEFAULT_HALF_LIFE_DAYS = 30
+# A mount counts as full at this fill level
+DEFAULT_FULL_PERCENT = 95
+# Fewer samples, or a shorter history, give no forecast
+MIN_SAMPLES = 3
+MIN_SPAN_DAYS = 1.0
+# Used space dropping by more than this share of the disk means a cleanup: the old trend no longer applies
+RESET_FRACTION = 0.1
+# Total size changing by more than this share means another disk
+TOTAL_CHANGE_FRACTION = 0.01
+# Mounts that would take longer than this to fill count as not growing
+HORIZON_DAYS = 5 * 365
+
+DEFAULT_FORECAST_LIMIT = 100
+MAX_FORECAST_LIMIT = 5000
+
+IDENTITY_COLUMNS = ('employee_id', 'department', 'hostname', 'serial_number', 'system_model')
+
+_EPOCH = datetime.datetime(2000, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def _days(created_at):
+    """Days since _EPOCH of an ISO timestamp"""
+    value = datetime.datetime.fromisoformat(str(created_at).replace('Z', '+00:00'))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return (value - _EPOCH).total_seconds() / 86400
+
+
+def storage_entries(storage_details):
+    """(drive, total_gb, used_gb) of each usable mount in a storage_details value"""
+    entries = storage_details
+    if isinstance(entries, str):
+        try:
+            entries = json.loads(entries)
+        except ValueError:
+            return []
+    found = []
+    for entry in entries if isinstance(entries, list) else []:
+        if not isinstance(entry, dict) or not entry.get('drive'):
+            continue
+        total = safe_numeric(entry.get('total_gb'))
+        used = safe_numeric(entry.get('used_gb'))
+        if total and total > 0 and used is not None:
+            found.append((str(entry['drive']), float(total), float(used)))
+    return found
+
+
+class _Mount:
+    """Fit state of one mount of one device"""
+
+    __slots__ = ('device', 'drive', 'index', 'identity', 'total_gb', 'used_gb', 'last_seen', 'segment',
+                 't0', 't_last', 'samples', 'w', 'st', 'sy', 'stt', 'sty')
+
+    def __init__(self, device, drive, index=None):
+        self.device = device
+        self.drive = drive
+        # Position in the batch build's sample arrays
+        self.index = index
+        self.identity = {}
+        self.segment = 0
+        self.last_seen = None
+        self._restart()
+
+    def _restart(self):
+        self.total_gb = None
+        self.used_gb = None
+        self.t0 = None
+        self.t_last = None
+        self.samples = 0
+        self.w = self.st = self.sy = self.stt = self.sty = 0.0
+
+    def observe(self, t, total, used, half_life, accumulate=True):
+        """Take one sample at day t (the sums are left to the batch fit unless accumulate)"""
+        if self.samples and t >= self.t_last and (
+                abs(total - self.total_gb) > TOTAL_CHANGE_FRACTION * self.total_gb or
+                used < self.used_gb - RESET_FRACTION * self.total_gb):
+            self._restart()
+            self.segment += 1
+        if not self.samples:
+            self.t0 = self.t_last = t
+        if t >= self.t_last:
+            # Everything seen so far ages by the time since the previous sample
+            decay = 0.5 ** ((t - self.t_last) / half_life)
+            self.w, self.st, self.sy = self.w * decay, self.st * decay, self.sy * decay
+            self.stt, self.sty = self.stt * decay, self.sty * decay
+            self.t_last, self.total_gb, self.used_gb = t, total, used
+            weight = 1.0
+        else:
+            # Late sample (another worker's row picked up by a sync)
+            weight = 0.5 ** ((self.t_last - t) / half_life)
+        self.samples += 1
+        if accumulate:
+            x = t - self.t0
+            self.w += weight
+            self.st += weight * x
+            self.sy += weight * used
+            self.stt += weight * x * x
+            self.sty += weight * x * used
+
+    def slope(self):
+        """Weighted least-squares growth in GB per day, or None without enough history"""
+        if self.samples < MIN_SAMPLES or self.t_last - self.t0 < MIN_SPAN_DAYS:
+            return None
+        denominator = self.w * self.stt - self.st * self.st
+        if denominator <= 1e-12:
+            return None
+        return (self.w * self.sty - self.st * self.sy) / denominator
+
+
+class StorageForecast:
+    """Per-mount storage trends, kept current on insert"""
+
+    def __init__(self, half_life_days=DEFAULT_HALF_LIFE_DAYS, full_percent=DEFAULT_FULL_PERCENT):
+        self.half_life_days = half_life_days
+        self.full_percent = full_percent
+        self._lock = threading.RLock()
+        self._reset()
+        self._pending = None
+        self._fresh = None
+        self.ready = False
+
+    def _reset(self):
+        self._mounts = {}             # (device key, drive) -> _Mount
+        self._mount_counts = {}       # device key -> mounts tracked
+        # Recent rows already sampled (streamed and inserted, or synced twice)
+        self._seen = RecentIds(sync_horizon(datetime.datetime.now(datetime.timezone.utc).isoformat()))
+        self._samples = None          # batch build: mount index, segment, day, used_gb
+        self._order = []              # batch build: _Mount by index
+
+    def _add(self, row):
+        row_id = row.get('id')
+        if row_id is None or not self._seen.add(row_id, row.get('created_at')):
+            return
+        entries = storage_entries(row.get('storage_details'))
+        if not entries or not row.get('created_at'):
+            return
+        t = _days(row['created_at'])
+        device = device_key(row)
+        for drive, total, used in entries:
+            mount = self._mounts.get((device, drive))
+            if mount is None:
+                if self._mount_counts.get(device, 0) >= MAX_MOUNTS:
+                    continue
+                mount = self._mounts[(device, drive)] = _Mount(device, drive, len(self._order))
+                self._mount_counts[device] = self._mount_counts.get(device, 0) + 1
+                if self._samples is not None:
+                    self._order.append(mount)
+            if mount.last_seen is None or row['created_at'] >= mount.last_seen:
+                mount.last_seen = row['created_at']
+                mount.identity = {column: row.get(column) for column in IDENTITY_COLUMNS}
+            if self._samples is None:
+                mount.observe(t, total, used, self.half_life_days)
+            else:
+                # Batch build: only the bookkeeping now, the sums in _fit_batch()
+                mount.observe(t, total, used, self.half_life_days, accumulate=False)
+                index, segment, days, values = self._samples
+                index.append(mount.index)
+                segment.append(mount.segment)
+                days.append(t)
+                values.append(used)
+
+    def _fit_batch(self):
+        """Sums of every mount's current segment from the collected samples, vectorized over the fleet"""
+        index, segment, days, values = (np.frombuffer(a, dtype=d) for a, d in zip(
+            self._samples, (np.int64, np.int64, np.float64, np.float64)))
+        self._samples = None
+        if not len(index):
+            return
+        count = len(self._order)
+        current = np.array([mount.segment for mount in self._order], dtype=np.int64)
+        t0 = np.array([mount.t0 for mount in self._order], dtype=np.float64)
+        t_last = np.array([mount.t_last for mount in self._order], dtype=np.float64)
+        keep = segment == current[index]
+        index, days, values = index[keep], days[keep], values[keep]
+        weights = 0.5 ** ((t_last[index] - days) / self.half_life_days)
+        x = days - t0[index]
+        sums = [np.bincount(index, weights=w, minlength=count) for w in (
+            weights, weights * x, weights * values, weights * x * x, weights * x * values)]
+        for i, mount in enumerate(self._order):
+            mount.w, mount.st, mount.sy, mount.stt, mount.sty = (float(s[i]) for s in sums)
+
+    def add(self, row):
+        """Take the storage samples of one stored row"""
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append(row)
+            else:
+                self._add(row)
+
+    def begin_build(self):
+        with self._lock:
+            self._pending = []
+        self._fresh = StorageForecast(self.half_life_days, self.full_percent)
+        if NUMPY_AVAILABLE:
+            self._fresh._samples = (array('q'), array('q'), array('d'), array('d'))
+
+    def feed(self, row):
+        self._fresh._add(row)
+
+    def finish_build(self):
+        with self._lock:
+            fresh = self._fresh
+            if fresh._samples is not None:
+                fresh._fit_batch()
+            for row in self._pending:
+                fresh._add(row)
+            self._mounts, self._mount_counts, self._seen = fresh._mounts, fresh._mount_counts, fresh._seen
+            self._pending = None
+            self._fresh = None
+            self.ready = True
+        print(f"Storage forecast: {len(self._mounts)} mount(s) tracked")
+
+    def abort_build(self):
+        with self._lock:
+            pending, self._pending, self._fresh = self._pending or [], None, None
+            for row in pending:
+                self._add(row)
+
+    def forget_before(self, created_at):
+        with self._lock:
+            self._seen.forget_before(created_at)
+
+    def _forecast(self, mount, now_days):
+        capacity = mount.total_gb * self.full_percent / 100.0
+        slope = mount.slope()
+        headroom = capacity - mount.used_gb
+        if headroom <= 0:
+            days = 0.0
+        elif slope is not None and slope > 0:
+            # Counted from now, assuming the trend went on since the last sample
+            days = max(0.0, headroom / slope - (now_days - mount.t_last))
+            days = days if days <= HORIZON_DAYS else None
+        else:
+            days = None
+        entry = {
+            'device_key': mount.device,
+            'drive': mount.drive,
+            'total_gb': round(mount.total_gb, 2),
+            'used_gb': round(mount.used_gb, 2),
+            'used_percent': round(mount.used_gb / mount.total_gb * 100, 1),
+            'growth_gb_per_day': round(slope, 3) + 0.0 if slope is not None else None,
+            'days_until_full': round(days, 1) if days is not None else None,
+            'full_date': (_EPOCH + datetime.timedelta(days=now_days + days)).date().isoformat()
+            if days is not None else None,
+            'samples': mount.samples,
+            'last_seen': mount.last_seen,
+        }
+        entry.update(mount.identity)
+        return entry
+
+    def report(self, department=None, max_days=None, include_stable=False, limit=DEFAULT_FORECAST_LIMIT, now=None):
+        """Mounts by urgency: soonest full first, then fullest; growing or full mounts only unless include_stable"""
+        now = now or datetime.datetime.now(datetime.timezone.utc)
+        now_days = (now - _EPOCH).total_seconds() / 86400
+        with self._lock:
+            entries = []
+            for mount in self._mounts.values():
+                if mount.samples == 0:
+                    continue
+                if department is not None and mount.identity.get('department') != department:
+                    continue
+                entry = self._forecast(mount, now_days)
+                days = entry['days_until_full']
+                if days is None and not include_stable:
+                    continue
+                if max_days is not None and (days is None or days > max_days):
+                    continue
+                entries.append(entry)
+        entries.sort(key=lambda e: (e['days_until_full'] is None, e['days_until_full'] or 0, -e['used_percent']))
+        return {
+            'ready': self.ready,
+            'full_percent': self.full_percent,
+            'half_life_days': self.half_life_days,
+            'mounts_tracked': len(self._mounts),
+            'total': len(entries),
+            'forecasts': entries[:limit],
+        }
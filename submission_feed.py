@@ -0,0 +1,129 @@
+"""
+Submission Feed
+In-process pub/sub for new submissions, behind the
+/api/admin/submissions/stream Server-Sent Events endpoint. Ingest handlers
+publish each stored row; every connected dashboard has its own bounded queue,
+and a ring buffer of recent events lets a reconnecting client resume from its
+Last-Event-ID.
+"""
+
+import json
+import queue
+import threading
+from collections import deque, OrderedDict
+
+from metrics import metrics
+
+# Row fields sent in each event (the full row is one /api/admin/submissions/<id> away)
+EVENT_FIELDS = (
+    'id', 'created_at', 'employee_id', 'email', 'department', 'hostname', 'serial_number',
+    'system_manufacturer', 'system_model', 'windows_release', 'ram_total_gb',
+)
+
+DEFAULT_BUFFER_SIZE = 1000
+# Events a client may fall behind by before it is disconnected (it resumes from the buffer)
+SUBSCRIBER_QUEUE_SIZE = 500
+
+
+def compact_event(row):
+    return {field: row.get(field) for field in EVENT_FIELDS}
+
+
+def format_sse(data, event_id=None, event=None):
+    """One text/event-stream message"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'), default=str)}")
+    return '\n'.join(lines) + '\n\n'
+
+
+class Subscription:
+    """One client's queue; closed when it falls too far behind"""
+
+    def __init__(self, department=None):
+        self.department = department
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+    def wants(self, event):
+        return self.department is None or event.get('department') == self.department
+
+    def get(self, timeout):
+        """Next event, or None after timeout seconds"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class SubmissionFeed:
+    """Fan-out of stored rows to subscribers, with a ring buffer for resume.
+
+    Event ids are the submission ids. Rows are published in arrival order,
+    which is not always id order (rows synced from other workers arrive late),
+    so resume looks an id up in the buffer rather than comparing numbers.
+    """
+
+    def __init__(self, buffer_size=DEFAULT_BUFFER_SIZE):
+        self._lock = threading.Lock()
+        self._buffer = deque(maxlen=buffer_size)
+        # Ids published recently, so a row seen twice (insert + sync) is sent once
+        self._recent_ids = OrderedDict()
+        self._max_recent = max(buffer_size * 10, 10000)
+        self._subscribers = set()
+
+    def publish(self, row):
+        row_id = row.get('id')
+        if row_id is None:
+            # Spooled rows have no id yet; dashboards would not find them either
+            return
+        event = compact_event(row)
+        with self._lock:
+            if row_id in self._recent_ids:
+                return
+            self._recent_ids[row_id] = True
+            if len(self._recent_ids) > self._max_recent:
+                self._recent_ids.popitem(last=False)
+            self._buffer.append(event)
+            subscribers = list(self._subscribers)
+        metrics.inc('stream_events_total')
+        for subscription in subscribers:
+            if not subscription.wants(event):
+                continue
+            try:
+                subscription.queue.put_nowait(event)
+            except queue.Full:
+                subscription.overflowed = True
+                self.unsubscribe(subscription)
+                metrics.inc('stream_clients_dropped_total')
+
+    def subscribe(self, department=None, last_event_id=None):
+        """Register a client. Returns (subscription, backlog, resumed).
+
+        backlog holds the buffered events after last_event_id; resumed is False
+        when that id is no longer (or never was) in this process's buffer.
+        """
+        subscription = Subscription(department)
+        with self._lock:
+            backlog, resumed = [], last_event_id is None
+            if last_event_id is not None:
+                events = list(self._buffer)
+                for position, event in enumerate(events):
+                    if str(event['id']) == str(last_event_id):
+                        backlog = [e for e in events[position + 1:] if subscription.wants(e)]
+                        resumed = True
+                        break
+            self._subscribers.add(subscription)
+        return subscription, backlog, resumed
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    @property
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
@@ -5,7 +5,11 @@
  */
 
 class SystemDetailsCollector {
-  constructor() {
+  /**
+   * @param {Object} options - apiUrl: base URL of the API server ('' = same origin)
+   */
+  constructor(options = {}) {
+    this.apiUrl = options.apiUrl || '';
     this.details = {};
   }
 
@@ -92,36 +96,22 @@ class SystemDetailsCollector {
   }
 
   /**
-   * Get IP address using external service
+   * Get IP address as seen by the API server (/api/whoami)
+   * 'Unknown' is fine: the server fills in the request address on submit
    */
   async getIPAddress() {
     try {
-      // Try multiple IP detection services with timeout
-      const services = [
-        'https://api.ipify.org?format=json',
-        'https://ipapi.co/json/',
-        'https://api.ip.sb/ip'
-      ];
+      const controller = new AbortController();
+      const timeoutId = setTimeout(() => controller.abort(), 2000);
 
-      for (const service of services) {
-        try {
-          const controller = new AbortController();
-          const timeoutId = setTimeout(() => controller.abort(), 5000);
-          
-          const response = await fetch(service, { 
-            signal: controller.signal,
-            method: 'GET'
-          });
-          clearTimeout(timeoutId);
-          
-          const data = await response.json();
-          if (data.ip) return data.ip;
-          if (data.query) return data.query;
-        } catch (e) {
-          continue;
-        }
-      }
-      return 'Unknown';
+      const response = await fetch(`${this.apiUrl}/api/whoami`, {
+        signal: controller.signal,
+        method: 'GET'
+      });
+      clearTimeout(timeoutId);
+
+      const data = await response.json();
+      return data.ip || 'Unknown';
     } catch {
       return 'Unknown';
     }
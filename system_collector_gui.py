@@ -12,15 +12,23 @@ import tkinter as tk
 from tkinter import messagebox
 import threading
 import time
-from get_system_details import collect_system_details
+from get_system_details import collect_system_details, COLLECTION_PROFILES
+from api_client import DEFAULT_API_URL, build_payload
+from outbox import Outbox, is_retryable_failure
+from collector_policy import policy_client
 
 class SystemCollectorGUI:
-    def __init__(self, employee_id=None, email=None, department=None, api_url=None):
+    def __init__(self, employee_id=None, email=None, department=None, api_url=None, profile=None):
         self.employee_id = employee_id
         self.email = email
         self.department = department
-        self.api_url = api_url or 'https://backend-blue-beta.vercel.app'
+        self.api_url = api_url or DEFAULT_API_URL
+        # None: use the profile from the server's collector policy
+        self.profile = profile if profile in COLLECTION_PROFILES else None
+        self.client = None
+        self.policy = None
         self.collected_data = None
+        self.outbox = Outbox()
         
         # Create main window
         self.root = tk.Tk()
@@ -212,6 +220,11 @@ class SystemCollectorGUI:
     def collect_system_details(self):
         """Collect system details (runs in background thread)"""
         try:
+            # Collector policy from the server (cached between runs; built-in defaults if unreachable)
+            self.client, self.policy = policy_client(self.api_url)
+            # Replay anything queued by earlier runs while we collect
+            self.outbox.flush_in_background(self.client, self.policy['batch_size'])
+            
             # Update status
             self.root.after(0, lambda: self.status_label.config(text="Collecting system information..."))
             time.sleep(0.5)
@@ -224,7 +237,9 @@ class SystemCollectorGUI:
             details = collect_system_details(
                 self.employee_id or "AUTO",
                 self.email or "auto@system.local",
-                self.department or "AUTO"
+                self.department or "AUTO",
+                profile=self.profile or self.policy['profile'],
+                timeouts=self.policy['timeouts']
             )
             
             self.collected_data = details
@@ -241,47 +256,56 @@ class SystemCollectorGUI:
     
     def send_to_api(self, details):
         """Send collected data to API"""
+        payload = None
         try:
             # Prepare payload
-            payload = {
-                'employee_id': self.employee_id or details.get('employee_id', 'AUTO'),
-                'email': self.email or details.get('email', 'auto@system.local'),
-                'department': self.department or details.get('department', 'AUTO'),
-                'system_details': {
-                    'username': details.get('username'),
-                    'hostname': details.get('hostname'),
-                    'system_manufacturer': details.get('system_manufacturer'),
-                    'system_model': details.get('system_model'),
-                    'ip_address': details.get('ip_address'),
-                    'serial_number': details.get('serial_number'),
-                    'os_info': details.get('os_info') or details.get('windows', {}),
-                    'storage': details.get('storage', []),
-                    'ram': details.get('ram', {}),
-                    'collected_at': details.get('collected_at')
-                }
-            }
-            
-            # Send to API
-            response = requests.post(
-                f"{self.api_url}/api/system-details",
-                json=payload,
-                headers={'Content-Type': 'application/json'},
-                timeout=30
+            payload = build_payload(
+                details,
+                self.employee_id or details.get('employee_id', 'AUTO'),
+                self.email or details.get('email', 'auto@system.local'),
+                self.department or details.get('department', 'AUTO')
             )
             
+            # Send to API (pooled session, retries transient failures)
+            client = self.client
+            response = client.submit(payload)
+            
             if response.status_code == 200:
                 result = response.json()
                 if result.get('success'):
+                    # Server is reachable: replay submissions queued by earlier runs
+                    try:
+                        self.outbox.flush(client, self.policy['batch_size'])
+                    except Exception as e:
+                        print(f"Outbox flush failed: {e}")
                     self.root.after(0, self.show_success)
                 else:
-                    self.root.after(0, lambda: self.show_error(result.get('error', 'Unknown error')))
+                    error_msg = result.get('error', 'Unknown error')
+                    self.root.after(0, lambda: self.show_error(error_msg))
+            elif is_retryable_failure(response):
+                # Busy server (429/503): hold replays until it asked clients to come back
+                self.outbox.defer_for(response)
+                self.queue_or_fail(payload, f"Server error: {response.status_code}")
             else:
-                self.root.after(0, lambda: self.show_error(f"Server error: {response.status_code}"))
+                error_msg = f"Server error: {response.status_code}"
+                self.root.after(0, lambda: self.show_error(error_msg))
                 
         except requests.exceptions.RequestException as e:
-            self.root.after(0, lambda: self.show_error(f"Network error: {str(e)}"))
+            self.queue_or_fail(payload, f"Network error: {str(e)}")
         except Exception as e:
-            self.root.after(0, lambda: self.show_error(f"Error: {str(e)}"))
+            error_msg = f"Error: {str(e)}"
+            self.root.after(0, lambda: self.show_error(error_msg))
+    
+    def queue_or_fail(self, payload, error_msg):
+        """Keep an undelivered payload in the outbox, or report the error if that fails too"""
+        try:
+            if payload is not None:
+                self.outbox.add(payload)
+                self.root.after(0, self.show_queued)
+                return
+        except OSError as e:
+            error_msg = f"{error_msg}\nCould not save for later: {e}"
+        self.root.after(0, lambda: self.show_error(error_msg))
     
     def show_success(self):
         """Show success message and close"""
@@ -297,6 +321,21 @@ class SystemCollectorGUI:
         
         self.root.after(1000, self.root.destroy)
     
+    def show_queued(self):
+        """Tell the user the data was saved locally and will be sent later"""
+        self.is_collecting = False
+        self.status_label.config(text="Saved for later")
+        
+        messagebox.showwarning(
+            "Server Unreachable",
+            "System information was collected but the server could not be reached.\n\n"
+            "It has been saved on this computer and will be sent automatically "
+            "the next time the collector runs.",
+            parent=self.root
+        )
+        
+        self.root.after(1000, self.root.destroy)
+    
     def show_error(self, error_msg):
         """Show error message"""
         self.is_collecting = False
@@ -327,6 +366,7 @@ def main():
     email = None
     department = None
     api_url = None
+    profile = None
     
     # Try to read from data file (created by form)
     data_file = os.path.join(os.path.expanduser('~'), 'system_collector_data.json')
@@ -337,7 +377,8 @@ def main():
                 employee_id = data.get('employee_id')
                 email = data.get('email')
                 department = data.get('department')
-                api_url = data.get('api_url', 'https://backend-blue-beta.vercel.app')
+                api_url = data.get('api_url', DEFAULT_API_URL)
+                profile = data.get('profile')
             # Delete the file after reading
             try:
                 os.remove(data_file)
@@ -349,7 +390,7 @@ def main():
     # Check for command line arguments (alternative method)
     if not all([employee_id, email, department]) and len(sys.argv) > 1:
         try:
-            # Parse arguments: employee_id,email,department,api_url
+            # Parse arguments: employee_id,email,department,api_url,profile
             args = sys.argv[1].split(',')
             if len(args) >= 1:
                 employee_id = args[0] if args[0] else employee_id
@@ -359,6 +400,8 @@ def main():
                 department = args[2] if args[2] else department
             if len(args) >= 4:
                 api_url = args[3] if args[3] else api_url
+            if len(args) >= 5:
+                profile = args[4] if args[4] else profile
         except:
             pass
     
@@ -388,7 +431,7 @@ def main():
         root.destroy()
     
     # Create and run GUI
-    app = SystemCollectorGUI(employee_id, email, department, api_url)
+    app = SystemCollectorGUI(employee_id, email, department, api_url, profile)
     app.run()
 
 
@@ -5,12 +5,12 @@ Standalone version that can prompt for data if not provided via command line
 import sys
 import os
 import json
-import requests
 import tkinter as tk
 from tkinter import messagebox, simpledialog
 import threading
 import time
 from get_system_details import collect_system_details
+from api_client import DEFAULT_API_URL
 
 # Import the GUI class
 from system_collector_gui import SystemCollectorGUI
@@ -40,9 +40,10 @@ def main():
     employee_id = None
     email = None
     department = None
-    api_url = 'https://backend-blue-beta.vercel.app'
+    api_url = DEFAULT_API_URL
+    profile = None
     
-    # Check for command line arguments
+    # Check for command line arguments: employee_id,email,department,api_url,profile
     if len(sys.argv) > 1:
         try:
             args = sys.argv[1].split(',')
@@ -53,7 +54,9 @@ def main():
             if len(args) >= 3:
                 department = args[2] if args[2] else None
             if len(args) >= 4:
-                api_url = args[3] if args[3] else 'https://backend-blue-beta.vercel.app'
+                api_url = args[3] if args[3] else DEFAULT_API_URL
+            if len(args) >= 5:
+                profile = args[4] if args[4] else None
         except:
             pass
     
@@ -65,7 +68,7 @@ def main():
             return
     
     # Create and run GUI
-    app = SystemCollectorGUI(employee_id, email, department, api_url)
+    app = SystemCollectorGUI(employee_id, email, department, api_url, profile)
     app.run()
 
 if __name__ == '__main__':
@@ -0,0 +1,39 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from columnar_archive import ColumnarExporter, list_partitions, read_manifest
+from storage import SQLiteStorage
+
+
+def snapshot(day, department, model, ram_used=4.0):
+    return {
+        'created_at': f'2026-01-{day:02d}T08:00:00+00:00',
+        'employee_id': f'E{day}', 'email': 'user@example.com', 'department': department,
+        'system_model': model, 'ram_total_gb': 16.0, 'ram_used_gb': ram_used,
+    }
+
+
+def test_reexport_keeps_rows_compacted_away_and_replaces_live_ones(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / 'details.db'))
+    root = str(tmp_path / 'columnar')
+    try:
+        stored = storage.bulk_insert([snapshot(1, 'IT', 'X1'), snapshot(2, 'HR', 'T14'), snapshot(3, 'IT', 'X1')])
+        exporter = ColumnarExporter(root)
+        exporter.export(storage)
+
+        # Compaction deletes the oldest two rows, then a late row arrives for the month
+        storage.delete([row['id'] for row in stored[:2]])
+        storage.bulk_insert([snapshot(4, 'IT', 'P16', ram_used=8.0)])
+        exporter.export(storage, since='latest')
+
+        partitions = {p.department: p for p in list_partitions(root)}
+        assert read_manifest(root)['months']['2026-01']['rows'] == 4
+        assert partitions['HR'].rows == 1
+        it = partitions['IT']
+        assert it.column('id').tolist() == [stored[0]['id'], stored[2]['id'], stored[2]['id'] + 1]
+        models = [it.dictionary('system_model')[code] for code in it.column('system_model').tolist()]
+        assert models == ['X1', 'X1', 'P16']
+        assert it.column('ram_used_gb').tolist() == [4.0, 4.0, 8.0]
+    finally:
+        storage.close()
@@ -0,0 +1,92 @@
+import json
+import datetime
+
+import pytest
+
+from compaction import Compactor
+from storage import SQLiteStorage
+
+NOW = datetime.datetime(2026, 6, 30, 12, tzinfo=datetime.timezone.utc)
+
+
+class CrashingStorage(SQLiteStorage):
+    """Fails the first delete, as if the process died between upsert and delete"""
+
+    crash = True
+
+    def delete(self, record_ids):
+        if self.crash:
+            self.crash = False
+            raise RuntimeError('connection lost')
+        return super().delete(record_ids)
+
+
+def snapshot(day, hour, serial='SN1', ram_used=4.0):
+    return {
+        'created_at': f'2026-01-{day:02d}T{hour:02d}:00:00+00:00',
+        'employee_id': 'E1', 'email': 'user@example.com', 'department': 'IT',
+        'hostname': 'host-1', 'serial_number': serial,
+        'ram_total_gb': 16.0, 'ram_used_gb': ram_used, 'ram_used_percent': ram_used / 16 * 100,
+        'storage_details': json.dumps([{'drive': 'C:', 'total_gb': 500, 'used_gb': 100, 'used_percent': 20}]),
+    }
+
+
+@pytest.fixture
+def storage(tmp_path):
+    store = CrashingStorage(str(tmp_path / 'details.db'))
+    yield store
+    store.close()
+
+
+def test_compaction_resumes_without_double_counting(storage):
+    storage.bulk_insert([snapshot(1, 8, ram_used=2.0), snapshot(1, 9, ram_used=6.0), snapshot(2, 8)])
+
+    with pytest.raises(RuntimeError):
+        Compactor(storage, retention_days=30).run(now=NOW)
+    # The first day's summary was written, its raw rows are still there
+    assert storage.count() == 3
+    assert [row['samples'] for row in storage.list_daily()] == [2]
+
+    counts = Compactor(storage, retention_days=30).run(now=NOW)
+    assert counts['deleted'] == 3
+    assert storage.count() == 0
+    daily = {row['day']: row for row in storage.list_daily()}
+    assert sorted(daily) == ['2026-01-01', '2026-01-02']
+    first = daily['2026-01-01']
+    assert first['samples'] == 2
+    assert (first['ram_used_gb_min'], first['ram_used_gb_avg'], first['ram_used_gb_max']) == (2.0, 4.0, 6.0)
+    assert len(json.loads(first['source_ids'])) == 2
+
+
+def test_late_rows_merge_into_an_existing_summary(storage):
+    storage.crash = False
+    storage.bulk_insert([snapshot(1, 8, ram_used=2.0)])
+    Compactor(storage, retention_days=30).run(now=NOW)
+
+    storage.bulk_insert([snapshot(1, 20, ram_used=6.0)])
+    Compactor(storage, retention_days=30).run(now=NOW)
+
+    [summary] = storage.list_daily()
+    assert summary['samples'] == 2
+    assert summary['ram_used_gb_avg'] == 4.0
+    assert summary['last_seen'] == '2026-01-01T20:00:00+00:00'
+
+
+def test_rows_inside_the_retention_window_are_kept(storage):
+    storage.crash = False
+    storage.bulk_insert([dict(snapshot(1, 8), created_at='2026-06-20T08:00:00+00:00')])
+    counts = Compactor(storage, retention_days=30).run(now=NOW)
+    assert counts['rows'] == 0
+    assert storage.count() == 1
+
+
+def test_agent_window_extremes_widen_the_daily_range(storage):
+    storage.crash = False
+    row = snapshot(1, 8, ram_used=4.0)
+    row['usage_summary'] = json.dumps({'samples': 15, 'ram_used_gb': {'min': 1.5, 'max': 9.0, 'avg': 4.2}})
+    storage.bulk_insert([row, snapshot(1, 9, ram_used=5.0)])
+    Compactor(storage, retention_days=30).run(now=NOW)
+
+    [summary] = storage.list_daily()
+    assert (summary['ram_used_gb_min'], summary['ram_used_gb_max']) == (1.5, 9.0)
+    assert summary['ram_used_gb_avg'] == 4.5
@@ -0,0 +1,28 @@
+from device_index import DeviceIndex, MAX_VALUES_PER_KEY
+
+
+def submission(row_id, serial, ip, employee='E1'):
+    return {'id': row_id, 'created_at': f'2026-01-01T00:00:{row_id % 60:02d}+00:00',
+            'employee_id': employee, 'hostname': f'host-{serial}', 'serial_number': serial, 'ip_address': ip}
+
+
+def ip_flags(flags):
+    return [flag for flag in flags if flag['kind'] == 'ip_devices']
+
+
+def test_values_past_the_cap_are_flagged_once():
+    index = DeviceIndex()
+    serials = [f'SN{n}' for n in range(MAX_VALUES_PER_KEY + 10)]
+    flagged = [bool(ip_flags(index.add(submission(n, serial, '81.2.69.160')))) for n, serial in enumerate(serials)]
+    assert flagged == [False] + [True] * (len(serials) - 1)
+
+    # Later submissions from devices already on that address, stored or overflowed, are not conflicts again
+    for n, serial in enumerate(['SN25'] * 5 + ['SN3'], start=100):
+        assert ip_flags(index.add(submission(n, serial, '81.2.69.160'))) == []
+
+
+def test_shared_addresses_are_not_device_conflicts():
+    index = DeviceIndex()
+    for n, ip in enumerate(['192.168.1.10', '192.168.1.10', '100.64.0.1', '100.64.0.1', '10.0.0.5', '10.0.0.5']):
+        assert ip_flags(index.add(submission(n, f'SN{n}', ip))) == []
+    assert index.report(kind='ip_devices')['conflicts'] == []
@@ -0,0 +1,39 @@
+from facet_counts import FacetCounts
+from search_index import RecentIds
+from storage import SQLiteStorage
+
+
+def row(department, model, os_release='10'):
+    return {'employee_id': 'E1', 'email': 'user@example.com', 'department': department,
+            'system_model': model, 'windows_system': 'Windows', 'windows_release': os_release}
+
+
+def test_recount_matches_group_by_and_replaces_drifted_counters(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / 'details.db'))
+    try:
+        storage.bulk_insert([row('IT', 'X1'), row('IT', 'X1'), row('HR', 'T14', '11'), row('HR', '')])
+        counts = FacetCounts()
+        counts.add({'id': 999, 'department': 'Gone', 'system_model': 'Old'})   # deleted since
+        counts.recount(storage)
+
+        assert counts.count({}) == 4
+        assert counts.count({'department': 'IT'}) == 2
+        assert counts.count({'system_model': 'X1'}) == 2
+        assert counts.count({'department': 'HR', 'windows_release': '11'}) == 1
+        assert counts.count({'department': 'Gone'}) == 0
+        facets = counts.facets(department='HR')
+        assert {'value': None, 'count': 1} in facets['model']
+    finally:
+        storage.close()
+
+
+def test_recent_ids_only_remember_rows_the_sync_can_repeat():
+    seen = RecentIds(floor='2026-01-02', max_ids=2)
+    assert seen.add(1, '2026-01-01')       # older than the floor: counted, not remembered
+    assert seen.add(1, '2026-01-01')
+    assert seen.add(2, '2026-01-03') and not seen.add(2, '2026-01-03')
+    seen.add(3, '2026-01-04')
+    seen.add(4, '2026-01-05')
+    assert len(seen) == 2
+    seen.forget_before('2026-01-05')
+    assert len(seen) == 1 and not seen.add(4, '2026-01-05')
@@ -0,0 +1,40 @@
+import json
+
+from get_system_details import format_details_text
+from import_backups import Checkpoint, run_import
+from records import build_db_record, format_specs_text
+from storage import SQLiteStorage
+
+DETAILS = {
+    'employee_id': 'E1', 'email': 'user@example.com', 'department': 'IT',
+    'collected_at': '2026-01-05T10:00:00.123456', 'hostname': 'host-1', 'serial_number': 'SN1',
+    'os_info': {'system': 'Windows'}, 'ram': {'total_gb': 16.0, 'used_gb': 4.0, 'used_percent': 25.0},
+    'storage': [{'drive': 'C:', 'total_gb': 500.0, 'used_gb': 100.0, 'used_percent': 20.0,
+                 'free_gb': 400.0, 'device': 'disk0', 'fstype': 'NTFS'}],
+}
+
+
+def test_import_skips_snapshots_already_in_the_store(tmp_path):
+    backups = tmp_path / 'backups'
+    backups.mkdir()
+    storage = SQLiteStorage(str(tmp_path / 'details.db'))
+    checkpoint = Checkpoint(str(tmp_path / 'checkpoint.db'))
+
+    # Stored live: a /api/system-details row with its backup file, and a /api/collect-specs row
+    text = format_details_text(DETAILS)
+    txt_name = 'system_details_E1_20260105_100000.txt'
+    storage.insert(build_db_record(DETAILS, text, txt_name))
+    (backups / txt_name).write_text(text, encoding='utf-8')
+    specs = dict(DETAILS, collected_at='2026-01-05T11:00:00.000001')
+    storage.insert(build_db_record(specs, format_specs_text(specs), None))
+    (backups / 'specs_E1_20260105_110000.json').write_text(json.dumps({'details': specs}), encoding='utf-8')
+    # Never reached the database
+    missing = dict(DETAILS, collected_at='2026-01-05T12:00:00.000002')
+    (backups / 'specs_E1_20260105_120000.json').write_text(json.dumps({'details': missing}), encoding='utf-8')
+
+    counts = run_import(str(backups), storage, checkpoint, workers=1)
+    assert (counts['imported'], counts['already_stored']) == (1, 2)
+    assert storage.count() == 3
+
+    checkpoint.close()
+    storage.close()
@@ -0,0 +1,97 @@
+import time
+
+import requests
+
+from outbox import Outbox, BATCH_PATH
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=None, headers=None):
+        self.status_code = status_code
+        self._body = body or {}
+        self.headers = headers or {}
+
+    def json(self):
+        return self._body
+
+
+class FakeClient:
+    """Answers batch posts with a canned status per submission (or raises / returns a response)"""
+
+    def __init__(self, statuses=None, response=None, error=None):
+        self.statuses = statuses
+        self.response = response
+        self.error = error
+        self.batches = []
+
+    def post_payload(self, path, body, headers=None):
+        assert path == BATCH_PATH
+        self.batches.append(body['submissions'])
+        if self.error:
+            raise self.error
+        if self.response:
+            return self.response
+        statuses = self.statuses or [200] * len(body['submissions'])
+        return FakeResponse(200, {'results': [
+            {'index': index, 'status': status} for index, status in enumerate(statuses[:len(body['submissions'])])
+        ]})
+
+
+def payload(n):
+    return {'employee_id': f'E{n}', 'email': 'user@example.com', 'department': 'IT'}
+
+
+def test_add_dedupes_identical_payloads(tmp_path):
+    outbox = Outbox(str(tmp_path / 'outbox.jsonl'))
+    assert outbox.add(payload(1))
+    assert not outbox.add(payload(1))
+    assert outbox.add(payload(2))
+    assert len(outbox) == 2
+
+
+def test_add_drops_oldest_over_the_cap(tmp_path):
+    outbox = Outbox(str(tmp_path / 'outbox.jsonl'), max_entries=2)
+    for n in range(3):
+        outbox.add(payload(n))
+    assert [entry['payload']['employee_id'] for entry in outbox.pending()] == ['E1', 'E2']
+
+
+def test_flush_replays_in_batches_oldest_first(tmp_path):
+    outbox = Outbox(str(tmp_path / 'outbox.jsonl'))
+    for n in range(5):
+        outbox.add(payload(n))
+    client = FakeClient()
+    assert outbox.flush(client, batch_size=2) == 5
+    assert [[item['employee_id'] for item in batch] for batch in client.batches] == \
+        [['E0', 'E1'], ['E2', 'E3'], ['E4']]
+    assert len(outbox) == 0
+
+
+def test_flush_stops_at_first_transient_item(tmp_path):
+    outbox = Outbox(str(tmp_path / 'outbox.jsonl'))
+    for n in range(3):
+        outbox.add(payload(n))
+    # A permanently rejected item (400) is dropped; a 503 keeps it and everything after it
+    client = FakeClient(statuses=[400, 503, 200])
+    assert outbox.flush(client) == 1
+    assert [entry['payload']['employee_id'] for entry in outbox.pending()] == ['E1', 'E2']
+
+
+def test_flush_keeps_entries_on_network_error(tmp_path):
+    outbox = Outbox(str(tmp_path / 'outbox.jsonl'))
+    outbox.add(payload(1))
+    assert outbox.flush(FakeClient(error=requests.exceptions.ConnectionError())) == 0
+    assert len(outbox) == 1
+
+
+def test_throttled_flush_holds_later_replays(tmp_path):
+    outbox = Outbox(str(tmp_path / 'outbox.jsonl'))
+    outbox.add(payload(1))
+    throttled = FakeClient(response=FakeResponse(429, headers={'Retry-After': '120'}))
+    assert outbox.flush(throttled) == 0
+    assert outbox.held_until() >= time.time() + 100
+
+    client = FakeClient()
+    assert outbox.flush(client) == 0
+    assert client.batches == []
+    assert outbox.flush(client, force=True) == 1
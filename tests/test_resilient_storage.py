@@ -0,0 +1,143 @@
+import pytest
+
+from circuit_breaker import CircuitBreaker, CLOSED, OPEN
+from resilient_storage import ResilientStorage, is_transient_error
+from storage import SQLiteStorage
+
+
+class ValueTooLong(Exception):
+    """Stands in for the PostgREST error Postgres raises for an over-long value"""
+    code = '22001'
+
+
+class FlakyPrimary(SQLiteStorage):
+    """SQLite primary that can be taken down, and rejects rows with email 'bad' for good"""
+
+    name = 'primary'
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.down = False
+
+    def bulk_insert(self, records):
+        if self.down:
+            raise ConnectionError('connection refused')
+        if any(record.get('email') == 'bad' for record in records):
+            raise ValueTooLong('value too long for type character varying(255)')
+        return super().bulk_insert(records)
+
+
+@pytest.fixture
+def primary(tmp_path):
+    storage = FlakyPrimary(str(tmp_path / 'primary.db'))
+    yield storage
+    storage.close()
+
+
+@pytest.fixture
+def resilient(primary, tmp_path):
+    breaker = CircuitBreaker('primary', min_calls=2, window_size=4, cooldown_seconds=60,
+                             is_failure=is_transient_error)
+    storage = ResilientStorage(primary, SQLiteStorage(str(tmp_path / 'spool.db')), breaker)
+    yield storage
+    storage.spool.close()
+    storage.dead_letter.close()
+
+
+def record(employee_id, email='user@example.com'):
+    return {'employee_id': employee_id, 'email': email, 'department': 'IT'}
+
+
+def test_is_transient_error():
+    assert is_transient_error(ConnectionError())
+    assert is_transient_error(TimeoutError())
+    assert not is_transient_error(ValueTooLong())
+    assert not is_transient_error(ValueError('bad input'))
+
+
+def test_breaker_opens_on_failure_rate_and_ignores_permanent_errors():
+    breaker = CircuitBreaker('db', min_calls=2, window_size=4, cooldown_seconds=60,
+                             is_failure=is_transient_error)
+
+    def reject():
+        raise ValueTooLong()
+
+    for _ in range(4):
+        with pytest.raises(ValueTooLong):
+            breaker.call(reject)
+    assert breaker.state == CLOSED
+
+    def refuse():
+        raise ConnectionError()
+
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            breaker.call(refuse)
+    assert breaker.state == OPEN
+
+
+def test_transient_failure_spools_and_drains(primary, resilient):
+    primary.down = True
+    stored = resilient.insert(record('E1'))
+    assert stored['spooled'] and stored['id'] is None
+    assert resilient.spool_depth() == 1
+
+    primary.down = False
+    assert resilient.drain_spool() == 1
+    assert resilient.spool_depth() == 0
+    assert [row['employee_id'] for row in primary.stream()] == ['E1']
+
+
+def test_permanent_failure_is_raised_not_spooled(resilient):
+    with pytest.raises(ValueTooLong):
+        resilient.insert(record('E1', email='bad'))
+    assert resilient.spool_depth() == 0
+    assert resilient.breaker.state == CLOSED
+
+
+def test_poison_row_is_dead_lettered_and_does_not_block_the_spool(primary, resilient):
+    primary.down = True
+    resilient.insert(record('E1', email='bad'))
+    resilient.insert(record('E2'))
+    resilient.insert(record('E3'))
+    primary.down = False
+    # The outage opened the circuit; let the re-drain through
+    resilient.breaker = CircuitBreaker('primary', min_calls=2, window_size=4, is_failure=is_transient_error)
+
+    assert resilient.drain_spool(batch_size=10) == 2
+    assert resilient.spool_depth() == 0
+    assert [row['employee_id'] for row in resilient.dead_letter.stream()] == ['E1']
+    assert [row['employee_id'] for row in primary.stream()] == ['E2', 'E3']
+    assert resilient.breaker.state == CLOSED
+
+
+def test_drain_pauses_on_transient_error(primary, resilient):
+    primary.down = True
+    resilient.insert(record('E1'))
+    assert resilient.drain_spool() == 0
+    assert resilient.spool_depth() == 1
+    assert resilient.dead_letter_depth() == 0
+
+
+def test_spooled_row_can_be_completed_before_drain(primary, resilient):
+    primary.down = True
+    stored = resilient.insert(record('E1'))
+    assert resilient.update_spooled(stored['spool_id'], {'formatted_text': 'report'})
+
+    primary.down = False
+    resilient.drain_spool()
+    [row] = primary.stream()
+    assert row['formatted_text'] == 'report'
+
+
+def test_redrained_rows_are_handed_over_with_their_new_ids(primary, resilient):
+    redrained = []
+    resilient.on_redrained = redrained.extend
+    primary.down = True
+    resilient.insert(record('E1'))
+    resilient.insert(record('E2', email='bad'))
+
+    primary.down = False
+    resilient.breaker = CircuitBreaker('primary', min_calls=2, window_size=4, is_failure=is_transient_error)
+    resilient.drain_spool()
+    assert [(row['employee_id'], row['id']) for row in redrained] == [('E1', 1)]
@@ -6,10 +6,11 @@ Users can run this once, and it will collect all system details that browsers ca
 
 import json
 import sys
+import argparse
 import webbrowser
-from get_system_details import collect_system_details
+from get_system_details import collect_system_details, COLLECTION_PROFILES, DEFAULT_PROFILE
 
-def collect_and_open_form():
+def collect_and_open_form(profile=DEFAULT_PROFILE):
     """Collect system details and open form with pre-filled data"""
     try:
         print("=" * 60)
@@ -20,7 +21,7 @@ def collect_and_open_form():
         # Collect system details
         # We'll use placeholder values for employee_id, email, department
         # These will be filled by the user in the web form
-        details = collect_system_details("TEMP", "temp@temp.com", "TEMP")
+        details = collect_system_details("TEMP", "temp@temp.com", "TEMP", profile=profile)
         
         # Extract system details
         system_details = {
@@ -33,7 +34,8 @@ def collect_and_open_form():
             'os_info': details.get('os_info') or details.get('windows', {}),
             'storage': details.get('storage', []),
             'ram': details.get('ram', {}),
-            'collected_at': details.get('collected_at')
+            'collected_at': details.get('collected_at'),
+            'collection_profile': details.get('collection_profile')
         }
         
         # Save to a temporary file that the web form can read
@@ -67,10 +69,10 @@ def collect_and_open_form():
         return None
 
 
-def save_to_clipboard():
+def save_to_clipboard(profile=DEFAULT_PROFILE):
     """Save system details to clipboard for easy pasting"""
     try:
-        details = collect_system_details("TEMP", "temp@temp.com", "TEMP")
+        details = collect_system_details("TEMP", "temp@temp.com", "TEMP", profile=profile)
         system_details = {
             'username': details.get('username'),
             'hostname': details.get('hostname'),
@@ -81,7 +83,8 @@ def save_to_clipboard():
             'os_info': details.get('os_info') or details.get('windows', {}),
             'storage': details.get('storage', []),
             'ram': details.get('ram', {}),
-            'collected_at': details.get('collected_at')
+            'collected_at': details.get('collected_at'),
+            'collection_profile': details.get('collection_profile')
         }
         
         json_str = json.dumps(system_details, indent=2)
@@ -101,6 +104,11 @@ def save_to_clipboard():
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Collect full system details for the web form")
+    parser.add_argument('--profile', choices=sorted(COLLECTION_PROFILES), default=DEFAULT_PROFILE,
+                        help="Collection profile (default: %(default)s)")
+    profile = parser.parse_args().profile
+    
     print("\nChoose an option:")
     print("1. Collect and save to temp file (for web form integration)")
     print("2. Collect and copy to clipboard")
@@ -109,13 +117,13 @@ if __name__ == '__main__':
     choice = input("\nEnter choice (1-3): ").strip()
     
     if choice == '1':
-        collect_and_open_form()
+        collect_and_open_form(profile)
     elif choice == '2':
-        save_to_clipboard()
+        save_to_clipboard(profile)
     elif choice == '3':
-        details = collect_system_details("TEMP", "temp@temp.com", "TEMP")
+        details = collect_system_details("TEMP", "temp@temp.com", "TEMP", profile=profile)
         print("\n" + json.dumps(details, indent=2))
     else:
         print("Invalid choice. Running default collection...")
-        collect_and_open_form()
+        collect_and_open_form(profile)
 
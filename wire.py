@@ -0,0 +1,155 @@
+"""
+Collector Wire Format
+Compact MessagePack encoding for /api/system-details bodies, negotiated by
+Content-Type between the Python collectors (api_client.py) and api_server.py.
+
+Schema version 1 differs from the JSON body only where JSON is verbose:
+    system_details.ram      [total_bytes, available_bytes, used_bytes, free_bytes]
+    system_details.storage  [[drive, device, fstype, total_bytes, used_bytes, free_bytes], ...]
+Byte counts are exact integers; the server derives the *_gb / used_percent values
+with the same rounding the probes use. Entries without byte counts (errors,
+unavailable mounts) travel unchanged as maps.
+"""
+
+from records import without_byte_counts
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+SCHEMA_VERSION = 1
+
+JSON_CONTENT_TYPE = 'application/json'
+MSGPACK_CONTENT_TYPE = 'application/msgpack'
+MSGPACK_CONTENT_TYPES = frozenset([MSGPACK_CONTENT_TYPE, 'application/x-msgpack', 'application/vnd.msgpack'])
+
+STORAGE_BYTE_FIELDS = ('total_bytes', 'used_bytes', 'free_bytes')
+RAM_BYTE_FIELDS = ('total_bytes', 'available_bytes', 'used_bytes', 'free_bytes')
+
+
+class WireFormatError(ValueError):
+    """Body could not be decoded (bad bytes, unknown schema version, msgpack missing)"""
+
+
+def accepted_content_types():
+    """Request body types this process can decode, preferred first"""
+    if MSGPACK_AVAILABLE:
+        return [MSGPACK_CONTENT_TYPE, JSON_CONTENT_TYPE]
+    return [JSON_CONTENT_TYPE]
+
+
+def _has_bytes(entry, fields):
+    return isinstance(entry, dict) and all(isinstance(entry.get(f), int) for f in fields)
+
+
+def _pack_details(details):
+    packed = dict(details)
+    ram = details.get('ram')
+    if _has_bytes(ram, RAM_BYTE_FIELDS):
+        packed['ram'] = [ram[f] for f in RAM_BYTE_FIELDS]
+    elif isinstance(ram, dict):
+        packed['ram'] = without_byte_counts(ram)
+    storage = []
+    for entry in details.get('storage') or []:
+        if _has_bytes(entry, STORAGE_BYTE_FIELDS):
+            storage.append([entry.get('drive'), entry.get('device'), entry.get('fstype')]
+                           + [entry[f] for f in STORAGE_BYTE_FIELDS])
+        else:
+            storage.append(without_byte_counts(entry))
+    packed['storage'] = storage
+    return packed
+
+
+def _unpack_details(packed):
+    # Local import: the probe helpers live with the probes
+    from get_system_details import storage_entry, ram_entry
+
+    details = dict(packed)
+    ram = packed.get('ram')
+    if isinstance(ram, list):
+        if len(ram) != len(RAM_BYTE_FIELDS):
+            raise WireFormatError('ram must have 4 byte counts')
+        total, available, used, free = ram
+        percent = round((total - available) / total * 100, 1) if total else 0.0
+        details['ram'] = ram_entry(total, available, used, free, percent)
+    storage = []
+    for entry in packed.get('storage') or []:
+        if isinstance(entry, list):
+            if len(entry) != 6:
+                raise WireFormatError('storage entries must have 6 fields')
+            drive, device, fstype, total, used, free = entry
+            entry = storage_entry(drive, total, used, free, device, fstype)
+            if entry is None:
+                continue
+        storage.append(entry)
+    details['storage'] = storage
+    return details
+
+
+def pack_payload(payload):
+    """build_payload() dict -> schema v1 map"""
+    packed = dict(payload, schema=SCHEMA_VERSION)
+    if isinstance(payload.get('system_details'), dict):
+        packed['system_details'] = _pack_details(payload['system_details'])
+    return packed
+
+
+def unpack_payload(packed):
+    """Schema v1 map -> the dict a JSON client would have sent"""
+    if not isinstance(packed, dict):
+        raise WireFormatError('Submission must be a map')
+    version = packed.get('schema')
+    if version != SCHEMA_VERSION:
+        raise WireFormatError(f'Unsupported schema version {version!r} (expected {SCHEMA_VERSION})')
+    payload = {k: v for k, v in packed.items() if k != 'schema'}
+    if isinstance(packed.get('system_details'), dict):
+        payload['system_details'] = _unpack_details(packed['system_details'])
+    return payload
+
+
+def encode(body):
+    """MessagePack bytes for a payload or a {'submissions': [...]} batch"""
+    if not MSGPACK_AVAILABLE:
+        raise WireFormatError('msgpack is not installed')
+    if 'submissions' in body:
+        body = dict(body, submissions=[pack_payload(p) for p in body['submissions']])
+    else:
+        body = pack_payload(body)
+    return msgpack.packb(body, use_bin_type=True)
+
+
+def decode(data):
+    """Inverse of encode(): returns the payload (or batch) in its JSON shape"""
+    if not MSGPACK_AVAILABLE:
+        raise WireFormatError('msgpack is not installed')
+    try:
+        body = msgpack.unpackb(data, raw=False)
+    except Exception as e:
+        raise WireFormatError(f'Invalid MessagePack body: {e or type(e).__name__}')
+    try:
+        if isinstance(body, dict) and 'submissions' in body:
+            submissions = body['submissions']
+            if not isinstance(submissions, list):
+                raise WireFormatError('submissions must be a list')
+            return dict(body, submissions=[unpack_payload(p) for p in submissions])
+        return unpack_payload(body)
+    except (TypeError, AttributeError) as e:
+        raise WireFormatError(f'Malformed submission: {e}')
+
+
+def json_body(body):
+    """Payload or batch for the JSON wire format (drops the exact byte counts)"""
+    def strip(payload):
+        details = payload.get('system_details')
+        if not isinstance(details, dict):
+            return payload
+        details = dict(details,
+                       ram=without_byte_counts(details.get('ram')),
+                       storage=[without_byte_counts(e) for e in details.get('storage') or []])
+        return dict(payload, system_details=details)
+
+    if 'submissions' in body:
+        return dict(body, submissions=[strip(p) for p in body['submissions']])
+    return strip(body)
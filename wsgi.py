@@ -0,0 +1,14 @@
+"""
+WSGI Entry Point
+Production entry for multi-process servers:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+The app is created without starting its per-worker resources (storage
+connections, background threads). gunicorn.conf.py starts them in each worker
+after the fork; under other WSGI servers they start on the first request.
+"""
+
+from api_server import create_app
+
+app = create_app(start=False)